@@ -0,0 +1,42 @@
+"""Order-flow models of the app's automated traders.
+
+The demo agent (Run Demo) and the SPACE-key bot are defined once here and
+used by the app's engine thread (``engine_worker.py``), the headless
+simulator (``simulate.py``) and the benchmarks. Each model draws from the
+``random.Random`` it is given in a fixed order, so one seed yields the same
+orders everywhere.
+
+    rng = random.Random(7)
+    side, price, qty = demo_order(rng, engine.ltp, engine.band)   # price None = market
+    (bp, bq), (sp, sq) = bot_orders(rng, engine.band)
+"""
+DEMO_LIMIT_SHARE = 0.6   # share of demo orders that are limits at LTP +/- DEMO_PRICE_RANGE
+DEMO_PRICE_RANGE = 2     # ticks
+DEMO_QTY = (3, 10)
+BOT_QTY = (3, 12)
+
+
+def _randint(rng, lo, hi):
+    # Uniform int in [lo, hi]; several times cheaper than rng.randint, which dominated a simulation step
+    return lo + int(rng.random() * (hi - lo + 1))
+
+
+def demo_order(rng, ltp, band):
+    # One demo action: a limit near the LTP (clamped to the band) or a market
+    # order, either side; returns (side, price in ticks or None, qty)
+    is_limit = rng.random() < DEMO_LIMIT_SHARE
+    side = 'buy' if rng.random() < 0.5 else 'sell'
+    qty = _randint(rng, *DEMO_QTY)
+    if is_limit:
+        return side, band.clamp(ltp + _randint(rng, -DEMO_PRICE_RANGE, DEMO_PRICE_RANGE)), qty
+    return side, None, qty
+
+
+def bot_orders(rng, band):
+    # One SPACE-bot pair: a buy and a sell limit, each priced uniformly over
+    # the band; returns ((buy price, qty), (sell price, qty))
+    bp = _randint(rng, band.lo, band.hi)
+    sp = _randint(rng, band.lo, band.hi)
+    bq = _randint(rng, *BOT_QTY)
+    sq = _randint(rng, *BOT_QTY)
+    return (bp, bq), (sp, sq)
@@ -0,0 +1,382 @@
+"""Matching-engine benchmarks over seeded synthetic order flows.
+
+Each flow is run against a ``MatchingEngine`` pre-seeded with a given number
+of resting orders. Every engine call is timed with ``perf_counter_ns``; the
+report gives orders/sec, trades/sec and p50/p99/p99.9 per-order latency for
+each (flow, depth) pair, plus a comparison of loading a book with looped
+``place_limit_order`` calls and with ``submit_batch`` (the book-load speedup
+is asserted against ``BULK_MIN_SPEEDUP``) and a timing of single orders
+that sweep a deep book (``--sweep LEVELSxORDERS``, default 20 levels of 1,000
+orders), and is written as JSON so runs can be compared. ``--memory`` adds the
+traced bytes per resting order, load rate and full-GC pause for books of the
+given sizes:
+
+    python bench.py --out bench.json
+    python bench.py --compare bench.json   # exits 1 on a throughput regression
+    python bench.py --flows= --bulk 0 --memory 1000000
+    python bench.py --flows= --bulk 0 --sweep 20x1000
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from agents import bot_orders, demo_order
+from matching_engine import DEFAULT_LTP, EMPTY, MatchingEngine, PriceBand, batch_dtype
+
+DEFAULT_FLOWS = ('demo', 'uniform', 'deep_sweep', 'cancel_heavy')
+DEFAULT_DEPTHS = (0, 1000, 10000, 100000)
+# Least submit_batch/looped speedup accepted for a passive book load of at
+# least BULK_CHECK_ORDERS orders, per input type (measured 2.2-3.2x for a list
+# and 8-12x for a NumPy array at 100,000 orders on CPython 3.11); smaller loads
+# are dominated by fixed per-call costs and are only reported
+BULK_MIN_SPEEDUP = {'passive': 1.5, 'passive numpy': 6.0}
+BULK_CHECK_ORDERS = 50000
+
+
+def seed_book(engine, rng, depth):
+    # Rest `depth` orders, bids below LTP and asks above it (LTP kept off the band edges)
+    lo, hi = engine.band.lo, engine.band.hi
+    mid = min(max(engine.ltp, lo + 1), hi - 1)
+    for i in range(depth):
+        if i % 2 == 0:
+            engine.add_resting('buy', rng.randint(lo, mid - 1), rng.randint(1, 10))
+        else:
+            engine.add_resting('sell', rng.randint(mid + 1, hi), rng.randint(1, 10))
+
+
+# --- Flows: generators of ('limit', side, price, qty) / ('market', side, qty) /
+# ('cancel', oid) ops. ('seed', depth) ops top the book up outside the timing.
+
+def demo_flow(engine, rng, n, depth):
+    # The UI demo agent (agents.demo_order): 60% limit at LTP +/- 2, otherwise market; qty 3-10
+    for _ in range(n):
+        side, price, qty = demo_order(rng, engine.ltp, engine.band)
+        yield ('market', side, qty) if price is None else ('limit', side, price, qty)
+
+
+def uniform_flow(engine, rng, n, depth):
+    # The SPACE-key bot (agents.bot_orders): buy/sell limit pairs uniform over the band, qty 3-12
+    for i in range(0, n, 2):
+        (bp, bq), (sp, sq) = bot_orders(rng, engine.band)
+        yield ('limit', 'buy', bp, bq)
+        if i + 1 < n:
+            yield ('limit', 'sell', sp, sq)
+
+
+def deep_sweep_flow(engine, rng, n, depth):
+    # Large market orders that walk several levels; the book is re-seeded when thin
+    floor = max(100, depth // 4)
+    for i in range(n):
+        side = 'buy' if i % 2 == 0 else 'sell'
+        opposite = engine.order_book['asks' if side == 'buy' else 'bids']
+        if len(opposite) < floor:
+            yield ('seed', max(depth, 4 * floor))
+        yield ('market', side, rng.randint(50, 500))
+
+
+def cancel_heavy_flow(engine, rng, n, depth):
+    # 70% cancels of random earlier OIDs, 30% passive limit orders away from the touch
+    ltp = engine.ltp
+    lo, hi = engine.band.lo, engine.band.hi
+    for i in range(n):
+        if rng.random() < 0.7 and engine.order_id_counter > 1:
+            yield ('cancel', rng.randrange(1, engine.order_id_counter))
+        elif i % 2 == 0:
+            yield ('limit', 'buy', rng.randint(lo, ltp - 1), rng.randint(1, 10))
+        else:
+            yield ('limit', 'sell', rng.randint(ltp + 1, hi), rng.randint(1, 10))
+
+
+FLOWS = {
+    'demo': demo_flow,
+    'uniform': uniform_flow,
+    'deep_sweep': deep_sweep_flow,
+    'cancel_heavy': cancel_heavy_flow,
+}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_flow(name, depth, n, seed):
+    rng = random.Random(seed)
+    engine = MatchingEngine()
+    seed_book(engine, rng, depth)
+    latencies = []
+    trades = 0
+    clock = time.perf_counter_ns
+    limit = engine.place_limit_order
+    market = engine.place_market_order
+    cancel = engine.cancel_order
+    busy_ns = 0
+    for op in FLOWS[name](engine, rng, n, depth):
+        kind = op[0]
+        if kind == 'seed':
+            seed_book(engine, rng, op[1])
+            continue
+        if kind == 'limit':
+            t0 = clock()
+            tr, _ = limit(op[1], op[2], op[3], False)
+            dt = clock() - t0
+            trades += len(tr)
+        elif kind == 'market':
+            t0 = clock()
+            tr, _ = market(op[1], op[2], False)
+            dt = clock() - t0
+            trades += len(tr)
+        else:
+            t0 = clock()
+            cancel(op[1])
+            dt = clock() - t0
+        latencies.append(dt)
+        busy_ns += dt
+    latencies.sort()
+    seconds = busy_ns / 1e9
+    return {
+        'flow': name,
+        'depth': depth,
+        'orders': len(latencies),
+        'trades': trades,
+        'seconds': seconds,
+        'orders_per_sec': len(latencies) / seconds if seconds else 0.0,
+        'trades_per_sec': trades / seconds if seconds else 0.0,
+        'latency_ns': {
+            'p50': percentile(latencies, 0.50),
+            'p99': percentile(latencies, 0.99),
+            'p999': percentile(latencies, 0.999),
+            'max': latencies[-1] if latencies else 0,
+        },
+        'resting_after': len(engine.order_book['bids']) + len(engine.order_book['asks']),
+    }
+
+
+def bulk_orders(engine, kind, n, rng):
+    # Orders for engine's band. 'passive': a day's book load that never crosses
+    # (bids below the LTP, asks above it); 'mixed': limits over the whole band
+    lo, hi, ltp = engine.band.lo, engine.band.hi, engine.ltp
+    orders = []
+    for i in range(n):
+        side = 'buy' if i % 2 == 0 else 'sell'
+        if kind == 'passive':
+            price = rng.randint(lo, ltp - 1) if side == 'buy' else rng.randint(ltp + 1, hi)
+        else:
+            price = rng.randint(lo, hi)
+        orders.append((side, price, rng.randint(3, 12)))
+    return orders
+
+
+def bulk_array(orders):
+    # (side, price, qty) orders as a batch_dtype array
+    import numpy as np
+    arr = np.zeros(len(orders), dtype=batch_dtype())
+    arr['side'] = [side != 'buy' for side, _p, _q in orders]
+    arr['price'] = [price for _s, price, _q in orders]
+    arr['qty'] = [qty for _s, _p, qty in orders]
+    arr['taker_id'] = EMPTY
+    return arr
+
+
+def settle_book(engine):
+    # Link every bulk-rested order as a node, as in a book built order by order
+    for side in (engine.order_book['bids'], engine.order_book['asks']):
+        for level in side.levels.values():
+            if level.pending:
+                side.settle(level)
+
+
+def run_bulk(n, seed, repeats=3):
+    # Orders/sec loading n orders one place_limit_order call at a time vs one
+    # submit_batch call, best of `repeats` interleaved runs; the passive load is
+    # also submitted as a NumPy array when NumPy is installed. From
+    # BULK_CHECK_ORDERS orders, passive speedups below BULK_MIN_SPEEDUP fail an
+    # assertion.
+    results = []
+    for kind in ('passive', 'mixed'):
+        orders = bulk_orders(MatchingEngine(), kind, n, random.Random(seed))
+        inputs = {kind: orders}
+        if kind == 'passive' and importlib.util.find_spec('numpy') is not None:
+            inputs[kind + ' numpy'] = bulk_array(orders)
+        loop_s = float('inf')
+        batch_s = dict.fromkeys(inputs, float('inf'))
+        for _ in range(repeats):
+            engine = MatchingEngine()
+            gc.collect()
+            t0 = time.perf_counter()
+            for side, price, qty in orders:
+                engine.place_limit_order(side, price, qty, False, engine.next_taker_id())
+            loop_s = min(loop_s, time.perf_counter() - t0)
+            for name, batch in inputs.items():
+                engine = MatchingEngine()
+                gc.collect()
+                t0 = time.perf_counter()
+                engine.submit_batch(batch)
+                batch_s[name] = min(batch_s[name], time.perf_counter() - t0)
+        for name, seconds in batch_s.items():
+            res = {'kind': name, 'orders': n, 'loop_orders_per_sec': n / loop_s,
+                   'batch_orders_per_sec': n / seconds, 'speedup': loop_s / seconds}
+            results.append(res)
+            print(f"{'bulk ' + name:>17} {n:>9}: {res['loop_orders_per_sec']:>11,.0f} orders/s looped, "
+                  f"{res['batch_orders_per_sec']:>11,.0f} batched (x{res['speedup']:.2f})", file=sys.stderr)
+    for res in results if n >= BULK_CHECK_ORDERS else ():
+        least = BULK_MIN_SPEEDUP.get(res['kind'])
+        assert least is None or res['speedup'] >= least, \
+            f"submit_batch {res['kind']} load only x{res['speedup']:.2f} the looped rate (expected x{least})"
+    return results
+
+
+def run_sweep(levels, per_level, seed, repeats=5):
+    # One taker clearing `levels` ask levels of `per_level` orders each, as a market
+    # order, a marketable limit order and a one-order submit_batch. Each sweep is
+    # timed on a freshly loaded book; the median of `repeats` runs is reported.
+    rng = random.Random(seed)
+    asks = [('sell', DEFAULT_LTP + 1 + i // per_level, rng.randint(1, 10)) for i in range(levels * per_level)]
+    total = sum(q for _s, _p, q in asks)
+    top = DEFAULT_LTP + levels
+    band = PriceBand(DEFAULT_LTP, top)
+    sweeps = {
+        'market': lambda eng: len(eng.place_market_order('buy', total, False)[0]),
+        'limit': lambda eng: len(eng.place_limit_order('buy', top, total, False)[0]),
+        'batch': lambda eng: len(eng.submit_batch([('buy', None, total)])[0]['price']),
+    }
+    results = []
+    for kind, sweep in sweeps.items():
+        times = []
+        for _ in range(repeats):
+            engine = MatchingEngine(ltp=DEFAULT_LTP, band=band)
+            engine.submit_batch(asks)
+            settle_book(engine)
+            t0 = time.perf_counter()
+            fills = sweep(engine)
+            times.append(time.perf_counter() - t0)
+        assert fills == len(asks) and not engine.order_book['asks']
+        seconds = sorted(times)[len(times) // 2]
+        res = {'kind': kind, 'levels': levels, 'orders_per_level': per_level, 'fills': fills,
+               'sweep_ms': seconds * 1e3, 'fills_per_sec': fills / seconds}
+        results.append(res)
+        print(f"{'sweep ' + kind:>13} {levels:>6}x{per_level:<6}: {res['sweep_ms']:>8.2f} ms/sweep, "
+              f"{res['fills_per_sec']:>11,.0f} fills/s", file=sys.stderr)
+    return results
+
+
+def run_memory(n, seed):
+    # Bytes per resting order (tracemalloc) for a book of n passive orders, plus
+    # the load rate and how long a full GC pass over that book takes. The book
+    # is settled after loading, so every order is a node as in a traded book.
+    engine = MatchingEngine()
+    orders = bulk_orders(engine, 'passive', n, random.Random(seed))
+    t0 = time.perf_counter()
+    engine.submit_batch(orders)
+    load_s = time.perf_counter() - t0
+    settle_book(engine)
+    t0 = time.perf_counter()
+    gc.collect()
+    gc_s = time.perf_counter() - t0
+    del engine, orders
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        # Orders are generated under tracing and then dropped, so whatever the
+        # book keeps of its input (e.g. price ints) is counted, as with live order entry
+        engine = MatchingEngine()
+        orders = bulk_orders(engine, 'passive', n, random.Random(seed))
+        engine.submit_batch(orders)
+        settle_book(engine)
+        del orders
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    res = {'orders': n, 'bytes_per_order': used / n, 'book_mb': used / 1e6,
+           'load_orders_per_sec': n / load_s, 'full_gc_seconds': gc_s}
+    print(f"{'memory':>13} {n:>13}: {res['bytes_per_order']:>7.1f} bytes/order ({res['book_mb']:,.0f} MB), "
+          f"{res['load_orders_per_sec']:>11,.0f} orders/s load, full GC {gc_s * 1e3:.0f}ms", file=sys.stderr)
+    return res
+
+
+def run(flows, depths, n, seed, bulk=0, memory=(), sweep=None):
+    results = []
+    for name in flows:
+        for depth in depths:
+            res = run_flow(name, depth, n, seed)
+            results.append(res)
+            lat = res['latency_ns']
+            print(f"{name:>13} depth={depth:>7}: {res['orders_per_sec']:>11,.0f} orders/s "
+                  f"{res['trades_per_sec']:>11,.0f} trades/s  p50={lat['p50']:>6}ns "
+                  f"p99={lat['p99']:>7}ns p99.9={lat['p999']:>8}ns", file=sys.stderr)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'seed': seed,
+            'orders_per_run': n,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'results': results,
+        'bulk': run_bulk(bulk, seed) if bulk else [],
+        'sweep': run_sweep(*sweep, seed) if sweep else [],
+        'memory': [run_memory(size, seed) for size in memory],
+    }
+
+
+def compare(report, baseline, tolerance):
+    # Returns (flow, depth, old, new) for runs whose orders/sec fell by more than `tolerance`
+    old = {(r['flow'], r['depth']): r['orders_per_sec'] for r in baseline['results']}
+    regressions = []
+    for r in report['results']:
+        prev = old.get((r['flow'], r['depth']))
+        if prev and r['orders_per_sec'] < prev * (1 - tolerance):
+            regressions.append((r['flow'], r['depth'], prev, r['orders_per_sec']))
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--flows', default=','.join(DEFAULT_FLOWS), help="comma-separated: " + ', '.join(FLOWS))
+    ap.add_argument('--depths', default=','.join(map(str, DEFAULT_DEPTHS)), help="resting orders seeded before each run")
+    ap.add_argument('--orders', type=int, default=20000, help="orders per run")
+    ap.add_argument('--bulk', type=int, default=100000, help="orders in the looped vs submit_batch load comparison (0: skip)")
+    ap.add_argument('--sweep', default='20x1000', help="LEVELSxORDERS book for the single-taker sweep timing ('' to skip)")
+    ap.add_argument('--memory', default='', help="comma-separated book sizes to measure memory per resting order for")
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--out', help="write the JSON report here (default: stdout)")
+    ap.add_argument('--compare', help="baseline JSON report to check for regressions")
+    ap.add_argument('--tolerance', type=float, default=0.2, help="allowed orders/sec drop vs baseline (0.2 = 20%%)")
+    args = ap.parse_args(argv)
+
+    flows = [f for f in args.flows.split(',') if f]
+    unknown = set(flows) - set(FLOWS)
+    if unknown:
+        ap.error(f"unknown flow(s): {', '.join(sorted(unknown))}")
+    depths = [int(d) for d in args.depths.split(',') if d]
+    sweep = tuple(int(x) for x in args.sweep.lower().split('x')) if args.sweep else None
+    if sweep is not None and len(sweep) != 2:
+        ap.error(f"--sweep must be LEVELSxORDERS, not {args.sweep!r}")
+    report = run(flows, depths, args.orders, args.seed, args.bulk, [int(m) for m in args.memory.split(',') if m], sweep)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    elif not args.compare:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for flow, depth, prev, cur in regressions:
+            print(f"REGRESSION {flow} depth={depth}: {prev:,.0f} -> {cur:,.0f} orders/s", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""Order book checkpoints for fast restarts.
+
+A checkpoint is one binary file holding what is needed to carry on from a
+point in the event log: the resting orders of both sides in price-time
+priority (OID, price, qty and player-flag columns), the order and taker ID
+counters, the LTP, the player's stats and the ``(seq, ts_ns)`` of the last
+logged event it includes. Files are written under a temporary name and
+renamed, so the previous checkpoint stays usable until the next is complete.
+
+``CheckpointWriter`` copies the book on the calling thread, which is
+O(resting orders) (roughly 1 us per order), and encodes, syncs and renames the
+file on a background thread. It does not fork: the app runs the pygame,
+log-writer and feed threads, and a forked child of a threaded process can
+deadlock on a lock one of them held. A failed write is reported and counted,
+never raised into the engine thread.
+
+On startup, ``load`` plus ``restore`` rebuild the book. ``tail_events``
+returns the events logged after the checkpoint, reading the log backwards
+from its end, so restart time depends on the activity since the last
+checkpoint rather than on the length of the log. ``recent_events`` reads the
+newest events the same way, to refill in-memory histories.
+
+    writer = CheckpointWriter('book.ckpt')
+    writer.start(engine, last_event=(seq, ts_ns), clock_seq=seq)    # returns at once
+    ckpt = load('book.ckpt')
+    restore(engine, ckpt)
+    events = tail_events('events_log.bin', ckpt)    # None if the log does not continue from it
+"""
+import csv
+import gc
+import io
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import islice
+from operator import itemgetter
+
+from event_journal import JournalReader, event_values, record_to_event
+from timestamps import iso_to_ns
+
+MAGIC = b'OMEBOOK1'
+# magic, band repr, last event seq and ts_ns, clock seq, order/taker ID counters, LTP,
+# 6 player stats, bid and ask order counts, CRC-32 of the columns that follow
+HEADER = struct.Struct('<8s64sqqqqqq6qqqI')
+TAIL_BLOCK = 1 << 16  # bytes read per step when scanning a CSV log backwards
+
+Checkpoint = namedtuple('Checkpoint', [
+    'band',             # repr() of the engine's PriceBand
+    'seq', 'ts_ns',     # the last logged event the checkpoint includes
+    'clock_seq',        # EventClock.seq when it was taken
+    'order_id_counter', 'taker_id_counter', 'ltp',
+    'player',           # (submitted, fully filled, partially filled, unfilled on submit, last brokerage, total brokerage)
+    'bids', 'asks',     # [(price, qty, is_player, oid), ...] in price-time priority
+])
+
+
+@contextmanager
+def _gc_paused():
+    # Copying a big book allocates millions of objects that all survive; pausing
+    # the cyclic GC avoids repeated full scans of them (as submit_batch does)
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def _le(col):
+    # Column bytes, little-endian like the rest of the file
+    if sys.byteorder != 'little':
+        col.byteswap()
+    return col.tobytes()
+
+
+def _snapshot(engine, last_event=(0, 0), clock_seq=0, player=(0,) * 6):
+    # (header fields, bid rows, ask rows) copied out of the engine; the rows are
+    # tuples, so the copy stays valid while the engine keeps matching
+    with _gc_paused():
+        bids = list(engine.order_book['bids'])
+        asks = list(engine.order_book['asks'])
+    fields = (repr(engine.band).encode(), *last_event, clock_seq, engine.order_id_counter, engine.taker_id_counter,
+              engine.ltp, *player)
+    return fields, bids, asks
+
+
+def _encode(fields, bids, asks):
+    body = []
+    for rows in (bids, asks):
+        body += [_le(array('q', map(itemgetter(3), rows))), _le(array('q', map(itemgetter(0), rows))),
+                 _le(array('q', map(itemgetter(1), rows))), bytes(map(itemgetter(2), rows))]
+    body = b''.join(body)
+    return HEADER.pack(MAGIC, *fields, len(bids), len(asks), zlib.crc32(body)) + body
+
+
+def dumps(engine, last_event=(0, 0), clock_seq=0, player=(0,) * 6):
+    # The engine's book and counters as checkpoint bytes
+    return _encode(*_snapshot(engine, last_event, clock_seq, player))
+
+
+def loads(data):
+    if len(data) < HEADER.size or data[:8] != MAGIC:
+        raise ValueError("not an order book checkpoint")
+    (_magic, band, seq, ts_ns, clock_seq, order_id_counter, taker_id_counter, ltp,
+     *rest) = HEADER.unpack_from(data)
+    player, (n_bids, n_asks, crc) = tuple(rest[:6]), rest[6:]
+    body = memoryview(data)[HEADER.size:]
+    if len(body) != 25 * (n_bids + n_asks) or zlib.crc32(body) != crc:
+        raise ValueError("checkpoint is truncated or corrupt")
+    with _gc_paused():
+        sides = [_side(body, 0, n_bids), _side(body, 25 * n_bids, n_asks)]
+    return Checkpoint(band.rstrip(b'\0').decode(), seq, ts_ns, clock_seq, order_id_counter, taker_id_counter,
+                      ltp, player, *sides)
+
+
+def _side(body, pos, n):
+    # [(price, qty, is_player, oid), ...] from the columns of one side, which start at pos
+    cols = []
+    for _ in range(3):
+        col = array('q')
+        col.frombytes(body[pos:pos + 8 * n])
+        if sys.byteorder != 'little':
+            col.byteswap()
+        cols.append(col)
+        pos += 8 * n
+    oid, price, qty = cols
+    return list(zip(price, qty, map(bool, body[pos:pos + n]), oid))
+
+
+def write(path, data):
+    # Replace path with data atomically (written to path.tmp, synced, renamed)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load(path):
+    # The checkpoint at path, or None if there is none
+    try:
+        with open(path, 'rb') as f:
+            return loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def restore(engine, ckpt):
+    # Replace the engine's book, counters and LTP with the checkpoint's
+    if ckpt.band != repr(engine.band):
+        raise ValueError(f"checkpoint is for {ckpt.band}, the engine has {engine.band!r}")
+    engine.reset(ckpt.ltp)
+    with _gc_paused():
+        engine.order_book['bids'].add_many(ckpt.bids)
+        engine.order_book['asks'].add_many(ckpt.asks)
+    engine.order_id_counter = ckpt.order_id_counter
+    engine.taker_id_counter = ckpt.taker_id_counter
+
+
+def _csv_backwards(path):
+    # Rows of a CSV log with a seq column as dicts, newest first, read
+    # backwards from the end (none without a seq column)
+    with open(path, 'rb') as f:
+        header = next(csv.reader([f.readline().decode()]), [])
+        if 'seq' not in header:
+            return
+        start = f.tell()
+        pos = f.seek(0, os.SEEK_END)
+        rest = b''
+        while pos > start:
+            step = min(TAIL_BLOCK, pos - start)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + rest).split(b'\n')
+            rest = lines.pop(0) if pos > start else b''
+            for line in reversed(lines):
+                if line.strip():
+                    yield dict(zip(header, next(csv.reader(io.StringIO(line.decode())))))
+
+
+def _csv_tail(path, seq):
+    # (newest row with seq <= `seq` or None, the rows after it oldest first) of a CSV log
+    tail = []
+    for row in _csv_backwards(path):
+        if int(row['seq']) <= seq:
+            return row, tail[::-1]
+        tail.append(row)
+    return None, tail[::-1]
+
+
+def tail_events(path, ckpt):
+    """Events logged after the checkpoint, oldest first, as ``replay.read_events`` yields them.
+
+    ``path`` is ``events_log.csv`` or an ``events_log.bin`` journal. Returns
+    None when the log does not hold the checkpoint's last event as its newest
+    event with that seq or lower (another session's log, or one that lost
+    its tail).
+    """
+    if path.endswith('.bin'):
+        with JournalReader(path) as reader:
+            i = len(reader) - 1
+            while i >= 0 and reader[i][1] > ckpt.seq:
+                i -= 1
+            if i < 0 or reader[i][1] != ckpt.seq or reader[i][0] // 1000 != ckpt.ts_ns // 1000:
+                return None
+            return [record_to_event(reader[j]) for j in range(i + 1, len(reader))]
+    last, tail = _csv_tail(path, ckpt.seq)
+    if last is None or int(last['seq']) != ckpt.seq or iso_to_ns(last['timestamp_iso']) != ckpt.ts_ns // 1000 * 1000:
+        return None
+    for ev in tail:
+        ev['ts'] = ev.pop('timestamp_iso')
+    return tail
+
+
+def recent_events(path, n=None):
+    """The newest ``n`` events of a CSV log or journal (all if None), oldest first.
+
+    Events come back as ``log_event`` stamps them (``ts_ns``, typed fields)
+    whichever log they are read from; CSV notes are cut to the journal's
+    ``NOTE_BYTES`` like every event held in an ``EventStore``.
+    """
+    if path.endswith('.bin'):
+        with JournalReader(path) as reader:
+            return [record_to_event(reader[j]) for j in range(0 if n is None else max(0, len(reader) - n), len(reader))]
+    events = []
+    for ev in islice(_csv_backwards(path), n):
+        ev['ts_ns'] = iso_to_ns(ev.pop('timestamp_iso'))
+        events.append(record_to_event(event_values(ev)))
+    return events[::-1]
+
+
+def last_seq(path):
+    # Highest seq in a CSV log or journal (0 if it has none)
+    if path.endswith('.bin'):
+        with JournalReader(path) as reader:
+            return reader[-1][1] if len(reader) else 0
+    last = next(_csv_backwards(path), None)
+    return 0 if last is None else int(last['seq'])
+
+
+class CheckpointWriter:
+    """Writes checkpoints of an engine to ``path`` in the background, one at a time.
+
+    A failed write leaves the previous checkpoint in place; it is printed to
+    stderr, counted in ``failed`` and kept in ``error``, and never raised.
+    ``last_event`` is the ``last_event`` of the newest checkpoint written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.written = 0
+        self.failed = 0
+        self.error = None
+        self.last_event = None
+        self._thread = None
+
+    def busy(self):
+        # True while a checkpoint is being written
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, engine, **state):
+        """Begin writing engine's current state (``dumps`` keywords); False if one is still in progress."""
+        if self.busy():
+            return False
+        snapshot = _snapshot(engine, **state)
+        self._thread = threading.Thread(target=self._write, args=(snapshot,), name='checkpoint', daemon=True)
+        self._thread.start()
+        return True
+
+    def _write(self, snapshot):
+        # True once the snapshot is on disk
+        try:
+            write(self.path, _encode(*snapshot))
+        except Exception as exc:
+            self.failed += 1
+            self.error = exc
+            print(f"checkpoint to {self.path} failed: {exc!r}", file=sys.stderr)
+            return False
+        self.written += 1
+        self.last_event = tuple(snapshot[0][1:3])
+        return True
+
+    def wait(self):
+        # Block until the checkpoint in progress (if any) is on disk or has failed
+        if self._thread is not None:
+            self._thread.join()
+
+    def save(self, engine, **state):
+        # Write a checkpoint on the calling thread (e.g. at shutdown); False if it failed
+        self.wait()
+        return self._write(_snapshot(engine, **state))
@@ -0,0 +1,150 @@
+"""Buffered background writer for the simulator's CSV logs.
+
+Callers hand rows to ``CsvLogSink.put``, which only enqueues them. A writer
+thread keeps every file open, batches rows and writes them once enough have
+piled up (``flush_rows``) or the oldest buffered row is ``flush_interval``
+seconds old. ``flush`` blocks until everything queued so far is on disk and
+``close`` drains the queue and closes the files; ``close`` also runs at
+interpreter exit so rows are not lost on quit.
+
+Each row starts with its ``time.time_ns()`` stamp; the writer thread turns it
+into the ``timestamp_iso`` text, so callers never format times. A log written
+with a different header (an older schema) is moved aside to ``NAME.old.csv``
+rather than appended to.
+"""
+import atexit
+import csv
+import os
+import queue
+import threading
+import time
+
+from timestamps import ns_to_iso
+
+TRADES_HEADER = [
+    'timestamp_iso', 'seq', 'price', 'qty', 'taker_label', 'counterparty_label',
+    'resting_side', 'resting_order_id', 'taker_id'
+]
+EVENTS_HEADER = ['timestamp_iso', 'seq', 'event', 'actor', 'taker_id', 'order_id', 'side', 'order_type', 'price', 'qty',
+                 'filled_qty', 'status', 'note']
+
+_CLOSE = object()
+
+
+def _header_of(path):
+    with open(path, newline='') as fh:
+        return next(csv.reader(fh), None)
+
+
+class CsvLogSink:
+    """Append rows to named CSV files from a background thread.
+
+    ``files`` maps a name to ``(path, header)``; the header is written when the
+    file is new or empty.
+    """
+
+    def __init__(self, files, flush_rows=256, flush_interval=0.5):
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.error = None
+        self._queue = queue.SimpleQueue()
+        self._handles = {}
+        self._writers = {}
+        for name, (path, header) in files.items():
+            needs_header = not os.path.exists(path) or os.path.getsize(path) == 0
+            if not needs_header and _header_of(path) != header:
+                root, ext = os.path.splitext(path)
+                os.replace(path, f"{root}.old{ext}")
+                needs_header = True
+            fh = open(path, 'a', newline='')
+            writer = csv.writer(fh)
+            if needs_header:
+                writer.writerow(header)
+                fh.flush()
+            self._handles[name] = fh
+            self._writers[name] = writer
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='csv-log-sink', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, name, rows):
+        # rows: list of row lists for file `name`, each starting with a ts_ns; returns immediately
+        if self._closed:
+            raise ValueError("log sink is closed")
+        if name not in self._writers:
+            raise ValueError(f"unknown log {name!r}; expected one of {', '.join(self._writers)}")
+        self._queue.put((name, rows))
+
+    def flush(self):
+        # Block until every row queued before this call has been written
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+        self._raise_error()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self.error is not None:
+            err, self.error = self.error, None
+            raise err
+
+    def _run(self):
+        pending = {name: [] for name in self._writers}
+        buffered = 0
+        oldest = None
+        while True:
+            timeout = None if oldest is None else max(0.0, oldest + self.flush_interval - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            try:
+                if isinstance(item, tuple):
+                    name, rows = item
+                    pending[name].extend(rows)
+                    buffered += len(rows)
+                    if oldest is None:
+                        oldest = time.monotonic()
+                    if buffered < self.flush_rows:
+                        continue
+                self._write(pending)
+            except Exception as exc:
+                # Any failure is kept for flush()/close() to raise; the thread
+                # must stay alive to answer them, or they would wait forever
+                self.error = exc
+            buffered = 0
+            oldest = None
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _CLOSE:
+                for fh in self._handles.values():
+                    try:
+                        fh.close()
+                    except OSError as exc:
+                        self.error = exc
+                return
+
+    def _write(self, pending):
+        for name, rows in pending.items():
+            if not rows:
+                continue
+            try:
+                for row in rows:
+                    row[0] = ns_to_iso(row[0])
+                self._writers[name].writerows(rows)
+                self._handles[name].flush()
+            except Exception as exc:
+                # A bad row or a failed write costs this batch of this file only
+                self.error = exc
+            finally:
+                rows.clear()
@@ -0,0 +1,685 @@
+"""Background matching thread for the pygame UI.
+
+``EngineWorker`` owns the ``MatchingEngine`` and everything that runs per
+order: the CSV logs and binary journal, the in-memory histories, latency
+timing, the market-data feed, and the SPACE-key bot and demo agents. The UI
+sends it commands (``submit``, ``cancel``, ``reset``, ``set_bot``, ...) through
+a queue. Each frame it reads ``worker.snapshot``, an immutable ``UISnapshot``
+that the thread republishes whenever something changed, at most every
+``publish_interval`` seconds and immediately after a UI command. Matching
+throughput no longer depends on the frame rate, and the UI never sees a
+half-applied order. ``demo_step``/``bot_pair`` run one agent step directly;
+``simulate.py`` calls them on a worker that was never started.
+
+With ``checkpoint_path`` the book is checkpointed (``checkpoint.py``) every
+``checkpoint_interval`` seconds, on ``checkpoint()`` and at ``stop()``, and a
+new worker resumes from the checkpoint plus the events logged after it
+instead of starting with an empty book. The newest ``history_in_memory``
+logged events (back to the last reset) refill the tables, the trade history
+and the candles; ``fifo_log`` and anything older are not reloaded. A failed
+checkpoint is reported on stderr and the engine carries on.
+
+    worker = EngineWorker('executed_trades.csv', 'events_log.csv')
+    worker.start()
+    worker.submit('LIMIT', 'Buy', 1000, 10)
+    snap = worker.snapshot                 # book, stats, table rows, recent prints
+    worker.stop()                          # drains the queue, closes the logs
+"""
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque, namedtuple
+
+from agents import bot_orders, demo_order
+from checkpoint import (CheckpointWriter, last_seq, load as load_checkpoint, recent_events, restore as restore_checkpoint,
+                        tail_events)
+from csv_sink import CsvLogSink, EVENTS_HEADER, TRADES_HEADER
+from event_journal import EventJournal
+from event_store import EventStore
+from history import fifo_history, trade_history
+from latency import LatencyRecorder
+from market_data import BookMirror, MarketDataPublisher, SocketFeed
+from matching_engine import MatchingEngine
+from replay import replay
+from timestamps import EventClock, iso_to_ns
+from trade_analytics import BROKERAGE_PER_ORDER, BarBuilder
+
+BOOK_ROWS = 21             # price levels in the book window
+BOT_PAIRS_PER_SEC = 90     # SPACE bot buy/sell limit pairs per second while the key is held
+DEMO_STEPS = 15
+DEMO_INTERVAL = 1.0        # seconds between demo steps
+PUBLISH_INTERVAL = 1 / 60  # minimum seconds between snapshots while orders stream in
+RECENT_PRINTS = 64         # trade prints carried in each snapshot (for flashes)
+CANDLE_SECONDS = 5         # bar interval of the live candles
+CANDLES = 15               # newest bars carried in each snapshot
+
+PlayerStats = namedtuple('PlayerStats', 'submitted fully_filled partially_filled unfilled_on_submit '
+                                        'last_brokerage total_brokerage')
+
+UISnapshot = namedtuple('UISnapshot', [
+    'version',          # increments with every snapshot
+    'sync',             # changes when the book view should jump rather than animate (reset, sample book, demo step)
+    'bids', 'asks',     # ((price, total qty), ...) best first inside the window, from the market-data feed
+    'window',           # (lowest, highest) price of the book window, in ticks
+    'best_bid', 'best_ask', 'ltp',
+    'occupied_levels', 'open_orders', 'open_qty', 'spread_ticks',
+    'player',           # PlayerStats
+    'view',             # (mode, offset, count) the rows were built for
+    'rows',             # event dicts (read-only) or pending (oid, owner, side, qty, price) tuples
+    'row_total',        # rows available in that view, for scrolling
+    'prints',           # recent ((feed seq, price, aggressor), ...) trade prints
+    'demo_steps_left',  # 0 when no demo is running
+    'latency',          # (count, p50_ns, p99_ns, max_ns) or None when timing is off
+    'orders',           # orders matched by the thread since start
+    'candles',          # newest OHLCV bars ((start_ns, open, high, low, close, volume), ...), oldest first
+])
+
+
+class EngineWorker:
+    """Runs the engine, logging and bot/demo agents on a background thread."""
+
+    def __init__(self, trades_csv_path, events_csv_path, journal_path=None, latency_path=None,
+                 history_in_memory=10000, flush_rows=256, flush_interval=0.5, measure_latency=True,
+                 latency_dump_interval=None, market_data_port=None, bot_pairs_per_sec=BOT_PAIRS_PER_SEC,
+                 demo_interval=DEMO_INTERVAL, publish_interval=PUBLISH_INTERVAL, band=None, book_rows=BOOK_ROWS,
+                 candle_seconds=CANDLE_SECONDS, candles=CANDLES, checkpoint_path=None, checkpoint_interval=None,
+                 restore=True, seed=None):
+        self.engine = MatchingEngine(band=band)
+        self.band = self.engine.band
+        self.rng = random.Random(seed)
+        self._reset_player_stats()
+        self._last_event = (0, 0)  # (seq, ts_ns) of the newest logged event
+        # Resume from the last checkpoint before anything is logged or published
+        self.restored_events = None  # events replayed on top of the checkpoint; None for a fresh session
+        self._restored_from = None   # the log those events were read from
+        clock_seq = 0
+        if checkpoint_path and restore:
+            clock_seq = self._restore(checkpoint_path, journal_path, events_csv_path, trades_csv_path)
+        self.checkpoints = CheckpointWriter(checkpoint_path) if checkpoint_path else None
+        self.checkpoint_interval = checkpoint_interval
+        self._next_checkpoint = time.monotonic() + checkpoint_interval if checkpoint_interval else None
+        self.history_in_memory = history_in_memory
+        self.bot_pairs_per_sec = bot_pairs_per_sec
+        self.demo_interval = demo_interval
+        self.publish_interval = publish_interval
+        # The book view is built from the L2 feed rather than by walking the book
+        self.md_feed = MarketDataPublisher(self.engine)
+        self.book_view = BookMirror()
+        self.md_feed.subscribe(self.book_view)
+        self.md_socket = SocketFeed(self.md_feed, port=market_data_port) if market_data_port else None
+        self._prints = deque(maxlen=RECENT_PRINTS)
+        self.md_feed.subscribe(self._on_market_data, snapshot=False)
+        self.trade_log = trade_history(history_in_memory)
+        self.fifo_log = fifo_history(history_in_memory)  # tuples: (order_id, side, price, filled_qty, taker, taker_id)
+        self.events_log = EventStore(history_in_memory)  # general event log for UI, indexed by event type
+        self.clock = EventClock(clock_seq)  # (ts_ns, seq) for every logged event and trade row
+        self.bars = BarBuilder(candle_seconds, keep=candles)  # live bars of the logged trades
+        self._candles = (-1, ())  # (bars version, candles) last published
+        self.log_sink = CsvLogSink({'trades': (trades_csv_path, TRADES_HEADER), 'events': (events_csv_path, EVENTS_HEADER)},
+                                   flush_rows=flush_rows, flush_interval=flush_interval)
+        self.journal = EventJournal(journal_path) if journal_path else None
+        self.latency = LatencyRecorder(measure_latency, latency_path, latency_dump_interval)
+        self.orders = 0
+        self.error = None
+        self.snapshot = None
+        self._version = 0
+        self._sync = 0
+        self._view = ('executed', 0, 6)
+        self._book_rows = book_rows
+        self._book_scroll = 0
+        self._commands = queue.Queue()
+        self._bot_active = False
+        self._bot_start = self._bot_done = 0
+        self._demo_steps_left = 0
+        self._demo_next = 0.0
+        self._thread = threading.Thread(target=self._run, name='engine', daemon=True)
+        if self.restored_events is None:
+            self.log_reset('', 'session start')
+        else:
+            self._reload_history(self._restored_from)
+        self._publish()
+
+    # --- Commands (called from the UI thread) ---
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, order_type, side, price, qty):
+        # Player order: order_type 'LIMIT'/'MARKET', side 'Buy'/'Sell'
+        self._commands.put(('submit', order_type, side, price, qty))
+
+    def cancel(self, oid):
+        self._commands.put(('cancel', oid))
+
+    def amend(self, row, new_qty, new_price):
+        # row: pending-table tuple (oid, owner, 'Bid'/'Ask', qty, price)
+        self._commands.put(('amend', row, new_qty, new_price))
+
+    def reset(self):
+        self._commands.put(('reset',))
+
+    def sample_book(self):
+        self._commands.put(('sample',))
+
+    def start_demo(self, steps=DEMO_STEPS):
+        self._commands.put(('demo', steps))
+
+    def set_bot(self, active):
+        self._commands.put(('bot', active))
+
+    def set_view(self, mode, offset, count):
+        # Which table rows the snapshots should carry
+        self._commands.put(('view', mode, offset, count))
+
+    def checkpoint(self):
+        # Checkpoint the book now (in the background; skipped while one is being written)
+        self._commands.put(('checkpoint',))
+
+    def scroll_book(self, ticks):
+        # Move the book window up (positive) or down by this many ticks; None recentres it on the LTP
+        self._commands.put(('book', ticks))
+
+    def stop(self):
+        # Processes everything already queued, then closes the logs
+        if self._thread.is_alive():
+            self._commands.put(('stop',))
+            self._thread.join()
+        else:
+            self._close()
+        if self.error is not None:
+            raise self.error
+
+    # --- Thread ---
+
+    def _run(self):
+        try:
+            self._loop()
+        except BaseException as exc:
+            self.error = exc
+        finally:
+            self._close()
+
+    def _loop(self):
+        changed = False
+        next_publish = 0.0
+        while True:
+            now = time.monotonic()
+            wait = 0.05
+            if self._bot_active:
+                wait = min(wait, max(0.0, self._bot_start + (self._bot_done + 1) / self.bot_pairs_per_sec - now))
+            if self._demo_steps_left:
+                wait = min(wait, max(0.0, self._demo_next - now))
+            if changed:
+                wait = min(wait, max(0.0, next_publish - now))
+            commanded = False
+            try:
+                cmd = self._commands.get(timeout=wait)
+                while True:
+                    if cmd[0] == 'stop':
+                        self._publish()
+                        return
+                    self._handle(cmd)
+                    commanded = changed = True
+                    cmd = self._commands.get_nowait()
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            if self._bot_active:
+                rate = self.bot_pairs_per_sec
+                due = int((now - self._bot_start) * rate) - self._bot_done
+                if due > rate:
+                    # More than a second behind (rate above what the engine sustains): drop the backlog
+                    self._bot_done += due - rate
+                    due = rate
+                # Run at most one publish interval's worth before checking commands and publishing again
+                burst = min(due, max(1, int(rate * self.publish_interval)))
+                for _ in range(burst):
+                    self.bot_pair()
+                if burst > 0:
+                    self._bot_done += burst
+                    changed = True
+            if self._demo_steps_left and now >= self._demo_next:
+                self.demo_step()
+                self._demo_steps_left -= 1
+                self._demo_next = now + self.demo_interval
+                changed = True
+            self.latency.maybe_dump()
+            if self._next_checkpoint is not None and now >= self._next_checkpoint:
+                self._checkpoint()
+            self.md_feed.poll()
+            if self.md_socket is not None:
+                self.md_socket.poll()
+            if changed and (commanded or now >= next_publish):
+                self._publish()
+                changed = False
+                next_publish = now + self.publish_interval
+
+    def _handle(self, cmd):
+        kind = cmd[0]
+        if kind == 'submit':
+            self._player_order(*cmd[1:])
+        elif kind == 'cancel':
+            self._cancel_resting(cmd[1])
+        elif kind == 'amend':
+            self._amend_resting(*cmd[1:])
+        elif kind == 'reset':
+            self._reset()
+        elif kind == 'sample':
+            self._sample_book()
+        elif kind == 'demo':
+            self._demo_steps_left = cmd[1]
+            self._demo_next = time.monotonic() + self.demo_interval
+        elif kind == 'bot':
+            if cmd[1] and not self._bot_active:
+                # Start one pair "late" so the first pair goes out immediately
+                self._bot_start = time.monotonic() - 1 / self.bot_pairs_per_sec
+                self._bot_done = 0
+            self._bot_active = cmd[1]
+        elif kind == 'checkpoint':
+            self._checkpoint()
+        elif kind == 'view':
+            self._view = cmd[1:]
+        elif kind == 'book':
+            if cmd[1] is None:
+                self._book_scroll = 0
+            else:
+                # Scroll no further than the band edge, so scrolling back responds at once
+                top = self._book_window(self._book_scroll + cmd[1])[1]
+                self._book_scroll = top - (self.engine.ltp + self._book_rows // 2)
+        else:
+            raise ValueError(f"unknown command {kind!r}")
+
+    def _close(self):
+        if self.log_sink is None:
+            return
+        self.latency.dump()
+        if self.md_socket is not None:
+            self.md_socket.close()
+        self.log_sink.close()
+        if self.journal is not None:
+            self.journal.close()
+        self.log_sink = None
+        if self.checkpoints is not None:
+            if self.error is None:
+                self.checkpoints.save(self.engine, **self._checkpoint_state())
+            else:
+                self.checkpoints.wait()  # after a failure the book may be half-updated: keep the last good one
+
+    # --- Checkpoints ---
+
+    def _checkpoint_state(self):
+        return {'last_event': self._last_event, 'clock_seq': self.clock.seq,
+                'player': (self.player_orders_submitted, self.player_orders_fully_filled,
+                           self.player_orders_partially_filled, self.player_orders_unfilled_on_submit,
+                           self.last_order_brokerage, self.total_brokerage_paid)}
+
+    def _checkpoint(self):
+        # Start a background checkpoint once the logs hold every event it includes
+        # (nothing to do if no event was logged since the last one)
+        writer = self.checkpoints
+        if writer is None or writer.busy():
+            return
+        if self.checkpoint_interval:
+            self._next_checkpoint = time.monotonic() + self.checkpoint_interval
+        if self._last_event == writer.last_event:
+            return
+        self.log_sink.flush()
+        if self.journal is not None:
+            self.journal.flush()
+        writer.start(self.engine, **self._checkpoint_state())
+
+    def _restore(self, checkpoint_path, journal_path, events_path, trades_path):
+        # Book, IDs, LTP and player stats from the checkpoint, then the events
+        # logged after it (journal first, else the CSV); returns the seq to
+        # continue from, or 0 to start a fresh session when there is no
+        # checkpoint or the logs do not continue from it
+        ckpt = load_checkpoint(checkpoint_path)
+        if ckpt is None or ckpt.band != repr(self.band):
+            return 0
+        events = None
+        for path in (journal_path, events_path):
+            if path and os.path.exists(path):
+                events = tail_events(path, ckpt)
+                if events is not None:
+                    self._restored_from = path
+                    break
+        if events is None:
+            return 0
+        restore_checkpoint(self.engine, ckpt)
+        (self.player_orders_submitted, self.player_orders_fully_filled, self.player_orders_partially_filled,
+         self.player_orders_unfilled_on_submit, self.last_order_brokerage, self.total_brokerage_paid) = ckpt.player
+        self._last_event = (ckpt.seq, ckpt.ts_ns)
+        replay(events, self.engine)
+        for ev in events:
+            if ev['event'] == 'reset' and ev['actor'] == 'You' and ev['note'] == 'reset':
+                self._reset_player_stats()
+            elif ev['event'] == 'result' and ev['actor'] == 'You':
+                # The counters _player_order keeps, from its logged result
+                self.player_orders_submitted += 1
+                status = ev['status']
+                if status == 'filled':
+                    self.player_orders_fully_filled += 1
+                elif status == 'partial':
+                    self.player_orders_partially_filled += 1
+                else:
+                    self.player_orders_unfilled_on_submit += 1
+                self.last_order_brokerage = BROKERAGE_PER_ORDER if int(ev['filled_qty']) > 0 else 0
+                self.total_brokerage_paid += self.last_order_brokerage
+        if events:
+            last = events[-1]
+            self._last_event = (int(last['seq']), last['ts_ns'] if 'ts_ns' in last else iso_to_ns(last['ts']))
+        self.restored_events = len(events)
+        return max(ckpt.clock_seq, *(last_seq(p) for p in (journal_path, events_path, trades_path)
+                                      if p and os.path.exists(p)))
+
+    def _reload_history(self, path):
+        # The newest logged events since the last reset back into the tables,
+        # trade history and candles, as if this session had logged them
+        events = recent_events(path, self.history_in_memory)
+        start = 0
+        for i, ev in enumerate(events):
+            if ev['event'] == 'reset' and ev['note'] in ('session start', 'reset'):
+                start = i
+        for ev in events[start:]:
+            self.events_log.append(ev)
+            if ev['event'] == 'trade':
+                roid, tid = ev['order_id'], ev['taker_id']
+                self.trade_log.append((ev['price'], ev['qty'], ev['actor'], ev['note'],
+                                       None if roid == '' else roid, None if tid == '' else tid))
+        for ev in events:
+            if ev['event'] == 'trade':
+                self.bars.add(ev['ts_ns'], ev['price'], ev['qty'])
+
+    def _on_market_data(self, msg):
+        if msg['type'] == 'trade':
+            self._prints.append((msg['seq'], msg['price'], msg['aggressor']))
+
+    def _publish(self):
+        engine = self.engine
+        book_stats = engine.stats
+        book_view = self.book_view
+        mode, offset, count = self._view
+        rows, total = self._rows(mode, offset, count)
+        lat = self.latency.overall
+        if self._candles[0] != self.bars.version:
+            self._candles = (self.bars.version, self.bars.candles())
+        # Only the window's levels are copied, however many prices the band has
+        lo, hi = self._book_window(self._book_scroll)
+        bids, asks = book_view.bids, book_view.asks
+        self._version += 1
+        self.snapshot = UISnapshot(
+            version=self._version, sync=self._sync,
+            bids=tuple((px, bids[px][0]) for px in range(hi, lo - 1, -1) if px in bids),
+            asks=tuple((px, asks[px][0]) for px in range(lo, hi + 1) if px in asks),
+            window=(lo, hi),
+            best_bid=book_stats.best_bid, best_ask=book_stats.best_ask, ltp=book_view.ltp,
+            occupied_levels=book_stats.occupied_levels, open_orders=book_stats.player_open_orders,
+            open_qty=book_stats.player_open_qty, spread_ticks=book_stats.spread_ticks,
+            player=PlayerStats(self.player_orders_submitted, self.player_orders_fully_filled,
+                               self.player_orders_partially_filled, self.player_orders_unfilled_on_submit,
+                               self.last_order_brokerage, self.total_brokerage_paid),
+            view=(mode, offset, count), rows=rows, row_total=total, prints=tuple(self._prints),
+            demo_steps_left=self._demo_steps_left,
+            latency=(lat.count, lat.percentile(0.50), lat.percentile(0.99), lat.max) if self.latency.enabled else None,
+            orders=self.orders, candles=self._candles[1])
+
+    def _book_window(self, scroll):
+        # (lo, hi) prices of book_rows ticks around the LTP, moved by scroll and kept inside the band
+        band = self.band
+        rows = self._book_rows
+        hi = min(band.hi, max(band.lo + rows - 1, self.engine.ltp + rows // 2 + scroll))
+        return max(band.lo, hi - rows + 1), hi
+
+    def _rows(self, mode, offset, count):
+        if mode == 'pending':
+            # Ladder iteration already yields price-time priority: bids (price desc, FIFO), asks (price asc, FIFO)
+            book = self.engine.order_book
+            pending = [(oid, 'You' if is_pl else 'Bot', 'Bid', q, p) for p, q, is_pl, oid in book['bids']]
+            pending += [(oid, 'You' if is_pl else 'Bot', 'Ask', q, p) for p, q, is_pl, oid in book['asks']]
+            start = min(offset, max(0, len(pending) - count))
+            return tuple(pending[start:start + count]), len(pending)
+        event = {'executed': 'trade', 'orders_punched': 'submit'}.get(mode)
+        total = self.events_log.count(event)
+        start = min(offset, max(0, total - count))
+        return tuple(self.events_log.newest(event, start, count)), total
+
+    # --- Logging ---
+
+    def append_trades_to_csv(self, trades):
+        # trades: list of tuples (price, qty, taker_label, counterparty_label, resting_oid, taker_id)
+        stamp = self.clock.stamp
+        add_bar = self.bars.add
+        rows = []
+        for tr in trades:
+            price, qty, taker_label, counterparty_label = tr[0], tr[1], tr[2], tr[3]
+            resting_oid = tr[4] if len(tr) > 4 else ''
+            taker_id = tr[5] if len(tr) > 5 else ''
+            resting_side = 'Ask' if ('Seller' in counterparty_label) else 'Bid'
+            ts_ns, seq = stamp()
+            add_bar(ts_ns, price, qty)
+            rows.append([ts_ns, seq, price, qty, taker_label, counterparty_label, resting_side, resting_oid, taker_id])
+        self.log_sink.put('trades', rows)
+
+    def log_event(self, ev):
+        # ev: event dict without a timestamp; it is stamped here, as it happens
+        ts_ns, seq = self.clock.stamp()
+        ev['ts_ns'] = ts_ns
+        ev['seq'] = seq
+        self._last_event = (seq, ts_ns)
+        self.events_log.append(ev)
+        self.log_sink.put('events', [[
+            ts_ns, seq, ev.get('event'), ev.get('actor'), ev.get('taker_id'), ev.get('order_id'), ev.get('side'),
+            ev.get('order_type'), ev.get('price'), ev.get('qty'), ev.get('filled_qty'), ev.get('status'), ev.get('note')
+        ]])
+        if self.journal is not None:
+            self.journal.append(ev)
+
+    def log_reset(self, actor, note):
+        # Marks where the book was cleared so replays know to clear theirs too
+        self.log_event({'event': 'reset', 'actor': actor, 'taker_id': '', 'order_id': '', 'side': '',
+                        'order_type': '', 'price': '', 'qty': 0, 'filled_qty': 0, 'status': '', 'note': note})
+
+    def _log_order(self, actor, tid, side, order_type, price, qty, tr, note=''):
+        # Result event plus one trade event per fill for an order already logged as submitted
+        filled = sum(q for _p, q, _w, _c, _roid, _tid in tr)
+        status = 'filled' if filled >= qty else ('partial' if filled > 0 else 'open')
+        self.log_event({'event': 'result', 'actor': actor, 'taker_id': tid,
+                        'order_id': '', 'side': side, 'order_type': order_type, 'price': price, 'qty': qty,
+                        'filled_qty': filled, 'status': status, 'note': note})
+        for (p, q, taker_label, cp_label, roid, t) in tr:
+            self.log_event({'event': 'trade', 'actor': taker_label, 'taker_id': t,
+                            'order_id': roid, 'side': side, 'order_type': order_type, 'price': p, 'qty': q,
+                            'filled_qty': q, 'status': 'executed', 'note': cp_label})
+        return filled, status
+
+    def _log_submit(self, actor, tid, side, order_type, price, qty, note='', oid=''):
+        self.log_event({'event': 'submit', 'actor': actor, 'taker_id': tid,
+                        'order_id': oid, 'side': side, 'order_type': order_type, 'price': price, 'qty': qty,
+                        'filled_qty': 0, 'status': 'submitted', 'note': note})
+
+    # --- Order paths ---
+
+    def _reset_player_stats(self):
+        self.player_orders_submitted = 0
+        self.player_orders_fully_filled = 0
+        self.player_orders_partially_filled = 0
+        self.player_orders_unfilled_on_submit = 0
+        self.last_order_brokerage = 0
+        self.total_brokerage_paid = 0
+
+    def _player_order(self, order_type, side, price, qty):
+        # Player submits an order; brokerage (BROKERAGE_PER_ORDER) applies only if any part gets filled
+        engine = self.engine
+        self.player_orders_submitted += 1
+        self.last_order_brokerage = 0
+        taker_id = engine.next_taker_id()
+        lat_t0 = self.latency.start()
+        self._log_submit('You', taker_id, side, order_type, price, qty)
+        if order_type == "LIMIT":
+            tr, fifo = engine.place_limit_order(side.lower(), price, qty, True, taker_id)
+        else:
+            tr, fifo = engine.place_market_order(side.lower(), qty, True, taker_id)
+        self.orders += 1
+        if tr:
+            self.trade_log.extend(tr)
+            self.fifo_log.extend(fifo)
+            self.append_trades_to_csv(tr)
+        filled, status = self._log_order('You', taker_id, side, order_type, price, qty, tr)
+        if status == 'filled':
+            self.player_orders_fully_filled += 1
+        elif status == 'partial':
+            self.player_orders_partially_filled += 1
+        else:
+            self.player_orders_unfilled_on_submit += 1
+        if filled > 0:
+            self.last_order_brokerage = BROKERAGE_PER_ORDER
+            self.total_brokerage_paid += BROKERAGE_PER_ORDER
+        self.latency.stop(lat_t0, order_type, side, tr)
+
+    def _cancel_resting(self, oid):
+        res = self.engine.cancel_order(oid)
+        if res is None:
+            return
+        side, price, qty, is_pl, _oid = res
+        self.log_event({'event': 'cancel', 'actor': ('You' if is_pl else 'Bot'), 'taker_id': '',
+                        'order_id': oid, 'side': ('Buy' if side == 'buy' else 'Sell'), 'order_type': 'LIMIT', 'price': price,
+                        'qty': qty, 'filled_qty': 0, 'status': 'cancelled', 'note': ''})
+
+    def _amend_resting(self, row, new_qty, new_price):
+        oid, owner, side_label, old_qty, old_price = row
+        res = self.engine.amend_order(oid, new_qty=new_qty, new_price=new_price)
+        if res is None:
+            return
+        tr, fifo = res
+        side = 'Buy' if side_label == 'Bid' else 'Sell'
+        filled = sum(q for _p, q, _w, _c, _roid, _tid in tr)
+        self.log_event({'event': 'amend', 'actor': owner, 'taker_id': '',
+                        'order_id': oid, 'side': side, 'order_type': 'LIMIT', 'price': new_price, 'qty': new_qty,
+                        'filled_qty': filled, 'status': 'amended', 'note': f'was {old_qty}@{old_price}'})
+        if tr:
+            self.trade_log.extend(tr)
+            self.fifo_log.extend(fifo)
+            self.append_trades_to_csv(tr)
+            # An amend has no taker ID: its fills are logged with a blank one, like the amend itself
+            for (p, q, taker_label, cp_label, roid, _tid) in tr:
+                self.log_event({'event': 'trade', 'actor': taker_label, 'taker_id': '',
+                                'order_id': roid, 'side': side, 'order_type': 'LIMIT', 'price': p, 'qty': q,
+                                'filled_qty': q, 'status': 'executed', 'note': cp_label})
+
+    def _reset(self):
+        # Reset entire simulation state (make sure logged rows reach disk first)
+        self.log_sink.flush()
+        if self.journal is not None:
+            self.journal.flush()
+        self.engine.reset()
+        for old_log in (self.trade_log, self.fifo_log, self.events_log):
+            old_log.close()
+        self.trade_log = trade_history(self.history_in_memory)
+        self.fifo_log = fifo_history(self.history_in_memory)
+        self.events_log = EventStore(self.history_in_memory)
+        self._reset_player_stats()
+        self._book_scroll = 0
+        self._sync += 1
+        self.log_reset('You', 'reset')
+
+    def _sample_book(self):
+        # Populate a rich sample book, then run two demo trades (buy then sell) to showcase LTP and flashes
+        engine = self.engine
+        engine.clear_book()
+        self.log_reset('You', 'sample book')
+        band = self.band
+        mid = band.mid
+
+        def add_resting(side, offset, qty, is_player=False):
+            # offset: ticks from the band's mid price; levels outside a narrow band are skipped
+            price = mid + offset
+            if not band.lo <= price <= band.hi:
+                return
+            oid = engine.add_resting('buy' if side == 'bid' else 'sell', price, qty, is_player)
+            # log a submit for visibility
+            self._log_submit('You' if is_player else 'Bot', engine.taker_id_counter, 'Buy' if side == 'bid' else 'Sell',
+                             'LIMIT', price, qty, oid=oid)
+        # Bids (Buy side): multiple levels, mix of Bot and You
+        add_resting('bid',  0,  8, True)    # You at best bid
+        add_resting('bid',  0,  4, False)
+        add_resting('bid', -1,  6, False)
+        add_resting('bid', -1,  5, True)
+        add_resting('bid', -2, 10, False)
+        add_resting('bid', -2,  7, False)
+        add_resting('bid', -3, 12, False)
+        add_resting('bid', -4, 14, False)
+        add_resting('bid', -5, 11, False)
+        # Asks (Sell side)
+        add_resting('ask',  1,  7, False)   # Best ask
+        add_resting('ask',  1,  3, True)
+        add_resting('ask',  2,  5, False)
+        add_resting('ask',  2,  9, False)
+        add_resting('ask',  3,  9, False)
+        add_resting('ask',  3,  5, False)
+        add_resting('ask',  4, 10, False)
+        add_resting('ask',  5, 12, False)
+        add_resting('ask',  6, 10, False)
+        # Set LTP at mid reference
+        engine.ltp = mid
+        self.md_feed.publish_snapshot()
+        for side, qty in (('Buy', 5), ('Sell', 6)):
+            tid = engine.next_taker_id()
+            lat_t0 = self.latency.start()
+            self._log_submit('Bot', tid, side, 'MARKET', '', qty, 'demo trade')
+            tr, _ = engine.place_market_order(side.lower(), qty, False, tid)
+            self.orders += 1
+            if tr:
+                self.trade_log.extend(tr)
+                self.append_trades_to_csv(tr)
+                self._log_order('Bot', tid, side, 'MARKET', '', qty, tr, 'demo trade')
+            self.latency.stop(lat_t0, 'MARKET', side, tr)
+        self._sync += 1
+
+    def bot_pair(self):
+        # SPACE bot: one random buy and one random sell limit order across the band; returns the trades.
+        # Runs on the engine thread, or on the caller's when the worker is not started (simulate.py).
+        engine = self.engine
+        (bp, bq), (sp, sq) = bot_orders(self.rng, self.band)
+        trades = []
+        # Each order is timed on its own, from its submit event to its result
+        for side, px, qty in (('Buy', bp, bq), ('Sell', sp, sq)):
+            tid = engine.next_taker_id()
+            lat_t0 = self.latency.start()
+            self._log_submit('Bot', tid, side, 'LIMIT', px, qty)
+            tr, fifo = engine.place_limit_order(side.lower(), px, qty, False, tid)
+            self.orders += 1
+            if tr:
+                self.trade_log.extend(tr)
+                self.fifo_log.extend(fifo)
+                self.append_trades_to_csv(tr)
+                self._log_order('Bot', tid, side, 'LIMIT', px, qty, tr)
+            self.latency.stop(lat_t0, 'LIMIT', side, tr)
+            trades += tr
+        return trades
+
+    def demo_step(self):
+        # One random demo action: a limit order near the LTP (60%) or a market order; returns the trades.
+        # Like bot_pair, callable directly when the worker is not started.
+        engine = self.engine
+        side, px, qty = demo_order(self.rng, engine.ltp, self.band)
+        side_label = 'Buy' if side == 'buy' else 'Sell'
+        order_type = 'MARKET' if px is None else 'LIMIT'
+        tid = engine.next_taker_id()
+        lat_t0 = self.latency.start()
+        if px is not None:
+            self._log_submit('Bot', tid, side_label, 'LIMIT', px, qty, 'demo')
+            tr, _ = engine.place_limit_order(side, px, qty, False, tid)
+        else:
+            px = ''
+            self._log_submit('Bot', tid, side_label, 'MARKET', '', qty, 'demo')
+            tr, _ = engine.place_market_order(side, qty, False, tid)
+        self.orders += 1
+        if tr:
+            self.trade_log.extend(tr)
+            self.append_trades_to_csv(tr)
+        self._log_order('Bot', tid, side_label, order_type, px, qty, tr, 'demo')
+        self.latency.stop(lat_t0, order_type, side_label, tr)
+        self._sync += 1
+        return tr
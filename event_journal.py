@@ -0,0 +1,201 @@
+"""Compact binary journal of order events.
+
+Each event is one fixed-width 72-byte little-endian record instead of a CSV
+text row. String fields that only take a few values (event, actor, side,
+order type, status) are stored as one-byte codes, prices and IDs as int64
+(``EMPTY`` marks a blank CSV cell), the timestamp as nanoseconds since the
+epoch and the event's sequence number as int64. The free-text note is kept in
+a fixed 16-byte field: notes longer than ``NOTE_BYTES`` bytes of UTF-8 are
+cut at the last whole character that fits, so the journal (and a CSV
+converted back from it) only matches the CSV log for notes up to that size.
+The engine's own notes (counterparty labels, reset reasons and amend's
+'was QTY@PRICE' for everyday sizes) fit.
+
+``JournalReader`` memory-maps a journal and iterates the records without
+copying them, or exposes the whole file as a NumPy structured array when
+NumPy is installed. ``journal_to_csv``/``csv_to_journal`` convert to and
+from the ``events_log.csv`` schema.
+"""
+import csv
+import mmap
+import os
+import struct
+import sys
+
+from csv_sink import EVENTS_HEADER
+from timestamps import iso_to_ns, ns_to_iso
+
+EMPTY = -1
+NOTE_BYTES = 16  # UTF-8 bytes of note a record keeps
+
+# ts_ns, seq, taker_id, order_id, price, qty, filled_qty, event, actor, side, order_type, status, note
+RECORD = struct.Struct('<qqqqqiiBBBBB16s3x')
+FIELDS = ('ts_ns', 'seq', 'taker_id', 'order_id', 'price', 'qty', 'filled_qty',
+          'event', 'actor', 'side', 'order_type', 'status', 'note')
+
+# Code 0 is the empty string in every table
+EVENT_CODES = ('', 'submit', 'result', 'trade', 'cancel', 'amend', 'reset')
+ACTOR_CODES = ('', 'You', 'Bot')
+SIDE_CODES = ('', 'Buy', 'Sell')
+TYPE_CODES = ('', 'LIMIT', 'MARKET')
+STATUS_CODES = ('', 'submitted', 'open', 'partial', 'filled', 'executed', 'cancelled', 'amended')
+
+_EVENT_IDX = {v: i for i, v in enumerate(EVENT_CODES)}
+_ACTOR_IDX = {v: i for i, v in enumerate(ACTOR_CODES)}
+_SIDE_IDX = {v: i for i, v in enumerate(SIDE_CODES)}
+_TYPE_IDX = {v: i for i, v in enumerate(TYPE_CODES)}
+_STATUS_IDX = {v: i for i, v in enumerate(STATUS_CODES)}
+
+
+def numpy_dtype():
+    import numpy as np
+    return np.dtype([
+        ('ts_ns', '<i8'), ('seq', '<i8'), ('taker_id', '<i8'), ('order_id', '<i8'), ('price', '<i8'),
+        ('qty', '<i4'), ('filled_qty', '<i4'),
+        ('event', 'u1'), ('actor', 'u1'), ('side', 'u1'), ('order_type', 'u1'), ('status', 'u1'),
+        ('note', 'S16'), ('_pad', 'V3'),
+    ])
+
+
+def _int_or_empty(value):
+    if value is None or value == '':
+        return EMPTY
+    return int(value)
+
+
+def _note_bytes(note):
+    # The note's UTF-8 cut to NOTE_BYTES without splitting a character
+    return str(note or '').encode()[:NOTE_BYTES].decode(errors='ignore').encode()
+
+
+def _cell(value):
+    return '' if value == EMPTY else value
+
+
+def event_values(ev):
+    # ev: event dict (or anything with .get) as passed to log_event; returns the
+    # field values RECORD packs
+    return (
+        int(ev.get('ts_ns')), int(ev.get('seq') or 0),
+        _int_or_empty(ev.get('taker_id')), _int_or_empty(ev.get('order_id')),
+        _int_or_empty(ev.get('price')), int(ev.get('qty') or 0), int(ev.get('filled_qty') or 0),
+        _EVENT_IDX[ev.get('event') or ''], _ACTOR_IDX[ev.get('actor') or ''],
+        _SIDE_IDX[ev.get('side') or ''], _TYPE_IDX[ev.get('order_type') or ''],
+        _STATUS_IDX[ev.get('status') or ''],
+        _note_bytes(ev.get('note')),
+    )
+
+
+def pack_event(ev):
+    return RECORD.pack(*event_values(ev))
+
+
+def record_to_event(rec):
+    # rec: tuple unpacked with RECORD; returns an event dict as passed to log_event
+    ts_ns, seq, taker_id, order_id, price, qty, filled_qty, event, actor, side, otype, status, note = rec
+    return {'ts_ns': ts_ns, 'seq': seq, 'event': EVENT_CODES[event], 'actor': ACTOR_CODES[actor],
+            'taker_id': _cell(taker_id), 'order_id': _cell(order_id), 'side': SIDE_CODES[side],
+            'order_type': TYPE_CODES[otype], 'price': _cell(price), 'qty': qty, 'filled_qty': filled_qty,
+            'status': STATUS_CODES[status], 'note': note.rstrip(b'\0').decode(errors='ignore')}
+
+
+class EventJournal:
+    """Append-only writer for a binary event journal."""
+
+    def __init__(self, path, append=True, buffering=1 << 16):
+        self.path = path
+        self._fh = open(path, 'ab' if append else 'wb', buffering=buffering)
+
+    def append(self, ev):
+        self._fh.write(pack_event(ev))
+
+    def flush(self):
+        self._fh.flush()
+
+    def close(self):
+        if not self._fh.closed:
+            self._fh.close()
+
+
+class JournalReader:
+    """Memory-mapped, read-only view of a binary event journal.
+
+    Indexing and iteration unpack records straight out of the mapping. A
+    trailing partial record (e.g. from a crash mid-write) is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, 'rb')
+        size = os.fstat(self._fh.fileno()).st_size
+        self._count = size // RECORD.size
+        if self._count:
+            self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mm)[:self._count * RECORD.size]
+        else:
+            self._mm = None
+            self._view = memoryview(b'')
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("journal record index out of range")
+        return RECORD.unpack_from(self._view, i * RECORD.size)
+
+    def __iter__(self):
+        return RECORD.iter_unpack(self._view)
+
+    def iter_events(self):
+        # Records as event dicts in the events_log.csv schema
+        for rec in RECORD.iter_unpack(self._view):
+            yield record_to_event(rec)
+
+    def to_numpy(self):
+        # Zero-copy structured array over the mapping; needs NumPy
+        import numpy as np
+        return np.frombuffer(self._view, dtype=numpy_dtype(), count=self._count)
+
+    def close(self):
+        self._view.release()
+        if self._mm is not None:
+            self._mm.close()
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def journal_to_csv(journal_path, csv_path):
+    with JournalReader(journal_path) as reader, open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(EVENTS_HEADER)
+        for ev in reader.iter_events():
+            writer.writerow([ns_to_iso(ev['ts_ns']), ev['seq'], ev['event'], ev['actor'], ev['taker_id'],
+                             ev['order_id'], ev['side'], ev['order_type'], ev['price'], ev['qty'], ev['filled_qty'], ev['status'], ev['note']])
+
+
+def csv_to_journal(csv_path, journal_path):
+    journal = EventJournal(journal_path, append=False)
+    try:
+        with open(csv_path, newline='') as f:
+            for row in csv.DictReader(f):
+                row['ts_ns'] = iso_to_ns(row.pop('timestamp_iso'))
+                journal.append(row)  # logs without a seq column get seq 0
+    finally:
+        journal.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ('to-csv', 'from-csv'):
+        sys.exit("usage: python event_journal.py (to-csv JOURNAL CSV | from-csv CSV JOURNAL)")
+    if sys.argv[1] == 'to-csv':
+        journal_to_csv(sys.argv[2], sys.argv[3])
+    else:
+        csv_to_journal(sys.argv[2], sys.argv[3])
@@ -0,0 +1,98 @@
+"""In-memory event log with per-event-type indexes for the UI tables.
+
+Events are held as compact ``EventRecord`` objects in a ``BoundedHistory``:
+only the newest ``cap`` stay in memory and older ones spill to disk in the
+binary journal's record format, to be paged back when a table scrolls that
+far. Each event type ('submit', 'trade', ...) keeps an ``array('q')`` of the
+positions of its events, so counts are O(1) and the newest-first window a
+table shows is O(k), however long the session runs.
+"""
+from array import array
+
+from event_journal import RECORD, event_values, record_to_event
+from history import BoundedHistory
+
+EVENT_FIELDS = ('ts_ns', 'seq', 'event', 'actor', 'taker_id', 'order_id', 'side', 'order_type',
+                'price', 'qty', 'filled_qty', 'status', 'note')
+
+
+class EventRecord:
+    """One logged event; read fields with ``get`` or ``[]`` like the event dicts."""
+    __slots__ = EVENT_FIELDS
+
+    def __init__(self, ts_ns, seq, event, actor, taker_id, order_id, side, order_type, price, qty, filled_qty, status,
+                 note):
+        self.ts_ns = ts_ns
+        self.seq = seq
+        self.event = event
+        self.actor = actor
+        self.taker_id = taker_id
+        self.order_id = order_id
+        self.side = side
+        self.order_type = order_type
+        self.price = price
+        self.qty = qty
+        self.filled_qty = filled_qty
+        self.status = status
+        self.note = note
+
+    @classmethod
+    def from_dict(cls, ev):
+        return cls(*(ev.get(k) for k in EVENT_FIELDS))
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+def _decode_event(values):
+    return EventRecord.from_dict(record_to_event(values))
+
+
+class EventStore:
+    """Append-only event log indexed by event type.
+
+    ``cap`` bounds how many events stay in memory (None keeps all).
+    """
+
+    def __init__(self, cap=None):
+        self._events = BoundedHistory(RECORD, event_values, _decode_event, cap)
+        self._by_type = {}  # event type -> array of positions in self._events
+
+    def append(self, ev):
+        rec = ev if isinstance(ev, EventRecord) else EventRecord.from_dict(ev)
+        positions = self._by_type.get(rec.event)
+        if positions is None:
+            positions = self._by_type[rec.event] = array('q')
+        positions.append(len(self._events))
+        self._events.append(rec)
+
+    def count(self, kind=None):
+        # Number of events of `kind` (all events when None)
+        if kind is None:
+            return len(self._events)
+        positions = self._by_type.get(kind)
+        return len(positions) if positions is not None else 0
+
+    def newest(self, kind=None, skip=0, limit=None):
+        # Newest-first window: skip the `skip` most recent events of `kind`, return up to `limit`
+        if kind is None:
+            return self._events.newest(skip, limit)
+        positions = self._by_type.get(kind)
+        if positions is None:
+            return []
+        end = len(positions) - skip
+        begin = 0 if limit is None else max(0, end - limit)
+        events = self._events
+        return [events[positions[j]] for j in range(end - 1, begin - 1, -1)]
+
+    def close(self):
+        self._events.close()
+
+    def __len__(self):
+        return len(self._events)
+
+    def __iter__(self):
+        return iter(self._events)
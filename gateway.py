@@ -0,0 +1,313 @@
+"""Asyncio order-entry gateway for the matching engine.
+
+Clients connect over TCP (or a Unix socket) and send one order per line:
+
+    NEW <ref> BUY|SELL <price> <qty>     limit order
+    MKT <ref> BUY|SELL <qty>             market order
+    CXL <ref> <order_id>                 cancel one of this connection's resting orders
+
+``ref`` is any client-chosen token without spaces. For each order the
+gateway answers with one ``FILL`` line per trade followed by a final line:
+
+    FILL <ref> <price> <qty> <resting_order_id>
+    ACK  <ref> <taker_id> <status> <filled_qty> <order_id|->    (status: filled/partial/open)
+    CXLD <ref> <order_id> <qty>
+    REJ  <ref> <reason>
+
+and the owner of a resting order that trades receives
+``MFILL <ref> <order_id> <price> <qty>`` for the original ``ref``.
+
+Orders read from all connections during one event-loop tick are matched
+together through ``MatchingEngine.submit_batch`` (one call per run of orders
+between cancels), and each connection gets its responses in one write.
+When more than ``max_pending`` orders are queued, connections stop reading
+until the backlog drains; a connection also stops reading while its own
+responses are not being consumed.
+
+    python gateway.py [--port 9009 | --unix /tmp/ome.sock] [--log-dir DIR] [--md-port 9010]
+
+``--md-port`` also publishes the book as an L2 market-data feed (see
+``market_data.py``).
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+
+from csv_sink import CsvLogSink, EVENTS_HEADER, TRADES_HEADER
+from market_data import MarketDataPublisher, SocketFeed
+from matching_engine import EMPTY, MatchingEngine, parse_band
+from timestamps import EventClock
+
+MAX_BATCH = 4096      # orders matched per loop callback; the rest wait for the next one
+MAX_PENDING = 16384   # queued orders above which connections stop reading
+READ_CHUNK = 1 << 16
+POLL_INTERVAL = 0.05  # seconds between idle polls (market-data snapshots and socket writes)
+
+_SIDES = {b'BUY': 'buy', b'SELL': 'sell'}
+
+
+class Session:
+    """One client connection and the responses queued for it this batch."""
+    __slots__ = ('writer', 'out', 'closed')
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.out = []
+        self.closed = False
+
+
+class Gateway:
+    """Line-protocol front end batching client orders into the engine.
+
+    ``log_dir`` (optional) receives ``events_log.csv`` and
+    ``executed_trades.csv`` in the app's schema, so ``replay.py`` can rebuild
+    and verify the session.
+    """
+
+    def __init__(self, engine=None, max_pending=MAX_PENDING, max_batch=MAX_BATCH, log_dir=None):
+        self.engine = engine if engine is not None else MatchingEngine()
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.orders = 0
+        self.trades = 0
+        self.batches = 0
+        self._pending = []       # (session, line) in arrival order
+        self._scheduled = False
+        self._room = asyncio.Event()
+        self._room.set()
+        self._owners = {}        # resting OID -> (session, ref)
+        self._log = None
+        self._stamp = EventClock().stamp  # (ts_ns, seq) for each logged row
+        if log_dir:
+            self._log = CsvLogSink({
+                'trades': (os.path.join(log_dir, 'executed_trades.csv'), TRADES_HEADER),
+                'events': (os.path.join(log_dir, 'events_log.csv'), EVENTS_HEADER),
+            })
+            self._log.put('events', [[*self._stamp(), 'reset', '', '', '', '', '', '', 0, 0, '', 'session start']])
+
+    async def handle(self, reader, writer):
+        session = Session(writer)
+        tail = b''
+        try:
+            while True:
+                data = await reader.read(READ_CHUNK)
+                if not data:
+                    break
+                lines = (tail + data).split(b'\n')
+                tail = lines.pop()
+                for line in lines:
+                    if line.strip():
+                        self._enqueue(session, line)
+                # Backpressure: the engine's backlog, then this client's unread responses
+                await self._room.wait()
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            session.closed = True
+            writer.close()
+
+    def _enqueue(self, session, line):
+        self._pending.append((session, line))
+        if len(self._pending) >= self.max_pending:
+            self._room.clear()
+        if not self._scheduled:
+            self._scheduled = True
+            asyncio.get_running_loop().call_soon(self._run_batch)
+
+    def _run_batch(self):
+        # The next batch is scheduled (or _scheduled cleared) even if this one fails,
+        # so a bad batch cannot stop every later request from being served
+        try:
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            self.batches += 1
+            events = []
+            trade_rows = []
+            touched = set()
+            run = []  # consecutive new/market orders, matched with one submit_batch call
+            for session, line in batch:
+                touched.add(session)
+                op = self._parse(line)
+                if op[0] == 'order':
+                    run.append((session,) + op[1:])
+                    continue
+                # Cancels and rejects go out after the orders that arrived before them
+                self._place_run(run, events, trade_rows, touched)
+                run = []
+                if op[0] == 'cxl':
+                    self._cancel(session, op[1], op[2], events)
+                else:
+                    session.out.append(f"REJ {op[1]} {op[2]}\n".encode())
+            self._place_run(run, events, trade_rows, touched)
+            for session in touched:
+                if session.out and not session.closed:
+                    session.writer.write(b''.join(session.out))
+                session.out.clear()
+            if self._log is not None:
+                if events:
+                    self._log.put('events', events)
+                if trade_rows:
+                    self._log.put('trades', trade_rows)
+        finally:
+            if self._pending:
+                asyncio.get_running_loop().call_soon(self._run_batch)
+            else:
+                self._scheduled = False
+            if len(self._pending) < self.max_pending // 2:
+                self._room.set()
+
+    def _parse(self, line):
+        # ('order', ref, side, price or None, qty), ('cxl', ref, oid) or ('rej', ref, reason)
+        parts = line.split()
+        verb = parts[0].upper()
+        ref = parts[1].decode(errors='replace') if len(parts) > 1 else '-'
+        try:
+            if verb == b'CXL' and len(parts) == 3:
+                return ('cxl', ref, int(parts[2]))
+            if verb == b'NEW' and len(parts) == 5:
+                side, price, qty = _SIDES[parts[2].upper()], int(parts[3]), int(parts[4])
+                self.engine.band.check(price)
+            elif verb == b'MKT' and len(parts) == 4:
+                side, price, qty = _SIDES[parts[2].upper()], None, int(parts[3])
+            else:
+                raise ValueError("bad request")
+            if qty <= 0:
+                raise ValueError("qty must be positive")
+        except (KeyError, ValueError) as exc:
+            return ('rej', ref, 'bad side' if isinstance(exc, KeyError) else str(exc))
+        return ('order', ref, side, price, qty)
+
+    def _place_run(self, run, events, trade_rows, touched):
+        # run: [(session, ref, side, price or None, qty)] matched in arrival order
+        if not run:
+            return
+        engine = self.engine
+        trades, results = engine.submit_batch([(side, price, qty) for _s, _r, side, price, qty in run])
+        t_order, t_price, t_qty, t_roid = trades['order'], trades['price'], trades['qty'], trades['resting_oid']
+        t_maker_player = trades['resting_is_player']
+        r_tid, r_filled, r_oid = results['taker_id'], results['filled'], results['oid']
+        owners = self._owners
+        makers_hit = set()
+        t = 0
+        n_trades = len(t_order)
+        for i, (session, ref, side, price, qty) in enumerate(run):
+            out = session.out
+            tid = r_tid[i]
+            side_label = 'Buy' if side == 'buy' else 'Sell'
+            otype = 'LIMIT' if price is not None else 'MARKET'
+            first = t
+            while t < n_trades and t_order[t] == i:
+                tp, tq, roid = t_price[t], t_qty[t], t_roid[t]
+                out.append(f"FILL {ref} {tp} {tq} {roid}\n".encode())
+                owner = owners.get(roid)
+                if owner is not None:
+                    maker, maker_ref = owner
+                    maker.out.append(f"MFILL {maker_ref} {roid} {tp} {tq}\n".encode())
+                    touched.add(maker)
+                    makers_hit.add(roid)
+                t += 1
+            filled = r_filled[i]
+            status = 'filled' if filled >= qty else ('partial' if filled > 0 else 'open')
+            oid = r_oid[i]
+            if oid != EMPTY:
+                owners[oid] = (session, ref)
+            out.append(f"ACK {ref} {tid} {status} {filled} {oid if oid != EMPTY else '-'}\n".encode())
+            if self._log is not None:
+                stamp = self._stamp
+                px_cell = price if price is not None else ''
+                events.append([*stamp(), 'submit', 'Bot', tid, '', side_label, otype, px_cell, qty, 0, 'submitted', ref])
+                events.append([*stamp(), 'result', 'Bot', tid, '', side_label, otype, px_cell, qty, filled, status, ref])
+                for k in range(first, t):
+                    cp = ('Seller' if side == 'buy' else 'Buyer') if t_maker_player[k] else 'Bot'
+                    trade_rows.append([*stamp(), t_price[k], t_qty[k], 'Bot', cp, 'Ask' if side == 'buy' else 'Bid', t_roid[k], tid])
+                    events.append([*stamp(), 'trade', 'Bot', tid, t_roid[k], side_label, otype, t_price[k], t_qty[k], t_qty[k], 'executed', cp])
+        # Forget makers whose orders are no longer resting
+        book = engine.order_book
+        for roid in makers_hit:
+            if roid not in book['bids'].orders and roid not in book['asks'].orders:
+                owners.pop(roid, None)
+        self.orders += len(run)
+        self.trades += n_trades
+
+    def _cancel(self, session, ref, oid, events):
+        # Only the connection that placed a resting order may cancel it
+        owner = self._owners.get(oid)
+        if owner is None or owner[0] is not session:
+            session.out.append(f"REJ {ref} unknown order {oid}\n".encode())
+            return
+        del self._owners[oid]
+        side, price, qty, is_player, _oid = self.engine.cancel_order(oid)
+        session.out.append(f"CXLD {ref} {oid} {qty}\n".encode())
+        if self._log is not None:
+            events.append([*self._stamp(), 'cancel', 'You' if is_player else 'Bot', '', oid, 'Buy' if side == 'buy' else 'Sell',
+                           'LIMIT', price, qty, 0, 'cancelled', ref])
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+
+
+async def serve(gateway, host='127.0.0.1', port=9009, unix_path=None, poll=None):
+    # poll (optional) is called every POLL_INTERVAL seconds while serving
+    if unix_path:
+        server = await asyncio.start_unix_server(gateway.handle, path=unix_path)
+    else:
+        server = await asyncio.start_server(gateway.handle, host, port)
+    where = unix_path or f"{host}:{port}"
+    print(f"gateway listening on {where}", file=sys.stderr)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # e.g. Windows: Ctrl+C still raises KeyboardInterrupt
+    async with server:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), POLL_INTERVAL if poll else None)
+            except asyncio.TimeoutError:
+                poll()
+    if unix_path and os.path.exists(unix_path):
+        os.unlink(unix_path)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=9009)
+    ap.add_argument('--unix', help="listen on this Unix socket path instead of TCP")
+    ap.add_argument('--log-dir', help="write events_log.csv/executed_trades.csv here (replayable)")
+    ap.add_argument('--max-pending', type=int, default=MAX_PENDING)
+    ap.add_argument('--md-port', type=int, help="serve the L2 market-data feed on this port")
+    ap.add_argument('--band', type=parse_band, help="MIN:MAX[:TICK] price band; order prices are ticks of it (default 990:1010:1)")
+    args = ap.parse_args(argv)
+
+    gateway = Gateway(MatchingEngine(band=args.band), max_pending=args.max_pending, log_dir=args.log_dir)
+    md_socket = None
+    if args.md_port:
+        md_feed = MarketDataPublisher(gateway.engine)
+        md_socket = SocketFeed(md_feed, args.host, args.md_port)
+
+        def poll():
+            md_feed.poll()
+            md_socket.poll()
+    else:
+        poll = None
+    try:
+        asyncio.run(serve(gateway, args.host, args.port, args.unix, poll))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if md_socket is not None:
+            md_socket.close()
+        gateway.close()
+        print(f"{gateway.orders} orders, {gateway.trades} trades in {gateway.batches} batches", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
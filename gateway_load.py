@@ -0,0 +1,112 @@
+"""Load-test client for ``gateway.py``.
+
+Opens several connections and keeps up to ``--window`` orders in flight on
+each, pipelining requests in single writes. The seeded order mix follows
+the SPACE-key bot (limit orders across the band) with market orders and
+cancels of the connection's own resting orders mixed in. Reports completed
+orders/sec, fills/sec and request-to-final-response latency percentiles.
+
+    python gateway.py &
+    python gateway_load.py --connections 8 --orders 200000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from matching_engine import DEFAULT_BAND, parse_band
+
+FINAL = (b'ACK', b'CXLD', b'REJ')
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def _connection(cid, args, n_orders, stats):
+    if args.unix:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    rng = random.Random(args.seed * 1000 + cid)
+    sent_at = {}      # ref -> perf_counter_ns at send
+    resting = []      # OIDs this connection has resting (may since have filled)
+    latencies = stats['latencies']
+    sent = done = 0
+    clock = time.perf_counter_ns
+    tail = b''
+
+    def request(i):
+        ref = f"c{cid}-{i}"
+        r = rng.random()
+        if r < 0.1 and resting:
+            line = f"CXL {ref} {resting.pop(rng.randrange(len(resting)))}\n"
+        elif r < 0.35:
+            line = f"MKT {ref} {'BUY' if rng.random() < 0.5 else 'SELL'} {rng.randint(3, 12)}\n"
+        else:
+            line = f"NEW {ref} {'BUY' if rng.random() < 0.5 else 'SELL'} {rng.randint(args.band.lo, args.band.hi)} {rng.randint(3, 12)}\n"
+        sent_at[ref] = clock()
+        return line
+
+    while done < n_orders:
+        burst = min(args.window - (sent - done), n_orders - sent)
+        if burst > 0:
+            writer.write(''.join(request(sent + i) for i in range(burst)).encode())
+            sent += burst
+        data = await reader.read(1 << 16)
+        if not data:
+            raise ConnectionError("gateway closed the connection")
+        lines = (tail + data).split(b'\n')
+        tail = lines.pop()
+        now = clock()
+        for line in lines:
+            parts = line.split()
+            kind = parts[0]
+            if kind == b'FILL':
+                stats['fills'] += 1
+            elif kind in FINAL:
+                done += 1
+                latencies.append(now - sent_at.pop(parts[1].decode()))
+                if kind == b'ACK' and parts[5] != b'-':
+                    resting.append(int(parts[5]))
+                elif kind == b'REJ':
+                    stats['rejects'] += 1
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(args):
+    stats = {'latencies': [], 'fills': 0, 'rejects': 0}
+    per_conn = args.orders // args.connections
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_connection(c, args, per_conn, stats) for c in range(args.connections)))
+    secs = time.perf_counter() - t0
+    lat = sorted(stats['latencies'])
+    n = len(lat)
+    print(f"{n} orders over {args.connections} connections in {secs:.2f}s: {n / secs:,.0f} orders/s, "
+          f"{stats['fills'] / secs:,.0f} fills/s, {stats['rejects']} rejects")
+    print(f"latency p50={_percentile(lat, 0.5) / 1e3:.0f}us p99={_percentile(lat, 0.99) / 1e3:.0f}us "
+          f"p99.9={_percentile(lat, 0.999) / 1e3:.0f}us max={lat[-1] / 1e3 if lat else 0:.0f}us")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=9009)
+    ap.add_argument('--unix', help="connect to this Unix socket instead of TCP")
+    ap.add_argument('--connections', type=int, default=8)
+    ap.add_argument('--orders', type=int, default=100000, help="total orders across all connections")
+    ap.add_argument('--window', type=int, default=256, help="max orders in flight per connection")
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--band', type=parse_band, default=DEFAULT_BAND,
+                    help="MIN:MAX[:TICK] price band the gateway runs with (default 990:1010:1)")
+    args = ap.parse_args(argv)
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""Bounded in-memory history with spill-to-disk.
+
+``BoundedHistory`` behaves like an append-only list but keeps only the newest
+``cap`` rows in memory. Older rows are packed into fixed-width records in a
+temporary spill file and read back by index when a caller asks for them, so
+scrolling far back still works while memory stays bounded.
+
+Codecs for the UI's trade and FIFO logs live here as well; the event log
+uses the binary journal's record format (see ``event_store``).
+"""
+import struct
+import tempfile
+
+# Share of `cap` evicted at once, so trimming is amortised O(1) per append
+_TRIM_FRACTION = 4
+
+
+class BoundedHistory:
+    """Append-only sequence keeping the newest ``cap`` rows in memory.
+
+    ``record`` is the ``struct.Struct`` used on disk; ``encode(row)`` returns
+    the values to pack and ``decode(values)`` rebuilds a row. ``cap=None``
+    keeps everything in memory.
+    """
+
+    def __init__(self, record, encode, decode, cap=None):
+        self._record = record
+        self._encode = encode
+        self._decode = decode
+        self.cap = cap
+        self._mem = []
+        self._spilled = 0  # rows on disk; also the global index of self._mem[0]
+        self._spill = None
+
+    def __len__(self):
+        return self._spilled + len(self._mem)
+
+    @property
+    def spilled(self):
+        return self._spilled
+
+    def append(self, row):
+        self._mem.append(row)
+        if self.cap is not None and len(self._mem) > self.cap + self.cap // _TRIM_FRACTION:
+            self._trim()
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def __getitem__(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("history index out of range")
+        if i >= self._spilled:
+            return self._mem[i - self._spilled]
+        size = self._record.size
+        self._spill.seek(i * size)
+        return self._decode(self._record.unpack(self._spill.read(size)))
+
+    def newest(self, skip=0, limit=None):
+        # Newest-first window: skip the `skip` most recent rows, return up to `limit`
+        end = len(self) - skip
+        begin = 0 if limit is None else max(0, end - limit)
+        return [self[i] for i in range(end - 1, begin - 1, -1)]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _trim(self):
+        n = len(self._mem) - self.cap
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile()
+        pack = self._record.pack
+        encode = self._encode
+        self._spill.seek(0, 2)
+        self._spill.write(b''.join(pack(*encode(row)) for row in self._mem[:n]))
+        del self._mem[:n]
+        self._spilled += n
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+
+# --- Trade and FIFO log codecs ---
+EMPTY = -1
+LABEL_CODES = ('', 'You', 'Bot', 'Seller', 'Buyer', 'Ask', 'Bid')
+_LABEL_IDX = {v: i for i, v in enumerate(LABEL_CODES)}
+
+# trade row: (price, qty, taker_label, counterparty_label, resting_oid, taker_id)
+TRADE_RECORD = struct.Struct('<qqqiBB')
+# fifo row: (order_id, resting_side, price, filled_qty, taker_label, taker_id)
+FIFO_RECORD = struct.Struct('<qqqiBB')
+
+
+def _id(value):
+    return EMPTY if value is None else value
+
+
+def _unid(value):
+    return None if value == EMPTY else value
+
+
+def encode_trade(tr):
+    price, qty, taker, cp, roid, tid = tr
+    return price, _id(roid), _id(tid), qty, _LABEL_IDX[taker], _LABEL_IDX[cp]
+
+
+def decode_trade(values):
+    price, roid, tid, qty, taker, cp = values
+    return (price, qty, LABEL_CODES[taker], LABEL_CODES[cp], _unid(roid), _unid(tid))
+
+
+def encode_fifo(entry):
+    oid, side, price, qty, taker, tid = entry
+    return _id(oid), price, _id(tid), qty, _LABEL_IDX[side], _LABEL_IDX[taker]
+
+
+def decode_fifo(values):
+    oid, price, tid, qty, side, taker = values
+    return (_unid(oid), LABEL_CODES[side], price, qty, LABEL_CODES[taker], _unid(tid))
+
+
+def trade_history(cap=None):
+    return BoundedHistory(TRADE_RECORD, encode_trade, decode_trade, cap)
+
+
+def fifo_history(cap=None):
+    return BoundedHistory(FIFO_RECORD, encode_fifo, decode_fifo, cap)
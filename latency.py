@@ -0,0 +1,180 @@
+"""Per-order matching latency histograms.
+
+``LatencyRecorder`` times the order entry path (submit event logged ->
+engine call -> result/trade events logged) with ``perf_counter_ns`` and files
+each duration into a log-linear ``LatencyHistogram`` keyed by order type,
+side and the number of price levels the order crossed. Histograms are fixed
+bucket arrays, so recording is O(1) with no per-sample allocation.
+
+    latency = LatencyRecorder(dump_path='latency_histograms.jsonl', dump_interval=10)
+    t0 = latency.start()
+    ...                                  # log submit, match, log result/trades
+    latency.stop(t0, 'LIMIT', 'Buy', trades)
+    latency.snapshot()                   # {'LIMIT/Buy/1': {'count': ..., 'p50': ...}, ...}
+
+A disabled recorder's ``start`` returns 0 without reading the clock and
+``stop`` returns on that 0, so instrumentation left in place costs one call
+each.
+"""
+import json
+import time
+
+# Sub-buckets per power of two: 8 keeps every bucket within 12.5% of its value
+SUB_BITS = 3
+_SUB = 1 << SUB_BITS
+# Orders crossing this many levels or more share a histogram
+MAX_LEVELS_KEY = 3
+
+
+def bucket_index(ns):
+    # Values below _SUB get exact buckets; above that, _SUB buckets per octave
+    if ns < _SUB:
+        return max(ns, 0)
+    shift = ns.bit_length() - SUB_BITS - 1
+    return (shift + 1) * _SUB + (ns >> shift) - _SUB
+
+
+def bucket_bounds(idx):
+    # Inclusive (low, high) nanosecond range of a bucket
+    if idx < _SUB:
+        return idx, idx
+    shift = idx // _SUB - 1
+    low = (idx % _SUB + _SUB) << shift
+    return low, low + (1 << shift) - 1
+
+
+class LatencyHistogram:
+    """Log-linear histogram of nanosecond durations."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, ns):
+        idx = bucket_index(ns)
+        counts = self.counts
+        if idx >= len(counts):
+            counts.extend([0] * (idx + 1 - len(counts)))
+        counts[idx] += 1
+        self.count += 1
+        self.total += ns
+        if self.min is None or ns < self.min:
+            self.min = ns
+        if self.max is None or ns > self.max:
+            self.max = ns
+
+    def merge(self, other):
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def percentile(self, q):
+        # Upper bound of the bucket holding the q-th sample, capped at the max seen
+        if not self.count:
+            return None
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(bucket_bounds(idx)[1], self.max)
+        return self.max
+
+    def summary(self, buckets=False):
+        out = {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'p50': self.percentile(0.50),
+            'p90': self.percentile(0.90),
+            'p99': self.percentile(0.99),
+            'p999': self.percentile(0.999),
+            'max': self.max,
+        }
+        if buckets:
+            # Non-empty buckets as [low_ns, high_ns, count]
+            out['buckets'] = [[*bucket_bounds(i), c] for i, c in enumerate(self.counts) if c]
+        return out
+
+
+def _zero():
+    return 0
+
+
+class LatencyRecorder:
+    """Order-entry latency histograms split by (order type, side, levels crossed).
+
+    ``dump_path``/``dump_interval`` (seconds) enable periodic JSON-lines dumps
+    via ``maybe_dump``, which the caller invokes from its main loop.
+    """
+
+    def __init__(self, enabled=True, dump_path=None, dump_interval=None):
+        self.enabled = enabled
+        self.start = time.perf_counter_ns if enabled else _zero
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self._next_dump = time.monotonic() + dump_interval if dump_interval else None
+        self.histograms = {}  # (order_type, side, levels_key) -> LatencyHistogram
+        self.overall = LatencyHistogram()
+
+    def stop(self, t0, order_type, side, trades=()):
+        # t0 from start(); trades are the engine's trade tuples (price first)
+        if not t0:
+            return
+        ns = time.perf_counter_ns() - t0
+        levels = 0
+        last_px = None
+        for tr in trades:
+            if tr[0] != last_px:
+                levels += 1
+                last_px = tr[0]
+        self.record(order_type, side, levels, ns)
+
+    def record(self, order_type, side, levels, ns):
+        key = (order_type, side, min(levels, MAX_LEVELS_KEY))
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = LatencyHistogram()
+        hist.record(ns)
+        self.overall.record(ns)
+
+    def snapshot(self, buckets=False, reset=False):
+        # {'all': summary, 'LIMIT/Buy/0': summary, ...}; levels key 3 means "3 or more"
+        snap = {'all': self.overall.summary(buckets)}
+        for (otype, side, levels), hist in sorted(self.histograms.items()):
+            label = f"{levels}+" if levels == MAX_LEVELS_KEY else str(levels)
+            snap[f"{otype}/{side}/{label}"] = hist.summary(buckets)
+        if reset:
+            self.reset()
+        return snap
+
+    def reset(self):
+        self.histograms = {}
+        self.overall.reset()
+
+    def dump(self, path=None):
+        # Append one JSON line with a timestamp and every histogram's buckets
+        path = path or self.dump_path
+        if path is None or not self.overall.count:
+            return
+        with open(path, 'a') as f:
+            f.write(json.dumps({'ts_ns': time.time_ns(), 'histograms': self.snapshot(buckets=True)}) + '\n')
+
+    def maybe_dump(self):
+        if self._next_dump is None or time.monotonic() < self._next_dump:
+            return
+        self._next_dump = time.monotonic() + self.dump_interval
+        self.dump()
@@ -0,0 +1,328 @@
+"""Incremental L2 market-data feed for a ``MatchingEngine``.
+
+``MarketDataPublisher`` attaches to an engine and, after every call that
+changes the book, sends its subscribers one message per trade print followed
+by one per price level whose total changed:
+
+    {'type': 'trade', 'seq': 41, 'price': 1001, 'qty': 5, 'aggressor': 'buy'}
+    {'type': 'delta', 'seq': 42, 'side': 'ask', 'price': 1001, 'qty': 7, 'count': 2}
+
+A ``count`` of 0 means the level is gone. Every trade and delta carries the
+next sequence number. Full snapshots (``bids``/``asks`` as ``[price, qty,
+count]`` best first, plus ``ltp``) are sent every ``snapshot_interval``
+seconds, when the engine's book is replaced (reset, clear) and to each new
+subscriber. A snapshot's ``seq`` is that of the last message it includes,
+so a subscriber that missed a delta (a gap in ``seq``) waits for the next
+snapshot and carries on from there. ``BookMirror`` does exactly that.
+
+    feed = MarketDataPublisher(engine)
+    book = BookMirror()
+    feed.subscribe(book)                    # in-process: any callable
+    SocketFeed(feed, port=9010)             # JSON lines over a local socket
+    python market_data.py --connect 127.0.0.1:9010
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+SNAPSHOT_INTERVAL = 1.0     # seconds between periodic snapshots
+MAX_CLIENT_BUFFER = 1 << 20  # bytes queued for a socket subscriber before it is made to skip to a snapshot
+
+
+class MarketDataPublisher:
+    """Publishes an engine's book changes as sequenced L2 deltas and trades."""
+
+    def __init__(self, engine, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.engine = engine
+        self.snapshot_interval = snapshot_interval
+        self.seq = 0
+        self.subscribers = []
+        self._book = None
+        self._next_snapshot = time.monotonic() + snapshot_interval if snapshot_interval else None
+        self._attach()
+        engine.listener = self.on_change
+
+    def _attach(self):
+        # Start tracking changed levels on the engine's current book
+        self._book = self.engine.order_book
+        self._book['bids'].changed = set()
+        self._book['asks'].changed = set()
+
+    def subscribe(self, callback, snapshot=True):
+        # callback(message) runs synchronously for every message; it first gets
+        # a snapshot of the current book unless snapshot is False
+        self.subscribers.append(callback)
+        if snapshot:
+            callback(self.snapshot())
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def snapshot(self):
+        book = self._book
+        return {'type': 'snapshot', 'seq': self.seq, 'ltp': self.engine.ltp,
+                'bids': [list(lvl) for lvl in book['bids'].depth()],
+                'asks': [list(lvl) for lvl in book['asks'].depth()]}
+
+    def publish_snapshot(self):
+        # Send a snapshot to everyone now (also after changing engine.ltp directly)
+        msg = self.snapshot()
+        for callback in self.subscribers:
+            callback(msg)
+        if self.snapshot_interval:
+            self._next_snapshot = time.monotonic() + self.snapshot_interval
+
+    def on_change(self, prints):
+        # Engine listener: prints are (price, qty, aggressor_side) for this call
+        if self.engine.order_book is not self._book:
+            # A fresh book replaces everything the subscribers hold
+            self._attach()
+            self.publish_snapshot()
+            return
+        subscribers = self.subscribers
+        for price, qty, aggressor in prints:
+            self.seq += 1
+            msg = {'type': 'trade', 'seq': self.seq, 'price': price, 'qty': qty, 'aggressor': aggressor}
+            for callback in subscribers:
+                callback(msg)
+        for name in ('bids', 'asks'):
+            side = self._book[name]
+            changed = side.changed
+            if not changed:
+                continue
+            label = 'bid' if side.is_bid else 'ask'
+            levels = side.levels
+            for price in sorted(changed):
+                level = levels.get(price)
+                qty, count = (level.qty, level.count) if level is not None else (0, 0)
+                self.seq += 1
+                msg = {'type': 'delta', 'seq': self.seq, 'side': label, 'price': price, 'qty': qty, 'count': count}
+                for callback in subscribers:
+                    callback(msg)
+            changed.clear()
+        self.poll()
+
+    def poll(self):
+        # Sends the periodic snapshot when due; also safe to call from an idle loop
+        if self._next_snapshot is not None and time.monotonic() >= self._next_snapshot:
+            self.publish_snapshot()
+
+    def close(self):
+        if self.engine.listener == self.on_change:
+            self.engine.listener = None
+        self._book['bids'].changed = None
+        self._book['asks'].changed = None
+
+
+class BookMirror:
+    """Subscriber-side L2 book rebuilt from feed messages.
+
+    ``bids``/``asks`` map price -> (qty, count). After a sequence gap the
+    mirror is ``stale`` and ignores deltas until the next snapshot.
+    """
+
+    def __init__(self):
+        self.bids = {}
+        self.asks = {}
+        self.ltp = None
+        self.seq = None
+        self.stale = True
+        self.gaps = 0
+
+    def __call__(self, msg):
+        kind = msg['type']
+        if kind == 'snapshot':
+            if self.seq is not None and not self.stale and msg['seq'] < self.seq:
+                return  # older than what we already applied
+            self.bids = {p: (q, c) for p, q, c in msg['bids']}
+            self.asks = {p: (q, c) for p, q, c in msg['asks']}
+            self.ltp = msg['ltp']
+            self.seq = msg['seq']
+            self.stale = False
+            return
+        if self.stale or msg['seq'] <= self.seq:
+            return
+        if msg['seq'] != self.seq + 1:
+            self.stale = True
+            self.gaps += 1
+            return
+        self.seq = msg['seq']
+        if kind == 'trade':
+            self.ltp = msg['price']
+        elif kind == 'delta':
+            levels = self.bids if msg['side'] == 'bid' else self.asks
+            if msg['count']:
+                levels[msg['price']] = (msg['qty'], msg['count'])
+            else:
+                levels.pop(msg['price'], None)
+
+    @property
+    def best_bid(self):
+        return max(self.bids) if self.bids else None
+
+    @property
+    def best_ask(self):
+        return min(self.asks) if self.asks else None
+
+
+class _Client:
+    __slots__ = ('sock', 'buf', 'skipping')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buf = bytearray()
+        self.skipping = False
+
+
+class SocketFeed:
+    """Serves a publisher's messages as JSON lines on a local TCP or Unix socket.
+
+    A background thread only accepts connections; messages are written with
+    non-blocking sends from the publishing thread. A client whose unsent
+    data exceeds ``max_buffer`` bytes is dropped to the next snapshot (it sees
+    a ``seq`` gap and recovers). Call ``poll`` from the main loop so new
+    clients get their first snapshot and queued data drains while idle.
+    """
+
+    def __init__(self, publisher, host='127.0.0.1', port=0, unix_path=None, max_buffer=MAX_CLIENT_BUFFER):
+        self.publisher = publisher
+        self.max_buffer = max_buffer
+        self.unix_path = unix_path
+        if unix_path:
+            self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._server.bind(unix_path)
+        else:
+            self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._server.bind((host, port))
+        self._server.listen()
+        self.address = self._server.getsockname()
+        self._clients = []
+        self._new = []
+        self._lock = threading.Lock()
+        self._closed = False
+        threading.Thread(target=self._accept_loop, name='md-accept', daemon=True).start()
+        publisher.subscribe(self._on_message, snapshot=False)
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                conn, _addr = self._server.accept()
+            except OSError:
+                return
+            conn.setblocking(False)
+            with self._lock:
+                self._new.append(conn)
+
+    def _admit(self):
+        with self._lock:
+            new, self._new = self._new, []
+        if new:
+            data = _encode(self.publisher.snapshot())
+            for conn in new:
+                client = _Client(conn)
+                client.buf += data
+                self._clients.append(client)
+
+    def _on_message(self, msg):
+        if self._new:
+            self._admit()
+        if not self._clients:
+            return
+        data = _encode(msg)
+        is_snapshot = msg['type'] == 'snapshot'
+        for client in self._clients:
+            if client.skipping:
+                if not is_snapshot:
+                    continue
+                client.skipping = False
+            client.buf += data
+            if len(client.buf) > self.max_buffer:
+                client.buf.clear()
+                client.skipping = True
+        self.flush()
+
+    def flush(self):
+        dead = []
+        for client in self._clients:
+            if not client.buf:
+                continue
+            try:
+                sent = client.sock.send(client.buf)
+                del client.buf[:sent]
+            except BlockingIOError:
+                pass
+            except OSError:
+                dead.append(client)
+        for client in dead:
+            client.sock.close()
+            self._clients.remove(client)
+
+    def poll(self):
+        self._admit()
+        self.flush()
+
+    def close(self):
+        self._closed = True
+        self.publisher.unsubscribe(self._on_message)
+        try:
+            self._server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._server.close()
+        for client in self._clients:
+            client.sock.close()
+        self._clients = []
+        if self.unix_path and os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
+
+
+def _encode(msg):
+    return (json.dumps(msg, separators=(',', ':')) + '\n').encode()
+
+
+def iter_feed(host='127.0.0.1', port=9010, unix_path=None):
+    # Yields messages from a SocketFeed until the server closes the connection
+    if unix_path:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(unix_path)
+    else:
+        sock = socket.create_connection((host, port))
+    with sock, sock.makefile('rb') as stream:
+        for line in stream:
+            yield json.loads(line)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Print the top of book from a market-data socket feed.")
+    ap.add_argument('--connect', default='127.0.0.1:9010', help="HOST:PORT of a SocketFeed")
+    ap.add_argument('--unix', help="connect to this Unix socket instead of TCP")
+    ap.add_argument('--levels', type=int, default=1, help="levels per side to print")
+    args = ap.parse_args(argv)
+
+    host, _, port = args.connect.rpartition(':')
+    book = BookMirror()
+    try:
+        for msg in iter_feed(host, int(port), args.unix):
+            top = (book.best_bid, book.best_ask)
+            book(msg)
+            if book.stale:
+                print(f"seq {msg['seq']}: gap, waiting for snapshot")
+            elif msg['type'] == 'trade':
+                print(f"seq {book.seq:>8} trade {msg['qty']} @ {msg['price']} ({msg['aggressor']})")
+            elif msg['type'] == 'snapshot' or msg['price'] in top or (book.best_bid, book.best_ask) != top:
+                bids = sorted(book.bids.items(), reverse=True)[:args.levels]
+                asks = sorted(book.asks.items())[:args.levels]
+                fmt = lambda lv: ' '.join(f"{p}x{q}({c})" for p, (q, c) in lv) or '-'
+                print(f"seq {book.seq:>8} bid {fmt(bids)} | ask {fmt(asks)} ltp {book.ltp}")
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1023 @@
+"""Pygame-free matching core for the order book simulator.
+
+Importing this module pulls in nothing beyond the standard library, so
+backtests and workers can create any number of independent engines in one
+process. The pygame UI in ``order-matching-engine.py`` is one client of it.
+NumPy is only imported when a caller asks for NumPy input or output.
+
+Prices are integer ticks of the book's ``PriceBand`` everywhere in the
+engine (and in the logs, journal and market-data feed built on it). With
+the default band's tick of 1 a tick count is the price itself; a band with
+``tick='0.05'`` stores 100.25 as 2005, so no float ever reaches the book.
+"""
+import gc
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+from decimal import Decimal
+from itertools import compress, repeat
+from operator import attrgetter, itemgetter, not_
+
+PRICE_MIN, PRICE_MAX = 990, 1010  # default band
+PRICE_TICK = 1  # default price step size
+DEFAULT_LTP = 1000
+EMPTY = -1  # "no value" in integer batch columns (market price, OID, taker ID)
+SWEEP_MIN_ORDERS = 16  # submit_batch fills a whole level in one step from this many orders
+BULK_MIN_ROWS = 64  # BookSide.add_many leaves batches this large pending (no nodes) on their levels
+
+
+class PriceBand:
+    """Price range and tick size of one book.
+
+    ``lo``/``hi`` are the band edges in ticks; ``to_ticks`` and ``to_price``
+    convert at the edges of the system (order entry, display). Prices may be
+    given as ints, strings or Decimals; floats work but are converted via
+    ``str`` so ``0.1`` means 0.1.
+    """
+    __slots__ = ("tick", "lo", "hi", "_whole")
+
+    def __init__(self, min_price=PRICE_MIN, max_price=PRICE_MAX, tick=PRICE_TICK):
+        self.tick = Decimal(str(tick))
+        if self.tick <= 0:
+            raise ValueError(f"tick must be positive, not {tick}")
+        self._whole = self.tick == 1
+        self.lo = self.to_ticks(min_price)
+        self.hi = self.to_ticks(max_price)
+        if self.lo > self.hi:
+            raise ValueError(f"empty band {min_price}-{max_price}")
+
+    def to_ticks(self, price):
+        if self._whole and isinstance(price, int):
+            return price
+        ticks = Decimal(str(price)) / self.tick
+        if ticks != ticks.to_integral_value():
+            raise ValueError(f"price {price} is not on a {self.tick} tick")
+        return int(ticks)
+
+    def to_price(self, ticks):
+        # int for a tick of 1, else a Decimal with the tick's decimal places
+        return ticks if self._whole else ticks * self.tick
+
+    def format(self, ticks):
+        return str(self.to_price(ticks))
+
+    def check(self, ticks):
+        if not self.lo <= ticks <= self.hi:
+            raise ValueError(f"price {self.format(ticks)} outside band {self.format(self.lo)}-{self.format(self.hi)}")
+
+    def clamp(self, ticks):
+        return self.lo if ticks < self.lo else self.hi if ticks > self.hi else ticks
+
+    @property
+    def mid(self):
+        return (self.lo + self.hi) // 2
+
+    def __len__(self):
+        return self.hi - self.lo + 1
+
+    def __eq__(self, other):
+        return isinstance(other, PriceBand) and (self.tick, self.lo, self.hi) == (other.tick, other.lo, other.hi)
+
+    def __hash__(self):
+        return hash((self.tick, self.lo, self.hi))
+
+    def __repr__(self):
+        return f"PriceBand({self.format(self.lo)!r}, {self.format(self.hi)!r}, tick={str(self.tick)!r})"
+
+
+DEFAULT_BAND = PriceBand()
+
+
+def parse_band(text):
+    # PriceBand from 'MIN:MAX' or 'MIN:MAX:TICK' (command-line options)
+    parts = text.split(':')
+    if len(parts) not in (2, 3):
+        raise ValueError(f"band must be MIN:MAX[:TICK], not {text!r}")
+    return PriceBand(*parts)
+
+
+class OrderNode:
+    """A resting order, linked into the FIFO queue of its price level."""
+    __slots__ = ("price", "qty", "is_player", "oid", "prev", "next")
+
+    def __init__(self, price, qty, is_player, oid):
+        self.price = price
+        self.qty = qty
+        self.is_player = is_player
+        self.oid = oid
+        self.prev = None
+        self.next = None
+
+    def as_tuple(self):
+        return (self.price, self.qty, self.is_player, self.oid)
+
+
+class PriceLevel:
+    """Doubly linked FIFO queue of the orders resting at one price.
+
+    ``qty`` and ``count`` are the level's total resting quantity and number of
+    orders, kept up to date as orders rest, fill and leave. Orders resting
+    here share the level's ``price`` object rather than each holding an
+    equal int of their own.
+
+    ``pending`` holds orders rested in bulk (``BookSide.add_many``) that are
+    not linked yet, as a list of ``(qtys, players, oids)`` column chunks
+    queued behind the nodes (None when there are none). They count in ``qty``
+    and ``count`` and become nodes when ``BookSide.settle`` is called.
+    """
+    __slots__ = ("price", "head", "tail", "qty", "count", "pending")
+
+    def __init__(self, price):
+        self.price = price
+        self.head = None
+        self.tail = None
+        self.qty = 0
+        self.count = 0
+        self.pending = None
+
+    def add_many(self, qtys, players, oids):
+        # Queue one chunk of orders (equal-length columns in arrival order)
+        # behind the level's orders in one step
+        if self.pending is None:
+            self.pending = [(qtys, players, oids)]
+        else:
+            self.pending.append((qtys, players, oids))
+        self.qty += sum(qtys)
+        self.count += len(oids)
+
+    def append(self, node):
+        node.prev = self.tail
+        node.next = None
+        if self.tail is None:
+            self.head = node
+        else:
+            self.tail.next = node
+        self.tail = node
+        self.qty += node.qty
+        self.count += 1
+
+    def unlink(self, node):
+        if node.prev is None:
+            self.head = node.next
+        else:
+            node.prev.next = node.next
+        if node.next is None:
+            self.tail = node.prev
+        else:
+            node.next.prev = node.prev
+        node.prev = node.next = None
+        self.qty -= node.qty
+        self.count -= 1
+
+    def __iter__(self):
+        node = self.head
+        while node is not None:
+            yield node
+            node = node.next
+
+
+class BookStats:
+    """Top-of-book and occupancy counters for one order book.
+
+    Both book sides update these as orders rest, fill and leave, so readers
+    such as the UI stats panel get them in O(1).
+    """
+    __slots__ = ("best_bid", "best_ask", "occupied_levels", "player_open_orders", "player_open_qty")
+
+    def __init__(self):
+        self.best_bid = None
+        self.best_ask = None
+        self.occupied_levels = 0
+        self.player_open_orders = 0
+        self.player_open_qty = 0
+
+    @property
+    def spread_ticks(self):
+        if self.best_bid is None or self.best_ask is None:
+            return None
+        return self.best_ask - self.best_bid
+
+
+class BookSide:
+    """One side of the order book as a sparse price ladder.
+
+    ``levels`` maps each occupied price (in ticks) to the FIFO queue of
+    orders resting there, and ``prices`` keeps the occupied prices sorted
+    ascending, so an empty price costs nothing however wide the band is.
+    ``best`` is the best price. ``orders`` maps each resting OID to its node
+    (or to its level while the order is still ``pending`` there) so cancels
+    and amends unlink it directly. Fills and cancels touch a single level,
+    and only opening or emptying a level touches ``prices``.
+    Iterating yields ``(price, qty, is_player, oid)`` tuples in price-time
+    priority.
+
+    ``changed`` is None unless a market-data publisher sets it to a set; every
+    price whose level total changes is then added to it.
+    """
+
+    def __init__(self, is_bid, stats=None, band=None):
+        self.is_bid = is_bid
+        self.band = band if band is not None else DEFAULT_BAND
+        self.levels = {}  # price -> PriceLevel, occupied prices only
+        self.prices = []  # occupied prices, ascending
+        self.best = None  # best price, None when empty
+        self.orders = {}  # oid -> OrderNode, or its PriceLevel while pending
+        self.stats = stats if stats is not None else BookStats()
+        self.changed = None
+
+    def best_price(self):
+        return self.best
+
+    def _set_best(self, price):
+        self.best = price
+        if self.is_bid:
+            self.stats.best_bid = price
+        else:
+            self.stats.best_ask = price
+
+    def _open_level(self, price):
+        level = self.levels[price] = PriceLevel(price)
+        insort(self.prices, price)
+        self.stats.occupied_levels += 1
+        return level
+
+    def _drop_level(self, price):
+        # Forget an emptied level and move best on if it was the best
+        del self.levels[price]
+        prices = self.prices
+        self.stats.occupied_levels -= 1
+        if price == self.best:
+            if self.is_bid:
+                prices.pop()
+                self._set_best(prices[-1] if prices else None)
+            else:
+                del prices[0]
+                self._set_best(prices[0] if prices else None)
+        else:
+            del prices[bisect_left(prices, price)]
+
+    def add(self, price, qty, is_player, oid):
+        level = self.levels.get(price)
+        if level is None:
+            self.band.check(price)
+            level = self._open_level(price)
+        elif level.pending:
+            self.settle(level)
+        node = OrderNode(level.price, qty, is_player, oid)
+        level.append(node)
+        self.orders[oid] = node
+        stats = self.stats
+        if is_player:
+            stats.player_open_orders += 1
+            stats.player_open_qty += qty
+        if self.best is None or (price > self.best if self.is_bid else price < self.best):
+            self._set_best(price)
+        if self.changed is not None:
+            self.changed.add(price)
+        return node
+
+    def add_many(self, rows):
+        # Rest (price, qty, is_player, oid) rows, in arrival order, with one
+        # structural update (add_grouped). Fewer than BULK_MIN_ROWS rows are
+        # linked as nodes at once instead. Prices are trusted to be in the band
+        # (submit_batch validates up front).
+        if len(rows) < BULK_MIN_ROWS:
+            self._link_many(rows)
+        else:
+            self.add_grouped(_group_by_price(*_columns(rows, 4)))
+
+    def add_grouped(self, groups):
+        # Rest orders grouped by price, {price: (qtys, players, oids)} with each
+        # group's columns in arrival order: one PriceLevel.add_many per group, new
+        # prices merged into `prices` once, and the OID map, stats and best price
+        # updated in bulk. No node is built until a level is settled.
+        if not groups:
+            return
+        levels = self.levels
+        orders = self.orders
+        new_prices = []
+        player_orders = player_qty = 0
+        for price, (qtys, players, oids) in groups.items():
+            level = levels.get(price)
+            if level is None:
+                level = levels[price] = PriceLevel(price)
+                new_prices.append(price)
+            level.add_many(qtys, players, oids)
+            orders.update(zip(oids, repeat(level)))
+            if any(players):
+                player_orders += sum(players)
+                player_qty += sum(compress(qtys, players))
+        if new_prices:
+            prices = self.prices
+            if len(new_prices) > len(prices):
+                prices += new_prices
+                prices.sort()
+            else:
+                for price in new_prices:
+                    insort(prices, price)
+        stats = self.stats
+        stats.occupied_levels += len(new_prices)
+        stats.player_open_orders += player_orders
+        stats.player_open_qty += player_qty
+        best = max(groups) if self.is_bid else min(groups)
+        if self.best is None or (best > self.best if self.is_bid else best < self.best):
+            self._set_best(best)
+        if self.changed is not None:
+            self.changed.update(groups)
+
+    def _link_many(self, rows):
+        # add_many for a few rows: link each as a node straight away, in one pass
+        levels = self.levels
+        orders = self.orders
+        is_bid = self.is_bid
+        best = self.best
+        new_prices = []
+        player_orders = player_qty = 0
+        for price, qty, is_player, oid in rows:
+            level = levels.get(price)
+            if level is None:
+                level = levels[price] = PriceLevel(price)
+                new_prices.append(price)
+            elif level.pending:
+                self.settle(level)
+            node = OrderNode(level.price, qty, is_player, oid)
+            tail = level.tail
+            node.prev = tail
+            if tail is None:
+                level.head = node
+            else:
+                tail.next = node
+            level.tail = node
+            level.qty += qty
+            level.count += 1
+            orders[oid] = node
+            if is_player:
+                player_orders += 1
+                player_qty += qty
+            if best is None or (price > best if is_bid else price < best):
+                best = price
+        for price in new_prices:
+            insort(self.prices, price)
+        stats = self.stats
+        stats.occupied_levels += len(new_prices)
+        stats.player_open_orders += player_orders
+        stats.player_open_qty += player_qty
+        if best != self.best:
+            self._set_best(best)
+        if self.changed is not None:
+            self.changed.update(map(itemgetter(0), rows))
+
+    def settle(self, level):
+        # Link the level's pending orders as nodes behind its queue, in order.
+        # Done the first time a level is matched against, added to or cancelled
+        # from, so a bulk load pays for nodes only at the levels that trade.
+        chunks = level.pending
+        level.pending = None
+        price = level.price
+        orders = self.orders
+        tail = level.tail
+        for qtys, players, oids in chunks:
+            for qty, is_player, oid in zip(qtys, players, oids):
+                node = OrderNode(price, qty, is_player, oid)
+                node.prev = tail
+                if tail is None:
+                    level.head = node
+                else:
+                    tail.next = node
+                tail = node
+                orders[oid] = node
+        level.tail = tail
+
+    def find(self, oid):
+        # The resting node for oid, or None; settles its level if needed
+        node = self.orders.get(oid)
+        if node.__class__ is PriceLevel:
+            self.settle(node)
+            node = self.orders[oid]
+        return node
+
+    def fill(self, level, node, traded):
+        # Take `traded` off a resting node in `level`, removing it once empty
+        node.qty -= traded
+        level.qty -= traded
+        if node.is_player:
+            self.stats.player_open_qty -= traded
+        if self.changed is not None:
+            self.changed.add(node.price)
+        if node.qty == 0:
+            self.remove(node)
+
+    def reduce(self, node, new_qty):
+        # Shrink a resting order in place, keeping its queue position
+        diff = node.qty - new_qty
+        node.qty = new_qty
+        self.levels[node.price].qty -= diff
+        if node.is_player:
+            self.stats.player_open_qty -= diff
+        if self.changed is not None:
+            self.changed.add(node.price)
+
+    def clear_level(self, level):
+        # Remove every order resting at `level` (a whole-level fill) in one pass
+        # and return their nodes in FIFO order. Back links are cut so the queue
+        # is freed by refcounting rather than left to the cyclic GC.
+        if level.pending:
+            self.settle(level)
+        orders = self.orders
+        nodes = []
+        append = nodes.append
+        player_orders = player_qty = 0
+        node = level.head
+        while node is not None:
+            append(node)
+            del orders[node.oid]
+            if node.is_player:
+                player_orders += 1
+                player_qty += node.qty
+            node.prev = None
+            node = node.next
+        level.head = level.tail = None
+        level.qty = level.count = 0
+        stats = self.stats
+        stats.player_open_orders -= player_orders
+        stats.player_open_qty -= player_qty
+        if self.changed is not None:
+            self.changed.add(level.price)
+        self._drop_level(level.price)
+        return nodes
+
+    def head(self):
+        level = self.levels[self.best]
+        if level.pending:
+            self.settle(level)
+        return level.head
+
+    def remove(self, node):
+        level = self.levels[node.price]
+        level.unlink(node)
+        del self.orders[node.oid]
+        if self.changed is not None:
+            self.changed.add(node.price)
+        stats = self.stats
+        if node.is_player:
+            stats.player_open_orders -= 1
+            stats.player_open_qty -= node.qty
+        if not level.count:
+            self._drop_level(node.price)
+
+    def level(self, price):
+        # (total qty, order count) at price; (0, 0) when nothing rests there
+        level = self.levels.get(price)
+        return (level.qty, level.count) if level is not None else (0, 0)
+
+    def depth(self, lo=None, hi=None):
+        # (price, total qty, order count) per occupied level, best first,
+        # optionally only prices in [lo, hi]; O(levels returned + log levels)
+        prices = self.prices
+        i = 0 if lo is None else bisect_left(prices, lo)
+        j = len(prices) if hi is None else bisect_left(prices, hi + 1)
+        window = prices[i:j]
+        if self.is_bid:
+            window.reverse()
+        levels = self.levels
+        return [(p, levels[p].qty, levels[p].count) for p in window]
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __bool__(self):
+        return bool(self.orders)
+
+    def __iter__(self):
+        levels = self.levels
+        for price in (self.prices[::-1] if self.is_bid else self.prices[:]):
+            level = levels[price]
+            for node in level:
+                yield node.as_tuple()
+            if level.pending:
+                for qtys, players, oids in level.pending:
+                    yield from zip(repeat(price), qtys, players, oids)
+
+
+def new_order_book(band=None):
+    stats = BookStats()
+    return {"bids": BookSide(is_bid=True, stats=stats, band=band), "asks": BookSide(is_bid=False, stats=stats, band=band),
+            "stats": stats}
+
+
+def batch_dtype():
+    # NumPy dtype accepted by MatchingEngine.submit_batch; price EMPTY = market
+    # order, taker_id EMPTY = let the engine assign one
+    import numpy as np
+    return np.dtype([('side', 'u1'), ('price', '<i8'), ('qty', '<i8'), ('is_player', '?'), ('taker_id', '<i8')])
+
+
+def _columns(rows, k):
+    # The first k columns of a list of tuples (quicker than zip(*rows) for long lists)
+    return [list(map(itemgetter(i), rows)) for i in range(k)]
+
+
+def _group_by_price(prices, qtys, players, oids):
+    # {price: (qtys, players, oids)} with each price's orders in their original order
+    index = defaultdict(list)
+    for i, price in enumerate(prices):
+        index[price].append(i)
+    groups = {}
+    for price, idx in index.items():
+        if len(idx) == 1:
+            i = idx[0]
+            groups[price] = ((qtys[i],), (players[i],), (oids[i],))
+        else:
+            get = itemgetter(*idx)  # one C call gathers a whole column
+            groups[price] = (get(qtys), get(players), get(oids))
+    return groups
+
+
+def _batch_columns(orders, band):
+    # Validated (sides, prices, qtys, is_player, taker_ids) columns from a list of
+    # (side, price, qty[, is_player[, taker_id]]) or a batch_dtype array; price
+    # None = market order, taker_id None = assign the next one
+    if hasattr(orders, 'dtype'):
+        import numpy as np
+        prices = orders['price'].astype(object)
+        prices[orders['price'] == EMPTY] = None
+        tids = orders['taker_id'].astype(object)
+        tids[orders['taker_id'] == EMPTY] = None
+        cols = (np.where(orders['side'] == 0, 'buy', 'sell').tolist(), prices.tolist(),
+                orders['qty'].tolist(), orders['is_player'].tolist(), tids.tolist())
+    else:
+        rows = orders if isinstance(orders, list) else list(orders)
+        lengths = set(map(len, rows))
+        if lengths == {3}:
+            cols = (*_columns(rows, 3), (False,) * len(rows), (None,) * len(rows))
+        elif lengths != {5} and rows:
+            cols = _columns([(*r, *(False, None)[len(r) - 3:]) for r in rows], 5)
+        else:
+            cols = _columns(rows, 5)
+    sides, prices, qtys = cols[:3]
+    if not sides:
+        return cols
+    bad = set(sides) - {'buy', 'sell'}
+    if bad:
+        raise ValueError(f"side must be 'buy' or 'sell', not {bad.pop()!r}")
+    if min(qtys) <= 0:
+        raise ValueError("order qty must be positive")
+    limits = [p for p in prices if p is not None] if None in prices else prices
+    if limits:
+        band.check(min(limits))
+        band.check(max(limits))
+    return cols
+
+
+TRADE_COLUMNS = ('order', 'price', 'qty', 'resting_oid', 'taker_id', 'taker_is_player', 'resting_is_player')
+
+
+def _trade_columns():
+    # Empty submit_batch trade columns; the is_player flags are bytes
+    return {name: array('b' if name.endswith('is_player') else 'q') for name in TRADE_COLUMNS}
+
+
+_node_qty = attrgetter('qty')
+_node_oid = attrgetter('oid')
+_node_is_player = attrgetter('is_player')
+
+
+def _sweep_level(book_side, level, taker_label, player_label, resting_side, taker_id, trades, fifo_entries):
+    # Fill every order at `level`, still one trade and FIFO record per resting order.
+    # Kept out of _take so its comprehensions do not turn _take's locals into cells.
+    price = level.price
+    nodes = book_side.clear_level(level)
+    trades.extend([(price, n.qty, taker_label, player_label if n.is_player else 'Bot', n.oid, taker_id) for n in nodes])
+    fifo_entries.extend([(n.oid, resting_side, price, n.qty, taker_label, taker_id) for n in nodes])
+
+
+def _sweep_columns(trades, nodes, order, price, taker_id, taker_is_player):
+    # submit_batch's counterpart of _sweep_level: append a cleared level's fills to the trade columns
+    k = len(nodes)
+    trades['order'].extend(array('q', [order]) * k)
+    trades['price'].extend(array('q', [price]) * k)
+    trades['qty'].extend(map(_node_qty, nodes))
+    trades['resting_oid'].extend(map(_node_oid, nodes))
+    trades['taker_id'].extend(array('q', [taker_id]) * k)
+    trades['taker_is_player'].extend(array('b', [taker_is_player]) * k)
+    trades['resting_is_player'].extend(map(_node_is_player, nodes))
+
+
+def _take(book_side, limit_price, qty, is_player, taker_id, trades, fifo_entries):
+    # Fill qty against book_side in price-time priority, stopping at limit_price
+    # (None for market orders). Returns the quantity left unfilled.
+    taker_label = 'You' if is_player else 'Bot'
+    if book_side.is_bid:
+        player_label, resting_side = 'Buyer', 'Bid'
+    else:
+        player_label, resting_side = 'Seller', 'Ask'
+    while qty > 0 and book_side:
+        if limit_price is not None:
+            best = book_side.best_price()
+            if (limit_price > best) if book_side.is_bid else (limit_price < best):
+                break
+        level = book_side.levels[book_side.best]
+        if qty >= level.qty and level.count > 1:
+            # The taker covers the whole level: take it in one step (a lone order takes the plain path)
+            qty -= level.qty
+            _sweep_level(book_side, level, taker_label, player_label, resting_side, taker_id, trades, fifo_entries)
+            continue
+        if level.pending:
+            book_side.settle(level)
+        node = level.head
+        traded = min(qty, node.qty)
+        trades.append((node.price, traded, taker_label, player_label if node.is_player else 'Bot', node.oid, taker_id))
+        fifo_entries.append((node.oid, resting_side, node.price, traded, taker_label, taker_id))
+        qty -= traded
+        book_side.fill(level, node, traded)
+    return qty
+
+
+def _find_resting(order_book, oid):
+    node = order_book["bids"].find(oid)
+    if node is not None:
+        return "buy", order_book["bids"], node
+    node = order_book["asks"].find(oid)
+    if node is not None:
+        return "sell", order_book["asks"], node
+    return None, None, None
+
+
+def cancel_order(order_book, oid):
+    # Returns (side, price, qty, is_player, oid) of the removed order, or None if it is not resting
+    side, book_side, node = _find_resting(order_book, oid)
+    if node is None:
+        return None
+    book_side.remove(node)
+    return (side,) + node.as_tuple()
+
+
+def amend_order(order_book, oid, new_qty=None, new_price=None, taker_id=None):
+    # Reducing qty at the same price keeps queue priority; a price change or a
+    # qty increase re-enters the order at the back of its level (and may trade
+    # if the new price crosses). Returns (trades, fifo_entries), or None if the
+    # order is not resting.
+    side, book_side, node = _find_resting(order_book, oid)
+    if node is None:
+        return None
+    new_qty = node.qty if new_qty is None else new_qty
+    new_price = node.price if new_price is None else new_price
+    if new_qty <= 0:
+        raise ValueError("amended qty must be positive; use cancel_order to remove an order")
+    book_side.band.check(new_price)  # validate before touching the book
+    trades = []
+    fifo_entries = []
+    if new_price == node.price and new_qty <= node.qty:
+        book_side.reduce(node, new_qty)
+        return trades, fifo_entries
+    book_side.remove(node)
+    opposite = order_book["asks"] if side == "buy" else order_book["bids"]
+    remaining = _take(opposite, new_price, new_qty, node.is_player, taker_id, trades, fifo_entries)
+    if remaining > 0:
+        book_side.add(new_price, remaining, node.is_player, oid)
+    return trades, fifo_entries
+
+
+class MatchingEngine:
+    """One order book with its own price band, order/taker ID counters and LTP.
+
+    ``band`` is a ``PriceBand`` (default 990-1010, tick 1); prices in and out
+    are ticks of it, and the LTP starts at the band's mid price unless given.
+
+    ``listener``, when set, is called after every call that changes the book
+    with that call's trade prints as ``(price, qty, aggressor_side)`` tuples
+    (see ``market_data.MarketDataPublisher``).
+    """
+
+    def __init__(self, ltp=None, band=None):
+        self.listener = None
+        self.band = band if band is not None else DEFAULT_BAND
+        self.reset(ltp)
+
+    def reset(self, ltp=None):
+        self.order_book = new_order_book(self.band)
+        self.order_id_counter = 1
+        self.taker_id_counter = 1
+        self.ltp = self.band.mid if ltp is None else ltp
+        if self.listener is not None:
+            self.listener(())
+
+    def clear_book(self):
+        # Empty the book and restart order IDs; taker IDs and LTP are kept
+        self.order_book = new_order_book(self.band)
+        self.order_id_counter = 1
+        if self.listener is not None:
+            self.listener(())
+
+    @property
+    def stats(self):
+        return self.order_book["stats"]
+
+    def next_taker_id(self):
+        tid = self.taker_id_counter
+        self.taker_id_counter += 1
+        return tid
+
+    def add_resting(self, side, price, qty, is_player=False):
+        # Rest an order directly without matching (used to seed sample books); returns its OID
+        oid = self.order_id_counter
+        book_side = self.order_book["bids"] if side == "buy" else self.order_book["asks"]
+        book_side.add(price, qty, is_player, oid)
+        self.order_id_counter += 1
+        if self.listener is not None:
+            self.listener(())
+        return oid
+
+    def place_limit_order(self, side, price, qty, is_player, taker_id=None):
+        # Reject an out-of-band price before it can trade, not when its remainder rests
+        self.band.check(price)
+        trades = []
+        fifo_entries = []
+        if side == "buy":
+            own, opposite = self.order_book["bids"], self.order_book["asks"]
+        else:
+            own, opposite = self.order_book["asks"], self.order_book["bids"]
+        qty = _take(opposite, price, qty, is_player, taker_id, trades, fifo_entries)
+        if qty > 0:
+            own.add(price, qty, is_player, self.order_id_counter)
+            self.order_id_counter += 1
+        if trades:
+            self.ltp = trades[-1][0]
+        if self.listener is not None:
+            self.listener([(t[0], t[1], side) for t in trades])
+        return trades, fifo_entries
+
+    def submit_batch(self, orders, as_numpy=None):
+        """Match many orders in arrival order; same results as one place_* call each.
+
+        ``orders`` is a list of ``(side, price, qty[, is_player[, taker_id]])``
+        (price None for a market order, taker_id None to assign the next one)
+        or a NumPy array of ``batch_dtype()``. Limit remainders are held back
+        and rested together at the end with one ``BookSide.add_many`` per side,
+        except that a side's held-back orders are rested early when a later
+        order in the batch could trade with them, so queue priority and fills
+        match sequential submission. A batch in which nothing can trade (a book
+        load: no market orders, every bid in the batch and the book below every
+        ask) skips the matching loop.
+
+        Orders rested in bulk stay as columns on their price levels (no node
+        each) until the level is first matched against, added to or cancelled
+        from, which then links the whole level. Loading a book this way runs at
+        about 3x the rate of looping ``place_limit_order`` for a list and about
+        10x for a ``batch_dtype`` array, which is grouped by price with NumPy
+        (``bench.py --bulk N``). Batches that trade throughout run at about the
+        looped rate.
+
+        Returns ``(trades, results)``, both dicts of equal-length columns:
+        trades ``order`` (batch index of the taker), ``price``, ``qty``,
+        ``resting_oid``, ``taker_id``, ``taker_is_player``, ``resting_is_player``;
+        results, one row per order, ``taker_id``, ``filled``, ``oid`` (OID of the
+        rested remainder or EMPTY). Columns are ``array`` objects, or NumPy arrays
+        when ``as_numpy`` is true (default: when ``orders`` is a NumPy array).
+        """
+        if as_numpy is None:
+            as_numpy = hasattr(orders, 'dtype')
+        # The batch allocates many short-lived acyclic objects; pausing the cyclic
+        # GC avoids repeated full scans of the growing book while it runs
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            res = self._rest_array(orders) if hasattr(orders, 'dtype') else None
+            if res is None:
+                # Everything is validated up front so a bad order cannot leave a half-applied batch
+                cols = _batch_columns(orders, self.band)
+                n = len(cols[0])
+                res = self._rest_batch(cols, n)
+                if res is None:
+                    res = self._match_batch(cols, n)
+            trades, results = res
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        if self.listener is not None:
+            # Only _match_batch trades, so `cols` is set whenever there are prints
+            self.listener([(p, q, cols[0][o]) for o, p, q in zip(trades['order'], trades['price'], trades['qty'])])
+        if as_numpy:
+            import numpy as np
+            trades = {k: np.frombuffer(v, dtype=np.int8).astype(bool) if v.typecode == 'b' else np.frombuffer(v, dtype=np.int64)
+                      for k, v in trades.items()}
+            results = {k: np.frombuffer(v, dtype=np.int64) for k, v in results.items()}
+        return trades, results
+
+    def _taker_ids(self, tids):
+        # The batch's taker IDs with the next IDs filled in where none was given
+        if None not in tids:
+            return array('q', tids)
+        first = self.taker_id_counter
+        if tids.count(None) == len(tids):
+            self.taker_id_counter = first + len(tids)
+            return array('q', range(first, first + len(tids)))
+        filled = array('q', [EMPTY]) * len(tids)
+        for i, tid in enumerate(tids):
+            if tid is None:
+                tid = self.taker_id_counter
+                self.taker_id_counter += 1
+            filled[i] = tid
+        return filled
+
+    def _rest_batch(self, cols, n):
+        # Rest a batch that cannot trade (no market orders, every bid in the batch
+        # and the book below every ask) without the matching loop. Returns None
+        # when the batch needs _match_batch.
+        sides, prices, qtys, players, tids = cols
+        if not n or None in prices:
+            return None
+        bids, asks = self.order_book["bids"], self.order_book["asks"]
+        is_bid = [side == 'buy' for side in sides]
+        top_bid = max(compress(prices, is_bid), default=bids.best)
+        if bids.best is not None and bids.best > top_bid:
+            top_bid = bids.best
+        low_ask = min(compress(prices, map(not_, is_bid)), default=asks.best)
+        if asks.best is not None and asks.best < low_ask:
+            low_ask = asks.best
+        if top_bid is not None and low_ask is not None and top_bid >= low_ask:
+            return None
+        oid = self.order_id_counter
+        oids = list(range(oid, oid + n))
+        groups = _group_by_price(prices, qtys, players, oids)
+        # Nothing crosses, so the bids are exactly the prices up to top_bid
+        bids.add_grouped({p: g for p, g in groups.items() if top_bid is not None and p <= top_bid})
+        asks.add_grouped({p: g for p, g in groups.items() if top_bid is None or p > top_bid})
+        self.order_id_counter = oid + n
+        return _trade_columns(), {'taker_id': self._taker_ids(tids), 'filled': array('q', [0]) * n,
+                                  'oid': array('q', oids)}
+
+    def _rest_array(self, orders):
+        # _rest_batch for a batch_dtype array, vectorized: one stable sort by
+        # (side, price) makes every level's orders a slice, bids first. Returns
+        # None when the batch needs the matching loop or has an invalid order
+        # (left to _batch_columns to report).
+        import numpy as np
+        n = len(orders)
+        price, side, qty = orders['price'], orders['side'], orders['qty']
+        band = self.band
+        if not n or (side > 1).any() or (qty <= 0).any() or (price == EMPTY).any():
+            return None
+        if price.min() < band.lo or price.max() > band.hi:
+            return None
+        keys = (price - band.lo) + side.astype(np.int64) * len(band)
+        if 2 * len(band) <= 1 << 16:
+            keys = keys.astype(np.uint16)  # NumPy sorts 16-bit keys stably with a radix sort
+        order = np.argsort(keys, kind='stable')
+        prices = price[order].tolist()
+        n_bids = n - int(np.count_nonzero(side))
+        bids, asks = self.order_book["bids"], self.order_book["asks"]
+        top_bid = prices[n_bids - 1] if n_bids else bids.best
+        if bids.best is not None and bids.best > top_bid:
+            top_bid = bids.best
+        low_ask = prices[n_bids] if n_bids < n else asks.best
+        if asks.best is not None and asks.best < low_ask:
+            low_ask = asks.best
+        if top_bid is not None and low_ask is not None and top_bid >= low_ask:
+            return None
+        oid = self.order_id_counter
+        starts = [0, *(np.flatnonzero(np.diff(keys[order])) + 1).tolist()]
+        qtys, players, oids = qty[order].tolist(), orders['is_player'][order].tolist(), (order + oid).tolist()
+        groups = [(prices[i], (qtys[i:j], players[i:j], oids[i:j])) for i, j in zip(starts, starts[1:] + [n])]
+        split = bisect_left(starts, n_bids)
+        bids.add_grouped(dict(groups[:split]))
+        asks.add_grouped(dict(groups[split:]))
+        self.order_id_counter = oid + n
+        tids = orders['taker_id'].astype(np.int64)
+        missing = np.flatnonzero(tids == EMPTY)
+        tids[missing] = np.arange(self.taker_id_counter, self.taker_id_counter + len(missing))
+        self.taker_id_counter += len(missing)
+        return _trade_columns(), {'taker_id': array('q', tids.tobytes()), 'filled': array('q', [0]) * n,
+                                  'oid': array('q', np.arange(oid, oid + n, dtype=np.int64).tobytes())}
+
+    def _match_batch(self, cols, n):
+        bids, asks = self.order_book["bids"], self.order_book["asks"]
+        stats = self.order_book["stats"]
+        held_bids, held_asks = [], []   # remainders not yet rested, in arrival order
+        held_bid_best = held_ask_best = None
+        # Fills go straight into the output columns: no per-fill tuple
+        trades = _trade_columns()
+        f_order, f_price, f_qty, f_roid, f_tid, f_tpl, f_rpl = (trades[name].append for name in TRADE_COLUMNS)
+        res_tid = array('q', [EMPTY]) * n
+        res_filled = array('q', [0]) * n
+        res_oid = array('q', [EMPTY]) * n
+        oid = self.order_id_counter
+        for i, (side, price, qty, is_player, tid) in enumerate(zip(*cols)):
+            is_buy = side == 'buy'
+            want = qty
+            if tid is None:
+                tid = self.taker_id_counter
+                self.taker_id_counter += 1
+            res_tid[i] = tid
+            if is_buy:
+                opp = asks
+                if held_asks and (price is None or price >= held_ask_best):
+                    asks.add_many(held_asks)
+                    held_asks = []
+                    held_ask_best = None
+            else:
+                opp = bids
+                if held_bids and (price is None or price <= held_bid_best):
+                    bids.add_many(held_bids)
+                    held_bids = []
+                    held_bid_best = None
+            levels = opp.levels
+            resting = opp.orders
+            changed = opp.changed
+            while qty:
+                b = opp.best
+                if b is None:
+                    break
+                if price is not None and ((price < b) if is_buy else (price > b)):
+                    break
+                level = levels[b]
+                if qty >= level.qty and level.count >= SWEEP_MIN_ORDERS:
+                    # Whole-level sweep: one extend per column instead of one step per order
+                    qty -= level.qty
+                    _sweep_columns(trades, opp.clear_level(level), i, b, tid, is_player)
+                    continue
+                if level.pending:
+                    opp.settle(level)
+                node = level.head
+                traded = node.qty
+                f_order(i)
+                f_price(b)
+                f_qty(traded if traded < qty else qty)
+                f_roid(node.oid)
+                f_tid(tid)
+                f_tpl(is_player)
+                f_rpl(node.is_player)
+                if changed is not None:
+                    changed.add(node.price)
+                if traded > qty:
+                    # Partial fill of the head order (BookSide.fill, inlined)
+                    node.qty -= qty
+                    level.qty -= qty
+                    if node.is_player:
+                        stats.player_open_qty -= qty
+                    qty = 0
+                    break
+                # Head order fully filled: pop it off the level (BookSide.fill + remove, inlined)
+                qty -= traded
+                nxt = node.next
+                level.head = nxt
+                if nxt is None:
+                    level.tail = None
+                else:
+                    nxt.prev = None
+                    node.next = None
+                node.qty = 0
+                level.qty -= traded
+                level.count -= 1
+                del resting[node.oid]
+                if node.is_player:
+                    stats.player_open_orders -= 1
+                    stats.player_open_qty -= traded
+                if nxt is None:
+                    opp._drop_level(b)
+            res_filled[i] = want - qty
+            if qty and price is not None:
+                res_oid[i] = oid
+                if is_buy:
+                    held_bids.append((price, qty, is_player, oid))
+                    if held_bid_best is None or price > held_bid_best:
+                        held_bid_best = price
+                else:
+                    held_asks.append((price, qty, is_player, oid))
+                    if held_ask_best is None or price < held_ask_best:
+                        held_ask_best = price
+                oid += 1
+        if held_bids:
+            bids.add_many(held_bids)
+        if held_asks:
+            asks.add_many(held_asks)
+        self.order_id_counter = oid
+        if trades['price']:
+            self.ltp = trades['price'][-1]
+        return trades, {'taker_id': res_tid, 'filled': res_filled, 'oid': res_oid}
+
+    def place_market_order(self, side, qty, is_player, taker_id=None):
+        trades = []
+        fifo_entries = []
+        opposite = self.order_book["asks"] if side == "buy" else self.order_book["bids"]
+        _take(opposite, None, qty, is_player, taker_id, trades, fifo_entries)
+        if trades:
+            self.ltp = trades[-1][0]
+        if self.listener is not None:
+            self.listener([(t[0], t[1], side) for t in trades])
+        return trades, fifo_entries
+
+    def cancel_order(self, oid):
+        res = cancel_order(self.order_book, oid)
+        if res is not None and self.listener is not None:
+            self.listener(())
+        return res
+
+    def amend_order(self, oid, new_qty=None, new_price=None, taker_id=None):
+        side = "buy" if oid in self.order_book["bids"].orders else "sell"
+        res = amend_order(self.order_book, oid, new_qty, new_price, taker_id)
+        if res is not None and res[0]:
+            self.ltp = res[0][-1][0]
+        if res is not None and self.listener is not None:
+            self.listener([(t[0], t[1], side) for t in res[0]])
+        return res
@@ -0,0 +1,181 @@
+"""Rebuild order book state by replaying an event log through the matching engine.
+
+Submit, cancel and amend events from ``events_log.csv`` (or a binary
+``events_log.bin`` journal) are fed straight into a ``MatchingEngine`` with no
+pygame and no pauses; result and trade events are derived, so they are only
+counted. Replay can stop at an event index or timestamp, prints the resulting
+book and the replay rate, and by default checks that the regenerated trades
+match ``executed_trades.csv``.
+
+    python replay.py [--events events_log.csv] [--stop-index N] [--stop-ts ISO]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from event_journal import JournalReader
+from matching_engine import MatchingEngine, parse_band
+from timestamps import iso_to_ns
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def read_events(path):
+    # Yields event dicts from a CSV log (ISO text under 'ts') or a binary journal ('ts_ns')
+    if path.endswith('.bin'):
+        with JournalReader(path) as reader:
+            yield from reader.iter_events()
+        return
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            row['ts'] = row.pop('timestamp_iso')
+            yield row
+
+
+def _event_ns(ev):
+    # Truncated to the microseconds an ISO timestamp keeps, so CSV and journal stop at the same event
+    ts_ns = ev.get('ts_ns')
+    return ts_ns // 1000 * 1000 if ts_ns is not None else iso_to_ns(ev['ts'])
+
+
+def _int(value):
+    return int(value) if value not in ('', None) else None
+
+
+def replay(events, engine=None, stop_index=None, stop_ts=None):
+    """Apply events to engine (a fresh one by default).
+
+    Stops before event number ``stop_index`` or before the first event later
+    than ``stop_ts`` (ISO string). Returns a dict with the engine, the number
+    of events consumed, the regenerated trades and the elapsed seconds.
+    """
+    engine = engine if engine is not None else MatchingEngine()
+    stop_ns = iso_to_ns(stop_ts) if stop_ts else None
+    trades = []
+    last_taker_id = 0
+    n = 0
+    t0 = time.perf_counter()
+    for ev in events:
+        if stop_index is not None and n >= stop_index:
+            break
+        if stop_ns is not None and _event_ns(ev) > stop_ns:
+            break
+        n += 1
+        kind = ev['event']
+        if kind == 'reset':
+            if ev.get('note') == 'sample book':
+                engine.clear_book()
+                engine.ltp = engine.band.mid
+            else:
+                engine.reset()
+            last_taker_id = 0
+        elif kind == 'submit':
+            side = 'buy' if ev['side'] == 'Buy' else 'sell'
+            is_player = ev['actor'] == 'You'
+            qty = int(ev['qty'])
+            oid = _int(ev.get('order_id'))
+            if oid is not None:
+                # Sample-book seeding rests directly under a pre-assigned OID
+                if oid == 1 and engine.order_id_counter != 1:
+                    engine.clear_book()  # logs written before 'reset' events existed
+                engine.add_resting(side, int(ev['price']), qty, is_player)
+                continue
+            taker_id = _int(ev.get('taker_id'))
+            if taker_id is not None:
+                if taker_id <= last_taker_id:
+                    engine.reset()  # taker IDs restarted: a new session in an older log
+                last_taker_id = taker_id
+                # Logged IDs are passed through, so keep the engine's counter past them
+                engine.taker_id_counter = max(engine.taker_id_counter, taker_id + 1)
+            if ev['order_type'] == 'MARKET':
+                tr, _ = engine.place_market_order(side, qty, is_player, taker_id)
+            else:
+                tr, _ = engine.place_limit_order(side, int(ev['price']), qty, is_player, taker_id)
+            trades.extend(tr)
+        elif kind == 'cancel':
+            engine.cancel_order(int(ev['order_id']))
+        elif kind == 'amend':
+            res = engine.amend_order(int(ev['order_id']), new_qty=int(ev['qty']), new_price=int(ev['price']))
+            if res is not None:
+                trades.extend(res[0])
+    return {'engine': engine, 'events': n, 'trades': trades, 'seconds': time.perf_counter() - t0}
+
+
+def verify_trades(trades, trades_csv_path):
+    """Compare regenerated trades with the first len(trades) rows of executed_trades.csv.
+
+    Returns None when they match, else a description of the first mismatch.
+    """
+    with open(trades_csv_path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    if len(rows) < len(trades):
+        return f"{trades_csv_path} has {len(rows)} trades, replay produced {len(trades)}"
+    for i, (tr, row) in enumerate(zip(trades, rows)):
+        got = [str(x) if x is not None else '' for x in tr]
+        want = [row['price'], row['qty'], row['taker_label'], row['counterparty_label'],
+                row['resting_order_id'], row['taker_id']]
+        if got != want:
+            return f"trade {i}: replay {got} != logged {want}"
+    return None
+
+
+def book_snapshot(engine):
+    # Plain-data view of the book: price-time ordered (price, qty, is_player, oid) per side
+    return {
+        'ltp': engine.ltp,
+        'bids': [list(e) for e in engine.order_book['bids']],
+        'asks': [list(e) for e in engine.order_book['asks']],
+    }
+
+
+def format_book(engine):
+    fmt = engine.band.format
+    levels = {name: {px: (qty, cnt) for px, qty, cnt in engine.order_book[name].depth()} for name in ('bids', 'asks')}
+    lines = [f"{'price':>7} {'bid qty':>8} {'#':>3} | {'ask qty':>8} {'#':>3}"]
+    for price in sorted(set(levels['bids']) | set(levels['asks']), reverse=True):
+        bq, bn = levels['bids'].get(price, ('', ''))
+        aq, an = levels['asks'].get(price, ('', ''))
+        lines.append(f"{fmt(price):>7} {bq:>8} {bn:>3} | {aq:>8} {an:>3}")
+    lines.append(f"LTP {fmt(engine.ltp)}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--events', default=os.path.join(HERE, 'events_log.csv'), help="events_log.csv or a .bin journal")
+    ap.add_argument('--trades', default=os.path.join(HERE, 'executed_trades.csv'), help="trade log to verify against")
+    ap.add_argument('--no-verify', action='store_true', help="skip the executed_trades.csv check")
+    ap.add_argument('--stop-index', type=int, help="stop before this event number (0-based)")
+    ap.add_argument('--stop-ts', help="stop before the first event later than this ISO timestamp")
+    ap.add_argument('--book-json', help="also write the resulting book to this JSON file")
+    ap.add_argument('--quiet', action='store_true', help="do not print the book")
+    ap.add_argument('--band', type=parse_band, help="MIN:MAX[:TICK] price band the session ran with (default 990:1010:1)")
+    args = ap.parse_args(argv)
+
+    res = replay(read_events(args.events), MatchingEngine(band=args.band), stop_index=args.stop_index, stop_ts=args.stop_ts)
+    engine = res['engine']
+    if not args.quiet:
+        print(format_book(engine))
+    rate = res['events'] / res['seconds'] if res['seconds'] > 0 else float('inf')
+    print(f"replayed {res['events']} events, {len(res['trades'])} trades in {res['seconds']:.3f}s ({rate:,.0f} events/sec)")
+    if args.book_json:
+        with open(args.book_json, 'w') as f:
+            json.dump(book_snapshot(engine), f)
+    if args.no_verify:
+        return 0
+    if not os.path.exists(args.trades) or os.path.getsize(args.trades) == 0:
+        print(f"no trades to verify against in {args.trades}; skipped")
+        return 0
+    problem = verify_trades(res['trades'], args.trades)
+    if problem:
+        print(f"MISMATCH: {problem}")
+        return 1
+    print(f"trades match {args.trades}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""Single-producer/single-consumer ring of fixed-size records in shared memory.
+
+One process appends records with ``put_many`` (or, already packed, with
+``put_packed``) and one other process takes
+them with ``get_many``; nothing is pickled and no lock is taken. The ring
+lives in a ``multiprocessing.shared_memory`` block: a header with the
+consumer's read count and the producer's write count (each on its own cache
+line, each written by one side only), followed by ``capacity`` slots of
+``record.size`` bytes. The producer fills slots before publishing its new
+count, so the consumer never sees a half-written record.
+"""
+import struct
+import time
+from multiprocessing import shared_memory
+
+_COUNT = struct.Struct('<Q')
+_HEAD = 0     # records consumed so far
+_TAIL = 64    # records produced so far
+_DATA = 128
+
+
+def backoff(idle_rounds):
+    # Yield for the first few empty/full polls, then sleep briefly
+    time.sleep(0 if idle_rounds < 64 else 0.0002)
+
+
+class ShmRing:
+    """SPSC ring of ``record`` (a ``struct.Struct``) values.
+
+    ``name=None`` creates a new block; pass an existing block's ``name`` to
+    attach to it from another process.
+    """
+
+    def __init__(self, record, capacity, name=None):
+        self.record = record
+        self.capacity = capacity
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=_DATA + capacity * record.size)
+            self.shm.buf[:_DATA] = bytes(_DATA)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self._buf = self.shm.buf
+
+    def __len__(self):
+        return _COUNT.unpack_from(self._buf, _TAIL)[0] - _COUNT.unpack_from(self._buf, _HEAD)[0]
+
+    def put_many(self, rows):
+        # Writes as many of rows (tuples of record values) as fit; returns how many
+        buf = self._buf
+        head = _COUNT.unpack_from(buf, _HEAD)[0]
+        tail = _COUNT.unpack_from(buf, _TAIL)[0]
+        n = min(self.capacity - (tail - head), len(rows))
+        if n <= 0:
+            return 0
+        pack_into = self.record.pack_into
+        size = self.record.size
+        cap = self.capacity
+        for i in range(n):
+            pack_into(buf, _DATA + ((tail + i) % cap) * size, *rows[i])
+        _COUNT.pack_into(buf, _TAIL, tail + n)
+        return n
+
+    def put_all(self, rows, idle=None):
+        # Blocks until every row is written; idle() (if given) runs while the ring is full
+        done = 0
+        rounds = 0
+        while done < len(rows):
+            n = self.put_many(rows[done:] if done else rows)
+            done += n
+            if n:
+                rounds = 0
+                continue
+            if idle is not None:
+                idle()
+            backoff(rounds)
+            rounds += 1
+
+    def put_packed(self, data, n):
+        # Copies as many of the n records packed back to back in data as fit, with
+        # one count update for all of them; returns how many
+        buf = self._buf
+        head = _COUNT.unpack_from(buf, _HEAD)[0]
+        tail = _COUNT.unpack_from(buf, _TAIL)[0]
+        n = min(self.capacity - (tail - head), n)
+        if n <= 0:
+            return 0
+        size = self.record.size
+        start = tail % self.capacity
+        first = min(n, self.capacity - start)  # records before the ring wraps
+        buf[_DATA + start * size:_DATA + (start + first) * size] = data[:first * size]
+        if first < n:
+            buf[_DATA:_DATA + (n - first) * size] = data[first * size:n * size]
+        _COUNT.pack_into(buf, _TAIL, tail + n)
+        return n
+
+    def put_all_packed(self, data, n, idle=None):
+        # put_packed that blocks until all n records are written, like put_all
+        view = memoryview(data)
+        size = self.record.size
+        done = 0
+        rounds = 0
+        while done < n:
+            k = self.put_packed(view[done * size:], n - done)
+            done += k
+            if k:
+                rounds = 0
+                continue
+            if idle is not None:
+                idle()
+            backoff(rounds)
+            rounds += 1
+
+    def get_many(self, limit=None):
+        # Takes up to limit records (all available when None) as tuples
+        buf = self._buf
+        head = _COUNT.unpack_from(buf, _HEAD)[0]
+        tail = _COUNT.unpack_from(buf, _TAIL)[0]
+        n = tail - head
+        if limit is not None:
+            n = min(n, limit)
+        if n <= 0:
+            return []
+        unpack_from = self.record.unpack_from
+        size = self.record.size
+        cap = self.capacity
+        rows = [unpack_from(buf, _DATA + ((head + i) % cap) * size) for i in range(n)]
+        _COUNT.pack_into(buf, _HEAD, head + n)
+        return rows
+
+    def close(self):
+        self._buf = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
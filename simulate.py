@@ -0,0 +1,208 @@
+"""Headless, seeded runs of the app's demo and SPACE-bot agents.
+
+Runs the order-flow models the app uses (``agents.py``) against a
+``MatchingEngine`` with no pygame and no pauses, as fast as the engine goes,
+and reports summary statistics per seed: trades, volume, VWAP, the LTP path
+and the distribution of the bid/ask spread after each step (prices in ticks).
+A demo step is one order, a bot step one buy/sell pair. The same seed always
+gives the same report apart from timings, with or without logs. Logs in the
+app's CSV format are written only with ``--log-dir`` (one directory per seed,
+verifiable with ``replay.py``); several seeds run in parallel processes.
+
+    python simulate.py --agent demo --steps 1000000 --seeds 1-8 --workers 4
+    python simulate.py --agent bot --steps 100000 --seeds 7 --log-dir runs --out sim.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from agents import bot_orders, demo_order
+from matching_engine import MatchingEngine, parse_band
+
+AGENTS = ('demo', 'bot')
+PATH_POINTS = 200  # LTP samples kept per run
+
+
+def _engine_steps(agent, engine, rng):
+    # Step function for a bare engine: runs one agent step and returns its trades
+    band = engine.band
+    limit = engine.place_limit_order
+    market = engine.place_market_order
+    next_tid = engine.next_taker_id
+
+    def demo():
+        side, price, qty = demo_order(rng, engine.ltp, band)
+        tid = next_tid()
+        if price is None:
+            return market(side, qty, False, tid)[0]
+        return limit(side, price, qty, False, tid)[0]
+
+    def bot():
+        (bp, bq), (sp, sq) = bot_orders(rng, band)
+        tid_b = next_tid()
+        tid_s = next_tid()
+        return limit('buy', bp, bq, False, tid_b)[0] + limit('sell', sp, sq, False, tid_s)[0]
+
+    return demo if agent == 'demo' else bot
+
+
+def _hist_percentile(hist, total, q):
+    # q-quantile of a {value: count} histogram holding `total` samples
+    if not total:
+        return None
+    rank = min(total - 1, int(q * total))
+    seen = 0
+    for value in sorted(hist):
+        seen += hist[value]
+        if seen > rank:
+            return value
+    return None
+
+
+def simulate(agent='demo', steps=100000, seed=1, band=None, log_dir=None, path_points=PATH_POINTS):
+    """Run `steps` steps of `agent` from an empty book; returns the summary dict.
+
+    With ``log_dir`` the steps go through an (unstarted) ``EngineWorker`` so
+    the run is logged exactly as the app logs it, under ``log_dir/seed_<seed>``.
+    """
+    if agent not in AGENTS:
+        raise ValueError(f"agent must be one of {', '.join(AGENTS)}, not {agent!r}")
+    worker = None
+    if log_dir:
+        from engine_worker import EngineWorker
+        run_dir = os.path.join(log_dir, f"seed_{seed}")
+        os.makedirs(run_dir, exist_ok=True)
+        worker = EngineWorker(os.path.join(run_dir, 'executed_trades.csv'), os.path.join(run_dir, 'events_log.csv'),
+                              history_in_memory=1000, measure_latency=False, band=band, seed=seed)
+        engine = worker.engine
+        step = worker.demo_step if agent == 'demo' else worker.bot_pair
+    else:
+        engine = MatchingEngine(band=band)
+        step = _engine_steps(agent, engine, random.Random(seed))
+    stats = engine.stats
+    every = max(1, steps // path_points)
+    path = [(0, engine.ltp)]
+    ltp_min = ltp_max = engine.ltp
+    spreads = Counter()
+    one_sided = trades = volume = notional = 0
+    t0 = time.perf_counter()
+    try:
+        for n in range(1, steps + 1):
+            tr = step()
+            if tr:
+                trades += len(tr)
+                for t in tr:
+                    volume += t[1]
+                    notional += t[0] * t[1]
+                ltp = engine.ltp
+                if ltp < ltp_min:
+                    ltp_min = ltp
+                elif ltp > ltp_max:
+                    ltp_max = ltp
+            bid, ask = stats.best_bid, stats.best_ask
+            if bid is None or ask is None:
+                one_sided += 1
+            else:
+                spreads[ask - bid] += 1
+            if n % every == 0:
+                path.append((n, engine.ltp))
+    finally:
+        if worker is not None:
+            worker.stop()
+    seconds = time.perf_counter() - t0
+    two_sided = steps - one_sided
+    return {
+        'agent': agent,
+        'seed': seed,
+        'steps': steps,
+        'orders': steps if agent == 'demo' else 2 * steps,
+        'trades': trades,
+        'volume': volume,
+        'vwap': notional / volume if volume else None,
+        'ltp': {'first': path[0][1], 'last': engine.ltp, 'min': ltp_min, 'max': ltp_max, 'path': path},
+        'spread': {
+            'hist': dict(sorted(spreads.items())),
+            'one_sided_steps': one_sided,
+            'mean': sum(s * c for s, c in spreads.items()) / two_sided if two_sided else None,
+            'p50': _hist_percentile(spreads, two_sided, 0.50),
+            'p99': _hist_percentile(spreads, two_sided, 0.99),
+        },
+        'resting_orders': len(engine.order_book['bids']) + len(engine.order_book['asks']),
+        'seconds': seconds,
+        'steps_per_sec': steps / seconds if seconds else 0.0,
+    }
+
+
+def run_seeds(agent, steps, seeds, workers=1, band=None, log_dir=None):
+    # Summaries in seed order; seeds run in `workers` processes when more than one
+    if workers <= 1 or len(seeds) <= 1:
+        return [simulate(agent, steps, seed, band, log_dir) for seed in seeds]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(simulate, agent, steps, seed, band, log_dir) for seed in seeds]
+        return [f.result() for f in futures]
+
+
+def parse_seeds(text):
+    # '1,4,10-12' -> [1, 4, 10, 11, 12]
+    seeds = []
+    for part in text.split(','):
+        if not part:
+            continue
+        lo, _, hi = part.partition('-')
+        seeds.extend(range(int(lo), int(hi or lo) + 1))
+    if not seeds:
+        raise ValueError("no seeds given")
+    return seeds
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--agent', choices=AGENTS, default='demo', help="demo: LTP +/- 2 mix; bot: uniform SPACE-bot pairs")
+    ap.add_argument('--steps', type=int, default=100000, help="steps per seed (a bot step is a buy/sell pair)")
+    ap.add_argument('--seeds', type=parse_seeds, default=[1], help="e.g. 1,2,3 or 1-8")
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="processes to run seeds in")
+    ap.add_argument('--band', type=parse_band, help="MIN:MAX[:TICK] price band (default 990:1010:1)")
+    ap.add_argument('--log-dir', help="also write each seed's CSV logs to LOG_DIR/seed_N")
+    ap.add_argument('--out', help="write the JSON report here (default: stdout)")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    results = run_seeds(args.agent, args.steps, args.seeds, args.workers, args.band, args.log_dir)
+    wall = time.perf_counter() - t0
+    for res in results:
+        sp = res['spread']
+        vwap = f"{res['vwap']:.2f}" if res['vwap'] is not None else '-'
+        print(f"{res['agent']:>5} seed={res['seed']:<5} {res['steps']:>11,} steps {res['steps_per_sec']:>9,.0f}/s "
+              f"{res['trades']:>11,} trades vol {res['volume']:>12,} vwap {vwap:>8} "
+              f"ltp {res['ltp']['first']}->{res['ltp']['last']} [{res['ltp']['min']}, {res['ltp']['max']}] "
+              f"spread p50={sp['p50']} p99={sp['p99']} one-sided={sp['one_sided_steps']:,}", file=sys.stderr)
+    total = sum(res['steps'] for res in results)
+    print(f"{len(results)} seed(s), {total:,} steps in {wall:.2f}s ({total / wall:,.0f} steps/s overall)", file=sys.stderr)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'agent': args.agent,
+            'steps': args.steps,
+            'workers': args.workers,
+            'band': repr(args.band) if args.band is not None else None,
+            'wall_seconds': wall,
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
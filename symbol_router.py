@@ -0,0 +1,400 @@
+"""Multi-symbol matching: one book per symbol, sharded across worker processes.
+
+``MultiSymbolEngine`` keeps a ``MatchingEngine`` (book, band, LTP, order and
+taker ID counters) per symbol in the current process. ``ShardedRouter`` hashes
+each symbol to one of N worker processes, each running its own
+``MultiSymbolEngine``; orders go to a worker and trades/results come back
+over a pair of shared-memory rings (``shm_ring``) as fixed-size records.
+
+A symbol always maps to the same worker and each ring is FIFO, so a symbol's
+orders are matched in submission order and its output records come back in
+the order they were produced. Every output record carries the symbol's own
+output sequence number, which makes the per-symbol order checkable after the
+shards' outputs are merged.
+
+Each symbol has its own ``PriceBand`` (``bands``, else the default ``band``).
+Limit prices are checked against it when they are submitted, and the
+workers build the symbol's book with it.
+
+    python symbol_router.py --symbols 200 --workers 4 --orders 200000 --check
+"""
+import argparse
+import csv
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+from multiprocessing import Process
+
+from event_journal import STATUS_CODES
+from history import LABEL_CODES
+from matching_engine import DEFAULT_BAND, MatchingEngine, parse_band
+from shm_ring import ShmRing, backoff
+
+EMPTY = -1
+BATCH = 1024  # records per ring write/read
+
+# Order record: seq, price, ref (OID to cancel), symbol id, qty, kind, side (0 buy/1 sell), is_player
+ORDER_RECORD = struct.Struct('<qqqiiBBB5x')
+_ORDER_SIZE = ORDER_RECORD.size
+_pack_order = ORDER_RECORD.pack_into
+KIND_LIMIT, KIND_MARKET, KIND_CANCEL, KIND_STOP = 1, 2, 3, 255
+
+# Output record: order seq, symbol output seq, price, order_id, taker_id, symbol id, qty, kind,
+# taker label, counterparty label, status. Trades use the trade-tuple fields; a result (one per
+# order) has the filled qty in qty, the resting/cancelled OID in order_id and a status code.
+OUT_RECORD = struct.Struct('<qqqqqiiBBBB4x')
+OUT_TRADE, OUT_RESULT = 1, 2
+
+_LABEL_IDX = {v: i for i, v in enumerate(LABEL_CODES)}
+_STATUS_IDX = {v: i for i, v in enumerate(STATUS_CODES)}
+
+
+def shard_for(symbol, shards):
+    # Stable across processes and runs (str hash() is salted per process)
+    return zlib.crc32(str(symbol).encode()) % shards
+
+
+class MultiSymbolEngine:
+    """One ``MatchingEngine`` per symbol, created on first use.
+
+    A symbol's book uses its band from ``bands`` (symbol -> ``PriceBand``),
+    or ``band`` (default ``DEFAULT_BAND``) for symbols not listed there.
+    """
+
+    def __init__(self, bands=None, band=None):
+        self.books = {}
+        self.bands = dict(bands or {})
+        self.default_band = band if band is not None else DEFAULT_BAND
+
+    def band(self, symbol):
+        return self.bands.get(symbol, self.default_band)
+
+    def book(self, symbol):
+        engine = self.books.get(symbol)
+        if engine is None:
+            engine = self.books[symbol] = MatchingEngine(band=self.band(symbol))
+        return engine
+
+    def place_limit_order(self, symbol, side, price, qty, is_player=False, taker_id=None):
+        return self.book(symbol).place_limit_order(side, price, qty, is_player, taker_id)
+
+    def place_market_order(self, symbol, side, qty, is_player=False, taker_id=None):
+        return self.book(symbol).place_market_order(side, qty, is_player, taker_id)
+
+    def cancel_order(self, symbol, oid):
+        return self.book(symbol).cancel_order(oid)
+
+
+def _fill_status(filled, qty):
+    return 'filled' if filled >= qty else ('partial' if filled > 0 else 'open')
+
+
+def _worker(order_ring_name, out_ring_name, capacity, bands, band):
+    # bands: symbol id -> PriceBand for the symbols with their own band
+    orders = ShmRing(ORDER_RECORD, capacity, order_ring_name)
+    out = ShmRing(OUT_RECORD, capacity, out_ring_name)
+    books = MultiSymbolEngine(bands, band)
+    out_seq = {}  # symbol id -> records emitted so far
+    idle = 0
+    try:
+        while True:
+            batch = orders.get_many(BATCH)
+            if not batch:
+                backoff(idle)
+                idle += 1
+                continue
+            idle = 0
+            rows = []
+            for seq, price, ref, sym, qty, kind, side_code, is_player in batch:
+                if kind == KIND_STOP:
+                    out.put_all(rows)
+                    return
+                engine = books.book(sym)
+                n = out_seq.get(sym, 0)
+                if kind == KIND_CANCEL:
+                    res = engine.cancel_order(ref)
+                    n += 1
+                    rows.append((seq, n, EMPTY, ref, EMPTY, sym, res[2] if res else 0, OUT_RESULT, 0, 0,
+                                 _STATUS_IDX['cancelled' if res else '']))
+                    out_seq[sym] = n
+                    continue
+                side = 'buy' if side_code == 0 else 'sell'
+                tid = engine.next_taker_id()
+                if kind == KIND_LIMIT:
+                    trades, _ = engine.place_limit_order(side, price, qty, bool(is_player), tid)
+                else:
+                    trades, _ = engine.place_market_order(side, qty, bool(is_player), tid)
+                filled = 0
+                for px, q, taker, cp, roid, t_id in trades:
+                    n += 1
+                    filled += q
+                    rows.append((seq, n, px, roid, t_id, sym, q, OUT_TRADE, _LABEL_IDX[taker], _LABEL_IDX[cp], 0))
+                # A limit remainder rests under the engine's latest OID
+                rested = kind == KIND_LIMIT and filled < qty
+                n += 1
+                rows.append((seq, n, price if kind == KIND_LIMIT else EMPTY,
+                             engine.order_id_counter - 1 if rested else EMPTY, tid, sym, filled, OUT_RESULT, 0, 0,
+                             _STATUS_IDX[_fill_status(filled, qty)]))
+                out_seq[sym] = n
+            out.put_all(rows)
+    finally:
+        orders.close()
+        out.close()
+
+
+class ShardedRouter:
+    """Routes orders for many symbols to ``workers`` matching processes.
+
+    Submissions are buffered per shard and written to the shard's ring in
+    batches; ``drain`` returns the output records collected so far (with
+    ``wait=True`` it first waits for every submitted order's result, and
+    raises RuntimeError if a worker exits before answering them all). Each
+    record is ``(kind, symbol, symbol_seq, order_seq, payload)`` where kind
+    is 'trade' (payload: the engine's trade tuple) or 'result' (payload:
+    ``(status, filled_qty, order_id, taker_id)``).
+
+    ``bands`` maps symbols to their ``PriceBand``; other symbols use ``band``
+    (default ``DEFAULT_BAND``). A limit price outside its symbol's band
+    raises ValueError from ``submit_limit``, before it reaches a worker.
+    """
+
+    def __init__(self, workers=None, capacity=1 << 16, bands=None, band=None):
+        workers = workers or os.cpu_count() or 1
+        self._symbols = []     # symbol id -> symbol
+        self._symbol_ids = {}
+        self._shards = []      # symbol id -> worker index
+        self._bands = []       # symbol id -> PriceBand
+        self.default_band = band if band is not None else DEFAULT_BAND
+        self._order_rings = [ShmRing(ORDER_RECORD, capacity) for _ in range(workers)]
+        self._out_rings = [ShmRing(OUT_RECORD, capacity) for _ in range(workers)]
+        # Symbols with their own band get their IDs now, so the workers know them by ID from the start
+        for symbol, symbol_band in (bands or {}).items():
+            self._symbol_id(symbol, symbol_band)
+        worker_bands = [{} for _ in range(workers)]
+        for sym, symbol_band in enumerate(self._bands):
+            worker_bands[self._shards[sym]][sym] = symbol_band
+        # Orders are packed straight into a per-shard batch buffer and copied to the ring a batch at a time
+        self._pending = [bytearray(BATCH * ORDER_RECORD.size) for _ in range(workers)]
+        self._pending_n = [0] * workers
+        self._submitted = [0] * workers
+        self._results = [0] * workers
+        self._records = []
+        self._seq = 0
+        self._procs = [Process(target=_worker, args=(o.name, r.name, capacity, b, self.default_band), daemon=True)
+                       for o, r, b in zip(self._order_rings, self._out_rings, worker_bands)]
+        for p in self._procs:
+            p.start()
+
+    @property
+    def workers(self):
+        return len(self._procs)
+
+    def shard(self, symbol):
+        return shard_for(symbol, len(self._order_rings))
+
+    def _symbol_id(self, symbol, band=None):
+        sym = self._symbol_ids.get(symbol)
+        if sym is None:
+            sym = self._symbol_ids[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+            self._shards.append(self.shard(symbol))
+            self._bands.append(band if band is not None else self.default_band)
+        return sym
+
+    def band(self, symbol):
+        sym = self._symbol_ids.get(symbol)
+        return self.default_band if sym is None else self._bands[sym]
+
+    def _submit(self, symbol, kind, side, price, qty, is_player, ref):
+        sym = self._symbol_id(symbol)
+        self._seq += 1
+        w = self._shards[sym]
+        n = self._pending_n[w]
+        _pack_order(self._pending[w], n * _ORDER_SIZE, self._seq, price, ref, sym, qty, kind,
+                    0 if side == 'buy' else 1, int(is_player))
+        self._pending_n[w] = n + 1
+        self._submitted[w] += 1
+        if n + 1 >= BATCH:
+            self._publish(w)
+        return self._seq
+
+    def submit_limit(self, symbol, side, price, qty, is_player=False):
+        # Returns the order's sequence number (the order_seq of its output records)
+        self.band(symbol).check(price)
+        return self._submit(symbol, KIND_LIMIT, side, price, qty, is_player, EMPTY)
+
+    def submit_market(self, symbol, side, qty, is_player=False):
+        return self._submit(symbol, KIND_MARKET, side, EMPTY, qty, is_player, EMPTY)
+
+    def cancel(self, symbol, oid):
+        return self._submit(symbol, KIND_CANCEL, 'buy', EMPTY, 0, False, oid)
+
+    def _publish(self, w):
+        n = self._pending_n[w]
+        if n:
+            # Collect output while the order ring is full so the worker never blocks on us
+            self._order_rings[w].put_all_packed(self._pending[w], n, idle=self._collect)
+            self._pending_n[w] = 0
+
+    def flush(self):
+        for w in range(len(self._pending)):
+            self._publish(w)
+
+    def _collect(self):
+        symbols = self._symbols
+        records = self._records
+        for w, ring in enumerate(self._out_rings):
+            for seq, n, price, oid, tid, sym, qty, kind, taker, cp, status in ring.get_many():
+                if kind == OUT_TRADE:
+                    records.append(('trade', symbols[sym], n, seq,
+                                    (price, qty, LABEL_CODES[taker], LABEL_CODES[cp], oid, tid)))
+                else:
+                    self._results[w] += 1
+                    records.append(('result', symbols[sym], n, seq,
+                                    (STATUS_CODES[status], qty, None if oid == EMPTY else oid, None if tid == EMPTY else tid)))
+
+    def drain(self, wait=False):
+        self.flush()
+        self._collect()
+        rounds = 0
+        while wait and self._results != self._submitted:
+            for w, p in enumerate(self._procs):
+                if self._results[w] != self._submitted[w] and not p.is_alive():
+                    # Pick up anything it wrote before exiting, then give up on the rest
+                    self._collect()
+                    if self._results[w] != self._submitted[w]:
+                        raise RuntimeError(f"worker {w} exited (code {p.exitcode}) with "
+                                           f"{self._submitted[w] - self._results[w]} orders unanswered")
+            backoff(rounds)
+            rounds += 1
+            self._collect()
+        records, self._records = self._records, []
+        return records
+
+    def close(self):
+        self.flush()
+        for ring in self._order_rings:
+            ring.put_all([(0, 0, 0, 0, 0, KIND_STOP, 0, 0)], idle=self._collect)
+        for p in self._procs:
+            p.join()
+        for ring in self._order_rings + self._out_rings:
+            ring.close()
+            ring.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def synthetic_orders(symbols, n, seed, band=DEFAULT_BAND):
+    # (symbol, kind, side, price, qty): SPACE-bot style limits over the band plus 30% market orders
+    rng = random.Random(seed)
+    names = [f"SYM{i:04d}" for i in range(symbols)]
+    for _ in range(n):
+        sym = names[rng.randrange(symbols)]
+        side = 'buy' if rng.random() < 0.5 else 'sell'
+        qty = rng.randint(3, 12)
+        if rng.random() < 0.7:
+            yield sym, 'limit', side, rng.randint(band.lo, band.hi), qty
+        else:
+            yield sym, 'market', side, None, qty
+
+
+def run_in_process(orders, band=None):
+    # Reference run on one MultiSymbolEngine; returns {symbol: [trade tuples]}
+    books = MultiSymbolEngine(band=band)
+    trades = {}
+    for sym, kind, side, price, qty in orders:
+        engine = books.book(sym)
+        tid = engine.next_taker_id()
+        if kind == 'limit':
+            tr, _ = engine.place_limit_order(side, price, qty, False, tid)
+        else:
+            tr, _ = engine.place_market_order(side, qty, False, tid)
+        trades.setdefault(sym, []).extend(tr)
+    return trades
+
+
+def write_merged_logs(records, trades_path=None, events_path=None):
+    # Merged logs keep each symbol's records in symbol_seq order
+    if trades_path:
+        with open(trades_path, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(['symbol', 'symbol_seq', 'order_seq', 'price', 'qty', 'taker_label',
+                        'counterparty_label', 'resting_order_id', 'taker_id'])
+            for kind, sym, n, seq, payload in records:
+                if kind == 'trade':
+                    w.writerow([sym, n, seq, *payload])
+    if events_path:
+        with open(events_path, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(['symbol', 'symbol_seq', 'order_seq', 'event', 'status', 'filled_qty', 'order_id', 'taker_id'])
+            for kind, sym, n, seq, payload in records:
+                if kind == 'result':
+                    status, filled, oid, tid = payload
+                    w.writerow([sym, n, seq, 'result', status, filled, '' if oid is None else oid, '' if tid is None else tid])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--symbols', type=int, default=200)
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="matching processes (0: match in this process)")
+    ap.add_argument('--orders', type=int, default=200000)
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--band', type=parse_band, default=DEFAULT_BAND, help="MIN:MAX[:TICK] price band of every symbol (default 990:1010:1)")
+    ap.add_argument('--check', action='store_true', help="compare per-symbol trades with an in-process run")
+    ap.add_argument('--trades-csv', help="write the merged trade log here")
+    ap.add_argument('--events-csv', help="write the merged result events here")
+    args = ap.parse_args(argv)
+
+    orders = list(synthetic_orders(args.symbols, args.orders, args.seed, args.band))
+    if args.workers == 0:
+        t0 = time.perf_counter()
+        trades = run_in_process(orders, args.band)
+        secs = time.perf_counter() - t0
+        n_trades = sum(len(t) for t in trades.values())
+        print(f"in-process: {len(orders) / secs:,.0f} orders/s, {n_trades / secs:,.0f} trades/s")
+        return 0
+
+    with ShardedRouter(args.workers, band=args.band) as router:
+        t0 = time.perf_counter()
+        records = []
+        for i, (sym, kind, side, price, qty) in enumerate(orders, 1):
+            if kind == 'limit':
+                router.submit_limit(sym, side, price, qty)
+            else:
+                router.submit_market(sym, side, qty)
+            if i % (16 * BATCH) == 0:
+                records.extend(router.drain())
+        records.extend(router.drain(wait=True))
+        secs = time.perf_counter() - t0
+    n_trades = sum(1 for r in records if r[0] == 'trade')
+    print(f"{args.workers} workers on {os.cpu_count() or 1} CPUs: {len(orders) / secs:,.0f} orders/s, "
+          f"{n_trades / secs:,.0f} trades/s")
+    write_merged_logs(records, args.trades_csv, args.events_csv)
+
+    if args.check:
+        last = {}
+        for _kind, sym, n, _seq, _payload in records:
+            if n != last.get(sym, 0) + 1:
+                print(f"ORDERING: {sym} record {n} after {last.get(sym, 0)}")
+                return 1
+            last[sym] = n
+        merged = {}
+        for kind, sym, _n, _seq, payload in records:
+            if kind == 'trade':
+                merged.setdefault(sym, []).append(payload)
+        if merged != run_in_process(orders, args.band):
+            print("MISMATCH: sharded trades differ from the in-process run")
+            return 1
+        print("per-symbol trades match the in-process run")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
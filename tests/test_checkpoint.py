@@ -0,0 +1,159 @@
+"""Checkpoint round trips: encode/decode, the background writer, and a
+worker that restarts from a checkpoint plus the events logged after it."""
+import random
+
+import pytest
+
+import checkpoint
+from engine_worker import EngineWorker
+from matching_engine import MatchingEngine, PriceBand
+from replay import book_snapshot, read_events, replay, verify_trades
+
+
+def busy_engine(seed, band=None):
+    # An engine with a few thousand seeded orders through it, some resting for the player
+    rng = random.Random(seed)
+    engine = MatchingEngine(band=band)
+    lo, hi = engine.band.lo, engine.band.hi
+    for _ in range(3000):
+        side = rng.choice(('buy', 'sell'))
+        if rng.random() < 0.8:
+            engine.place_limit_order(side, rng.randint(lo, hi), rng.randint(1, 12), rng.random() < 0.3,
+                                     engine.next_taker_id())
+        else:
+            engine.place_market_order(side, rng.randint(1, 12), False, engine.next_taker_id())
+    return engine
+
+
+def engine_state(engine):
+    return (list(engine.order_book['bids']), list(engine.order_book['asks']), engine.ltp,
+            engine.order_id_counter, engine.taker_id_counter, engine.stats.player_open_qty)
+
+
+@pytest.mark.parametrize('band', [None, PriceBand('0.05', '5.00', tick='0.05')])
+def test_dumps_loads_restore_round_trip(band):
+    engine = busy_engine(1, band)
+    player = (5, 2, 1, 2, 20, 60)
+    ckpt = checkpoint.loads(checkpoint.dumps(engine, last_event=(123, 456_789), clock_seq=130, player=player))
+    assert (ckpt.seq, ckpt.ts_ns, ckpt.clock_seq, ckpt.player) == (123, 456_789, 130, player)
+    restored = MatchingEngine(band=band)
+    checkpoint.restore(restored, ckpt)
+    assert engine_state(restored) == engine_state(engine)
+
+
+def test_restore_of_a_large_book_keeps_cancels_and_fills_in_order():
+    # A restored book of this size is rested in bulk; its orders must still
+    # cancel, amend and fill in the original price-time order
+    engine = busy_engine(5)
+    restored = MatchingEngine()
+    checkpoint.restore(restored, checkpoint.loads(checkpoint.dumps(engine)))
+    rng = random.Random(5)
+    for oid in rng.sample(range(1, engine.order_id_counter), 200):
+        assert restored.cancel_order(oid) == engine.cancel_order(oid)
+    for oid in rng.sample(range(1, engine.order_id_counter), 50):
+        assert restored.amend_order(oid, 3) == engine.amend_order(oid, 3)
+    for side in ('buy', 'sell'):
+        assert restored.place_market_order(side, 400, False, 1) == engine.place_market_order(side, 400, False, 1)
+    assert engine_state(restored) == engine_state(engine)
+
+
+def test_loads_rejects_damaged_or_foreign_checkpoints():
+    engine = busy_engine(2)
+    data = checkpoint.dumps(engine)
+    with pytest.raises(ValueError):
+        checkpoint.loads(data[:-1])
+    damaged = bytearray(data)
+    damaged[-1] ^= 1
+    with pytest.raises(ValueError):
+        checkpoint.loads(bytes(damaged))
+    with pytest.raises(ValueError):
+        checkpoint.restore(MatchingEngine(band=PriceBand(1, 100)), checkpoint.loads(data))
+
+
+def test_writer_writes_in_the_background_and_reports_failures(tmp_path, capsys):
+    engine = busy_engine(3)
+    writer = checkpoint.CheckpointWriter(str(tmp_path / 'book.ckpt'))
+    assert writer.start(engine, last_event=(9, 10))
+    writer.wait()
+    assert (writer.written, writer.failed, writer.last_event) == (1, 0, (9, 10))
+    restored = MatchingEngine()
+    checkpoint.restore(restored, checkpoint.load(str(tmp_path / 'book.ckpt')))
+    assert engine_state(restored) == engine_state(engine)
+
+    broken = checkpoint.CheckpointWriter(str(tmp_path / 'missing' / 'book.ckpt'))
+    assert broken.start(engine)
+    broken.wait()
+    assert not broken.save(engine)
+    assert (broken.written, broken.failed, broken.last_event) == (0, 2, None)
+    assert 'failed' in capsys.readouterr().err
+
+
+def make_worker(tmp_path, use_journal, seed):
+    return EngineWorker(str(tmp_path / 'executed_trades.csv'), str(tmp_path / 'events_log.csv'),
+                        journal_path=str(tmp_path / 'events_log.bin') if use_journal else None,
+                        measure_latency=False, checkpoint_path=str(tmp_path / 'book.ckpt'), seed=seed)
+
+
+def activity(worker, rng, steps):
+    # Bot pairs plus player limit/market orders, amends and cancels, as the UI would send them
+    book = worker.engine.order_book
+    for _ in range(steps):
+        worker.bot_pair()
+        r = rng.random()
+        if r < 0.2:
+            worker._player_order('LIMIT' if r < 0.14 else 'MARKET', rng.choice(('Buy', 'Sell')),
+                                 rng.randint(990, 1010), rng.randint(1, 30))
+        elif r < 0.23:
+            mine = [(oid, 'You', 'Bid', q, p) for p, q, pl, oid in book['bids'] if pl]
+            if mine:
+                worker._amend_resting(rng.choice(mine), rng.randint(1, 20), rng.randint(990, 1010))
+        elif r < 0.26 and book['asks']:
+            worker._cancel_resting(rng.choice([oid for _p, _q, _pl, oid in book['asks']]))
+
+
+def worker_state(worker):
+    engine = worker.engine
+    return (book_snapshot(engine), engine.order_id_counter, engine.taker_id_counter,
+            worker._checkpoint_state()['player'])
+
+
+@pytest.mark.parametrize('use_journal', [True, False], ids=['journal', 'csv'])
+def test_restart_from_checkpoint_and_log_tail(tmp_path, use_journal):
+    rng = random.Random(4)
+    first = make_worker(tmp_path, use_journal, seed=1)
+    activity(first, rng, 1500)
+    first._checkpoint()
+    first.checkpoints.wait()
+    activity(first, rng, 800)
+    # Crash: the logs reach disk, but there is no stop() and so no final checkpoint
+    first.log_sink.flush()
+    if first.journal is not None:
+        first.journal.flush()
+    crashed = worker_state(first)
+    recent = [(ev['seq'], ev['event'], ev['price'], ev['qty']) for ev in first.events_log.newest(None, 0, 500)]
+    first.log_sink.close()
+    if first.journal is not None:
+        first.journal.close()
+
+    second = make_worker(tmp_path, use_journal, seed=2)
+    assert second.restored_events > 0
+    assert worker_state(second) == crashed
+    assert second.clock.seq >= first.clock.seq
+    assert [(ev['seq'], ev['event'], ev['price'], ev['qty'])
+            for ev in second.events_log.newest(None, 0, 500)] == recent
+    assert second.bars.candles()
+    activity(second, rng, 500)
+    final = worker_state(second)
+    second.stop()
+
+    # A clean stop leaves a checkpoint with nothing after it
+    third = make_worker(tmp_path, use_journal, seed=3)
+    assert third.restored_events == 0
+    assert worker_state(third) == final
+    third.stop()
+
+    # The whole log still replays to the same book and trades
+    for name in ['events_log.csv'] + (['events_log.bin'] if use_journal else []):
+        res = replay(read_events(str(tmp_path / name)))
+        assert book_snapshot(res['engine']) == final[0]
+        assert verify_trades(res['trades'], str(tmp_path / 'executed_trades.csv')) is None
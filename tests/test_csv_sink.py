@@ -0,0 +1,60 @@
+import csv
+
+import pytest
+
+from csv_sink import TRADES_HEADER, CsvLogSink
+from timestamps import iso_to_ns
+
+HEADER = ['timestamp_iso', 'seq', 'price']
+TS = 1_700_000_000_123_456_000
+
+
+def read_rows(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_flush_writes_queued_rows_and_close_writes_the_rest(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    sink = CsvLogSink({'log': (path, HEADER)}, flush_rows=1000, flush_interval=60)
+    sink.put('log', [[TS, 1, 1000], [TS + 1000, 2, 1001]])
+    sink.flush()
+    rows = read_rows(path)
+    assert rows[0] == HEADER
+    assert [r[1:] for r in rows[1:]] == [['1', '1000'], ['2', '1001']]
+    assert iso_to_ns(rows[1][0]) == TS
+    sink.put('log', [[TS, 3, 1002]])
+    sink.close()
+    assert read_rows(path)[-1][1:] == ['3', '1002']
+    with pytest.raises(ValueError):
+        sink.put('log', [[TS, 4, 1003]])
+
+
+def test_a_log_with_another_header_is_moved_aside(tmp_path):
+    path = tmp_path / 'executed_trades.csv'
+    path.write_text('timestamp_iso,price,qty\n2025-01-01T00:00:00.000000+05:30,1000,5\n')
+    sink = CsvLogSink({'trades': (str(path), TRADES_HEADER)})
+    sink.close()
+    assert read_rows(path) == [TRADES_HEADER]
+    assert read_rows(tmp_path / 'executed_trades.old.csv')[1] == ['2025-01-01T00:00:00.000000+05:30', '1000', '5']
+
+    # A log with the current header is appended to
+    sink = CsvLogSink({'trades': (str(path), TRADES_HEADER)})
+    sink.put('trades', [[TS, 1, 1000, 5, 'Bot', 'Bot', 'Bid', 7, 3]])
+    sink.close()
+    assert len(read_rows(path)) == 2
+
+
+def test_a_bad_row_is_reported_without_stopping_the_writer(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    sink = CsvLogSink({'log': (path, HEADER)})
+    with pytest.raises(ValueError):
+        sink.put('other', [[TS, 1, 1000]])
+    sink.put('log', [['not a time', 1, 1000]])
+    with pytest.raises(ValueError):
+        sink.flush()
+    # The thread is still serving: later rows are written and close returns
+    sink.put('log', [[TS, 2, 1001]])
+    sink.flush()
+    sink.close()
+    assert [r[1:] for r in read_rows(path)[1:]] == [['2', '1001']]
@@ -0,0 +1,15 @@
+from engine_worker import EngineWorker
+
+
+def test_amend_fills_log_a_blank_taker_id(tmp_path):
+    worker = EngineWorker(str(tmp_path / 'executed_trades.csv'), str(tmp_path / 'events_log.csv'),
+                          measure_latency=False)
+    ask = worker.engine.add_resting('sell', 1002, 4)
+    worker._player_order('LIMIT', 'Buy', 998, 10)
+    bid = worker.engine.order_id_counter - 1
+    worker._amend_resting((bid, 'You', 'Bid', 10, 998), 10, 1002)
+    trade = worker.events_log.newest('trade', 0, 1)[0]
+    assert (trade['order_id'], trade['qty'], trade['taker_id']) == (ask, 4, '')
+    worker.stop()
+    with open(tmp_path / 'events_log.csv') as f:
+        assert 'None' not in f.read()
@@ -0,0 +1,34 @@
+import pytest
+
+from event_journal import NOTE_BYTES, RECORD, EventJournal, JournalReader, pack_event, record_to_event
+
+
+def event(note, seq=1):
+    return {'ts_ns': 1_700_000_000_123_456_789, 'seq': seq, 'event': 'amend', 'actor': 'You', 'taker_id': '',
+            'order_id': 7, 'side': 'Buy', 'order_type': 'LIMIT', 'price': 1001, 'qty': 5, 'filled_qty': 0,
+            'status': 'amended', 'note': note}
+
+
+@pytest.mark.parametrize('note, kept', [
+    ('was 5@1000', 'was 5@1000'),
+    ('', ''),
+    ('a' * 15 + 'é', 'a' * 15),  # 'é' would straddle the 16-byte limit
+    ('é' * 9, 'é' * 8),
+    ('€' * 6, '€' * 5),
+])
+def test_note_is_cut_on_a_character_boundary(note, kept):
+    ev = record_to_event(RECORD.unpack(pack_event(event(note))))
+    assert ev['note'] == kept
+    assert len(ev['note'].encode()) <= NOTE_BYTES
+    assert ev == event(kept)
+
+
+def test_journal_round_trip(tmp_path):
+    path = str(tmp_path / 'events.bin')
+    journal = EventJournal(path)
+    events = [event(f'was {i}@{1000 + i}', seq=i) for i in range(1, 50)]
+    for ev in events:
+        journal.append(ev)
+    journal.close()
+    with JournalReader(path) as reader:
+        assert list(reader.iter_events()) == events
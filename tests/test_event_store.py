@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from event_journal import EVENT_CODES
+from event_store import EVENT_FIELDS, EventStore
+
+
+def random_events(rng, n):
+    for seq in range(1, n + 1):
+        yield {'ts_ns': 1_700_000_000_000_000_000 + seq * 1000, 'seq': seq, 'event': rng.choice(EVENT_CODES[1:]),
+               'actor': rng.choice(('You', 'Bot')), 'taker_id': rng.choice(('', seq)), 'order_id': rng.randint(1, 500),
+               'side': rng.choice(('Buy', 'Sell')), 'order_type': rng.choice(('LIMIT', 'MARKET')),
+               'price': rng.randint(990, 1010), 'qty': rng.randint(1, 30), 'filled_qty': rng.randint(0, 30),
+               'status': rng.choice(('open', 'filled', 'cancelled')), 'note': rng.choice(('', 'demo', 'was 5@1000'))}
+
+
+def fields(rows):
+    return [tuple(row[k] for k in EVENT_FIELDS) for row in rows]
+
+
+@pytest.mark.parametrize('cap', [None, 40])
+def test_per_type_counts_and_windows_match_a_plain_list(cap):
+    rng = random.Random(9)
+    store, events = EventStore(cap), []
+    for ev in random_events(rng, 600):
+        store.append(ev)
+        events.append(ev)
+    assert len(store) == store.count() == 600
+    assert fields(store) == fields(events)
+    for kind in EVENT_CODES[1:] + ('missing',):
+        of_kind = [ev for ev in reversed(events) if ev['event'] == kind]
+        assert store.count(kind) == len(of_kind)
+        assert fields(store.newest(kind)) == fields(of_kind)
+        for skip, limit in ((0, 10), (25, 7), (len(of_kind) - 3, 10), (len(of_kind) + 5, 10)):
+            assert fields(store.newest(kind, skip, limit)) == fields(of_kind[skip:skip + limit])
+    assert fields(store.newest(None, 590, 20)) == fields(events[9::-1])
+    store.close()
+
+
+def test_records_read_like_event_dicts():
+    store = EventStore()
+    ev = next(random_events(random.Random(1), 1))
+    store.append(ev)
+    rec = store.newest()[0]
+    assert rec['price'] == rec.get('price') == ev['price']
+    assert rec.get('unknown', 'x') == 'x'
@@ -0,0 +1,60 @@
+import asyncio
+
+from gateway import Gateway
+from replay import book_snapshot, read_events, replay, verify_trades
+
+
+async def exchange(gateway, clients, steps):
+    # steps: (client, line, {client: number of response lines}) sent one after another;
+    # returns each client's response lines, split into words
+    server = await asyncio.start_server(gateway.handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    conns = [await asyncio.open_connection('127.0.0.1', port) for _ in range(clients)]
+    replies = [[] for _ in conns]
+    for i, line, expect in steps:
+        writer = conns[i][1]
+        writer.write(line.encode() + b'\n')
+        await writer.drain()
+        for j, n in sorted(expect.items()):
+            for _ in range(n):
+                replies[j].append((await asyncio.wait_for(conns[j][0].readline(), 5)).decode().split())
+    for _reader, writer in conns:
+        writer.close()
+    server.close()
+    await server.wait_closed()
+    return replies
+
+
+def test_orders_fills_cancels_and_rejects(tmp_path):
+    gateway = Gateway(log_dir=str(tmp_path))
+    # Client 0 makes, client 1 takes
+    steps = [(0, 'NEW a1 SELL 1001 5', {0: 1}),
+             (1, 'MKT b1 BUY 3', {1: 2, 0: 1}),
+             (0, 'NEW a2 BUY 999 4', {0: 1}),
+             (1, 'CXL b2 1', {1: 1}),
+             (0, 'CXL a3 1', {0: 1}),
+             (0, 'CXL a4 1', {0: 1}),
+             (1, 'NEW b3 SELL 998 10', {1: 2, 0: 1}),
+             (1, 'NEW b4 HOLD 1000 1', {1: 1}),
+             (1, 'NEW b5 BUY 2000 1', {1: 1}),
+             (1, 'MKT b6 SELL 0', {1: 1}),
+             (1, 'PING', {1: 1})]
+    a, b = asyncio.run(exchange(gateway, 2, steps))
+    gateway.close()
+    assert a == [['ACK', 'a1', '1', 'open', '0', '1'],
+                 ['MFILL', 'a1', '1', '1001', '3'],
+                 ['ACK', 'a2', '3', 'open', '0', '2'],
+                 ['CXLD', 'a3', '1', '2'],
+                 ['REJ', 'a4', 'unknown', 'order', '1'],
+                 ['MFILL', 'a2', '2', '999', '4']]
+    assert b[:3] == [['FILL', 'b1', '1001', '3', '1'], ['ACK', 'b1', '2', 'filled', '3', '-'],
+                     ['REJ', 'b2', 'unknown', 'order', '1']]
+    assert b[3:5] == [['FILL', 'b3', '999', '4', '2'], ['ACK', 'b3', '4', 'partial', '4', '3']]
+    assert [r[:2] for r in b[5:]] == [['REJ', 'b4'], ['REJ', 'b5'], ['REJ', 'b6'], ['REJ', '-']]
+    assert b[5][2:] == ['bad', 'side'] and b[7][2:] == ['qty', 'must', 'be', 'positive']
+
+    # The logs replay to the same book and trades
+    res = replay(read_events(str(tmp_path / 'events_log.csv')))
+    assert book_snapshot(res['engine']) == book_snapshot(gateway.engine)
+    assert verify_trades(res['trades'], str(tmp_path / 'executed_trades.csv')) is None
+    assert (gateway.orders, gateway.trades) == (4, 2)
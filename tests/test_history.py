@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from history import fifo_history, trade_history
+
+
+def random_trades(rng, n):
+    for i in range(n):
+        yield (rng.randint(990, 1010), rng.randint(1, 30), rng.choice(('You', 'Bot')),
+               rng.choice(('Bot', 'Seller', 'Buyer')), rng.randint(1, 10**6), rng.choice((None, i + 1)))
+
+
+def random_fifo(rng, n):
+    for i in range(n):
+        yield (rng.choice((None, i + 1)), rng.choice(('Ask', 'Bid')), rng.randint(990, 1010),
+               rng.randint(1, 30), rng.choice(('You', 'Bot')), rng.choice((None, rng.randint(1, 10**6))))
+
+
+@pytest.mark.parametrize('make, rows', [(trade_history, random_trades), (fifo_history, random_fifo)])
+def test_spilled_rows_read_back_unchanged(make, rows):
+    expected = list(rows(random.Random(10), 1000))
+    history = make(cap=50)
+    history.extend(expected[:400])
+    for row in expected[400:]:
+        history.append(row)
+    assert len(history) == 1000
+    # Memory holds between cap and cap + cap/4 rows; the rest is on disk
+    assert 1000 - 50 - 50 // 4 <= history.spilled <= 1000 - 50
+    assert list(history) == expected
+    assert [history[i] for i in (0, 1, 500, -1, -50, -51)] == [expected[i] for i in (0, 1, 500, -1, -50, -51)]
+    assert history.newest(0, 5) == expected[:-6:-1]
+    assert history.newest(990, 20) == expected[9::-1]
+    with pytest.raises(IndexError):
+        history[1000]
+    history.close()
+
+
+def test_no_cap_keeps_everything_in_memory():
+    history = trade_history()
+    history.extend(random_trades(random.Random(11), 500))
+    assert history.spilled == 0 and len(history) == 500
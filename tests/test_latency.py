@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from engine_worker import EngineWorker
+from latency import LatencyHistogram, LatencyRecorder, bucket_bounds, bucket_index
+
+
+@pytest.mark.parametrize('ns', [0, 1, 7, 8, 9, 15, 16, 17, 1000, 123_456, 10**9 + 7])
+def test_every_value_lands_in_a_bucket_that_holds_it(ns):
+    low, high = bucket_bounds(bucket_index(ns))
+    assert low <= ns <= high
+    # Within 12.5% of the value above the exact range
+    assert high - low <= max(low // 8, 0)
+
+
+def test_buckets_are_contiguous():
+    for idx in range(200):
+        assert bucket_bounds(idx + 1)[0] == bucket_bounds(idx)[1] + 1
+
+
+def test_histogram_percentiles_and_merge():
+    hist = LatencyHistogram()
+    for ns in range(1, 101):
+        hist.record(ns)
+    assert (hist.count, hist.min, hist.max) == (100, 1, 100)
+    low, high = bucket_bounds(bucket_index(50))
+    assert low <= hist.percentile(0.50) <= high
+    assert hist.percentile(1.0) == 100
+    other = LatencyHistogram()
+    other.record(5000)
+    hist.merge(other)
+    assert (hist.count, hist.max, hist.percentile(1.0)) == (101, 5000, 5000)
+    assert LatencyHistogram().percentile(0.5) is None
+
+
+def test_recorder_keys_by_levels_crossed_and_resets(tmp_path):
+    rec = LatencyRecorder(dump_path=str(tmp_path / 'lat.jsonl'))
+    rec.record('LIMIT', 'Buy', 0, 100)
+    rec.stop(rec.start(), 'MARKET', 'Sell', [(1000, 1), (1000, 2), (999, 1), (998, 1), (997, 1)])
+    snap = rec.snapshot()
+    assert set(snap) == {'all', 'LIMIT/Buy/0', 'MARKET/Sell/3+'}
+    assert snap['all']['count'] == 2
+    rec.dump()
+    with open(tmp_path / 'lat.jsonl') as f:
+        dumped = json.loads(f.read())['histograms']
+    assert dumped['LIMIT/Buy/0']['buckets'] == [[*bucket_bounds(bucket_index(100)), 1]]
+    assert rec.snapshot(reset=True)['all']['count'] == 2
+    assert rec.snapshot() == {'all': LatencyHistogram().summary()}
+
+
+def test_disabled_recorder_records_nothing():
+    rec = LatencyRecorder(enabled=False)
+    rec.stop(rec.start(), 'LIMIT', 'Buy')
+    assert rec.overall.count == 0
+
+
+def test_bot_pair_times_each_order_on_its_own(tmp_path):
+    worker = EngineWorker(str(tmp_path / 'executed_trades.csv'), str(tmp_path / 'events_log.csv'))
+    calls = []
+    place = worker.engine.place_limit_order
+    stop = worker.latency.stop
+    worker.latency.start = lambda: calls.append('start') or 1
+    worker._log_submit = lambda *a, **k: calls.append('submit')
+    worker.engine.place_limit_order = lambda side, *a: calls.append(side) or place(side, *a)
+    worker.latency.stop = lambda t0, otype, side, tr: calls.append('stop ' + side) or stop(t0, otype, side, tr)
+    worker.bot_pair()
+    assert calls == ['start', 'submit', 'buy', 'stop Buy', 'start', 'submit', 'sell', 'stop Sell']
+    worker.stop()
@@ -0,0 +1,60 @@
+import random
+
+from market_data import BookMirror, MarketDataPublisher
+from matching_engine import MatchingEngine
+from test_matching_engine import apply, random_flow
+
+
+def depth(engine, name):
+    return {p: (q, c) for p, q, c in engine.order_book[name].depth()}
+
+
+def assert_mirrors(book, engine):
+    assert not book.stale
+    assert (book.bids, book.asks, book.ltp) == (depth(engine, 'bids'), depth(engine, 'asks'), engine.ltp)
+
+
+def test_mirror_follows_every_change():
+    engine = MatchingEngine()
+    feed = MarketDataPublisher(engine, snapshot_interval=0)
+    book, seqs = BookMirror(), []
+    feed.subscribe(book)
+    feed.subscribe(lambda msg: seqs.append(msg['seq']), snapshot=False)
+    rng = random.Random(12)
+    for i, op in enumerate(random_flow(rng, 2000)):
+        apply(engine, op)
+        if i % 500 == 499:
+            engine.submit_batch([('buy', None, 150), ('sell', 1000, 40), ('sell', None, 30)])
+        assert_mirrors(book, engine)
+    engine.reset()
+    assert_mirrors(book, engine)
+    assert book.bids == book.asks == {} and book.gaps == 0
+    # Deltas and trades are numbered without gaps; snapshots repeat the last number
+    assert all(b - a in (0, 1) for a, b in zip(seqs, seqs[1:]))
+
+
+def test_mirror_recovers_from_lost_messages_at_the_next_snapshot():
+    engine = MatchingEngine()
+    feed = MarketDataPublisher(engine, snapshot_interval=0)
+    book = BookMirror()
+    rng = random.Random(13)
+
+
+    def lossy(msg):
+        # Drops one trade or delta in twenty
+        if msg['type'] == 'snapshot' or rng.random() > 0.05:
+            book(msg)
+
+    feed.subscribe(lossy)
+    for i, op in enumerate(random_flow(rng, 3000)):
+        apply(engine, op)
+        if i % 100 == 99:
+            feed.publish_snapshot()
+            assert_mirrors(book, engine)
+    assert book.gaps > 0
+    # An old snapshot does not roll the mirror back
+    old = feed.snapshot()
+    engine.place_limit_order('buy', engine.band.lo, 3, False)
+    book(feed.snapshot())
+    book(old)
+    assert_mirrors(book, engine)
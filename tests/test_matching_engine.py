@@ -0,0 +1,159 @@
+"""Differential tests of the matching engine.
+
+``ReferenceBook`` is a deliberately naive price-time matcher: plain lists of
+resting orders, searched with ``min`` on every fill. The engine's price
+ladder must produce exactly its trades, FIFO records, book and LTP on the
+same seeded order flow.
+"""
+import random
+
+import pytest
+
+from matching_engine import MatchingEngine, PriceBand
+
+
+class ReferenceBook:
+    """Price-time priority on lists of ``[price, qty, is_player, oid, arrival]``."""
+
+    def __init__(self, ltp=1000):
+        self.resting = {'buy': [], 'sell': []}
+        self.order_id_counter = 1
+        self.ltp = ltp
+        self._arrivals = 0
+
+    def _priority(self, side):
+        if side == 'buy':
+            return lambda o: (-o[0], o[4])
+        return lambda o: (o[0], o[4])
+
+    def side(self, side):
+        # (price, qty, is_player, oid) best first, FIFO within a price, like iterating a BookSide
+        return [tuple(o[:4]) for o in sorted(self.resting[side], key=self._priority(side))]
+
+    def _rest(self, side, price, qty, is_player, oid):
+        self._arrivals += 1
+        self.resting[side].append([price, qty, is_player, oid, self._arrivals])
+
+    def _take(self, side, limit_price, qty, is_player, taker_id):
+        opposite = 'sell' if side == 'buy' else 'buy'
+        queue = self.resting[opposite]
+        taker_label = 'You' if is_player else 'Bot'
+        player_label, resting_side = ('Seller', 'Ask') if opposite == 'sell' else ('Buyer', 'Bid')
+        trades, fifo = [], []
+        while qty > 0 and queue:
+            order = min(queue, key=self._priority(opposite))
+            price = order[0]
+            if limit_price is not None and (price > limit_price if side == 'buy' else price < limit_price):
+                break
+            traded = min(qty, order[1])
+            trades.append((price, traded, taker_label, player_label if order[2] else 'Bot', order[3], taker_id))
+            fifo.append((order[3], resting_side, price, traded, taker_label, taker_id))
+            order[1] -= traded
+            qty -= traded
+            if order[1] == 0:
+                queue.remove(order)
+        if trades:
+            self.ltp = trades[-1][0]
+        return qty, trades, fifo
+
+    def place_limit_order(self, side, price, qty, is_player, taker_id=None):
+        qty, trades, fifo = self._take(side, price, qty, is_player, taker_id)
+        if qty > 0:
+            self._rest(side, price, qty, is_player, self.order_id_counter)
+            self.order_id_counter += 1
+        return trades, fifo
+
+    def place_market_order(self, side, qty, is_player, taker_id=None):
+        return self._take(side, None, qty, is_player, taker_id)[1:]
+
+    def _find(self, oid):
+        for side, queue in self.resting.items():
+            for order in queue:
+                if order[3] == oid:
+                    return side, order
+        return None, None
+
+    def cancel_order(self, oid):
+        side, order = self._find(oid)
+        if order is None:
+            return None
+        self.resting[side].remove(order)
+        return (side, *order[:4])
+
+    def amend_order(self, oid, new_qty=None, new_price=None, taker_id=None):
+        side, order = self._find(oid)
+        if order is None:
+            return None
+        new_qty = order[1] if new_qty is None else new_qty
+        new_price = order[0] if new_price is None else new_price
+        if new_price == order[0] and new_qty <= order[1]:
+            order[1] = new_qty
+            return [], []
+        self.resting[side].remove(order)
+        qty, trades, fifo = self._take(side, new_price, new_qty, order[2], taker_id)
+        if qty > 0:
+            self._rest(side, new_price, qty, order[2], oid)
+        return trades, fifo
+
+
+def book_state(book):
+    if isinstance(book, ReferenceBook):
+        return book.side('buy'), book.side('sell'), book.ltp, book.order_id_counter
+    return list(book.order_book['bids']), list(book.order_book['asks']), book.ltp, book.order_id_counter
+
+
+def random_flow(rng, n, band=PriceBand()):
+    # Limit, market, cancel and amend ops with player orders mixed in; a few
+    # large takers so multi-order levels get swept whole
+    for i in range(n):
+        r = rng.random()
+        side = rng.choice(('buy', 'sell'))
+        is_player = rng.random() < 0.3
+        if r < 0.55:
+            yield ('limit', side, rng.randint(band.lo, band.hi), rng.randint(1, 20), is_player, i)
+        elif r < 0.7:
+            qty = rng.randint(60, 300) if rng.random() < 0.2 else rng.randint(1, 20)
+            yield ('market', side, qty, is_player, i)
+        elif r < 0.85:
+            yield ('cancel', rng.randint(1, i + 1))
+        else:
+            new_price = rng.randint(band.lo, band.hi) if rng.random() < 0.6 else None
+            yield ('amend', rng.randint(1, i + 1), rng.randint(1, 25), new_price, i)
+
+
+def apply(book, op):
+    kind, *args = op
+    if kind == 'limit':
+        return book.place_limit_order(*args)
+    if kind == 'market':
+        return book.place_market_order(*args)
+    if kind == 'cancel':
+        return book.cancel_order(*args)
+    return book.amend_order(*args)
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_ladder_matches_reference_on_random_flow(seed):
+    rng = random.Random(seed)
+    engine, reference = MatchingEngine(), ReferenceBook()
+    for op in random_flow(rng, 1500):
+        assert apply(engine, op) == apply(reference, op), op
+        assert book_state(engine) == book_state(reference), op
+
+
+def test_ladder_matches_reference_with_a_decimal_tick():
+    band = PriceBand('99.50', '100.50', tick='0.05')
+    rng = random.Random(42)
+    engine, reference = MatchingEngine(band=band), ReferenceBook(band.mid)
+    for op in random_flow(rng, 1500, band):
+        assert apply(engine, op) == apply(reference, op), op
+    assert book_state(engine) == book_state(reference)
+
+
+def test_out_of_band_limit_is_rejected_before_it_trades():
+    engine = MatchingEngine()
+    engine.place_limit_order('sell', 1000, 5, False)
+    with pytest.raises(ValueError):
+        engine.place_limit_order('buy', engine.band.hi + 1, 10, False)
+    assert list(engine.order_book['asks']) == [(1000, 5, False, 1)]
+    assert engine.ltp == 1000 and engine.order_id_counter == 2
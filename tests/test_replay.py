@@ -0,0 +1,85 @@
+import csv
+import random
+
+import pytest
+
+from engine_worker import EngineWorker
+from replay import book_snapshot, read_events, replay, verify_trades
+
+
+def session(worker, rng, steps):
+    # Bot and demo flow with player orders, amends and cancels, as the UI would send them
+    book = worker.engine.order_book
+    for _ in range(steps):
+        step = worker.bot_pair if rng.random() < 0.5 else worker.demo_step
+        step()
+        r = rng.random()
+        if r < 0.15:
+            worker._player_order('LIMIT' if r < 0.1 else 'MARKET', rng.choice(('Buy', 'Sell')),
+                                 rng.randint(990, 1010), rng.randint(1, 30))
+        elif r < 0.2:
+            mine = [(oid, 'You', 'Bid', q, p) for p, q, pl, oid in book['bids'] if pl]
+            if mine:
+                worker._amend_resting(rng.choice(mine), rng.randint(1, 20), rng.randint(990, 1010))
+        elif r < 0.25 and book['asks']:
+            worker._cancel_resting(rng.choice([oid for _p, _q, _pl, oid in book['asks']]))
+
+
+def flush(worker):
+    worker.log_sink.flush()
+    worker.journal.flush()
+
+
+def logged_events(tmp_path):
+    with open(tmp_path / 'events_log.csv', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.fixture
+def worker(tmp_path):
+    worker = EngineWorker(str(tmp_path / 'executed_trades.csv'), str(tmp_path / 'events_log.csv'),
+                          journal_path=str(tmp_path / 'events_log.bin'), measure_latency=False, seed=6)
+    yield worker
+    worker.stop()
+
+
+@pytest.mark.parametrize('log', ['events_log.csv', 'events_log.bin'])
+def test_replay_rebuilds_the_book_and_trades_up_to_any_event(tmp_path, worker, log):
+    rng = random.Random(6)
+    worker._sample_book()
+    session(worker, rng, 300)
+    flush(worker)
+    mid_events = len(logged_events(tmp_path))
+    mid_book = book_snapshot(worker.engine)
+    worker._reset()
+    session(worker, rng, 300)
+    flush(worker)
+
+    res = replay(read_events(str(tmp_path / log)))
+    assert res['events'] == len(logged_events(tmp_path))
+    assert book_snapshot(res['engine']) == book_snapshot(worker.engine)
+    assert verify_trades(res['trades'], str(tmp_path / 'executed_trades.csv')) is None
+
+    part = replay(read_events(str(tmp_path / log)), stop_index=mid_events)
+    assert part['events'] == mid_events
+    assert book_snapshot(part['engine']) == mid_book
+
+
+def test_stop_ts_gives_the_same_book_from_csv_and_journal(tmp_path, worker):
+    session(worker, random.Random(7), 200)
+    flush(worker)
+    stop_ts = logged_events(tmp_path)[300]['timestamp_iso']
+    books = [replay(read_events(str(tmp_path / log)), stop_ts=stop_ts)
+             for log in ('events_log.csv', 'events_log.bin')]
+    assert books[0]['events'] == books[1]['events'] > 300
+    assert book_snapshot(books[0]['engine']) == book_snapshot(books[1]['engine'])
+
+
+def test_verify_trades_reports_the_first_difference(tmp_path, worker):
+    session(worker, random.Random(8), 200)
+    flush(worker)
+    trades = replay(read_events(str(tmp_path / 'events_log.csv')))['trades']
+    assert len(trades) > 3
+    changed = trades[:3] + [(trades[3][0], trades[3][1] + 1, *trades[3][2:])]
+    assert verify_trades(changed, str(tmp_path / 'executed_trades.csv')).startswith('trade 3:')
+    assert 'replay produced' in verify_trades(trades + trades, str(tmp_path / 'executed_trades.csv'))
@@ -0,0 +1,40 @@
+import pytest
+
+from replay import read_events, replay, verify_trades
+from simulate import parse_seeds, run_seeds, simulate
+
+TIMINGS = ('seconds', 'steps_per_sec')
+
+
+def report(res):
+    return {k: v for k, v in res.items() if k not in TIMINGS}
+
+
+@pytest.mark.parametrize('agent', ['demo', 'bot'])
+def test_a_seed_gives_the_same_report_with_or_without_logs(tmp_path, agent):
+    plain = report(simulate(agent, 3000, seed=5))
+    assert plain == report(simulate(agent, 3000, seed=5))
+    assert plain == report(simulate(agent, 3000, seed=5, log_dir=str(tmp_path)))
+    assert plain != report(simulate(agent, 3000, seed=6))
+    assert plain['trades'] > 0 and sum(plain['spread']['hist'].values()) + plain['spread']['one_sided_steps'] == 3000
+
+    run_dir = tmp_path / 'seed_5'
+    res = replay(read_events(str(run_dir / 'events_log.csv')))
+    assert len(res['trades']) == plain['trades']
+    assert res['engine'].ltp == plain['ltp']['last']
+    assert verify_trades(res['trades'], str(run_dir / 'executed_trades.csv')) is None
+
+
+def test_seeds_run_in_processes_give_the_serial_reports():
+    serial = run_seeds('bot', 1000, [1, 2, 3])
+    parallel = run_seeds('bot', 1000, [1, 2, 3], workers=2)
+    assert [report(r) for r in parallel] == [report(r) for r in serial]
+    assert [r['seed'] for r in parallel] == [1, 2, 3]
+
+
+def test_bad_arguments_are_rejected():
+    assert parse_seeds('1,4,10-12') == [1, 4, 10, 11, 12]
+    with pytest.raises(ValueError):
+        parse_seeds('')
+    with pytest.raises(ValueError):
+        simulate('random', 10)
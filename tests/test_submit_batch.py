@@ -0,0 +1,134 @@
+"""submit_batch against one place_* call per order: fills, results, book and
+stats, for batches that trade and for book loads that rest in bulk."""
+import random
+
+import pytest
+
+from matching_engine import BULK_MIN_ROWS, EMPTY, TRADE_COLUMNS, MatchingEngine, batch_dtype
+from test_matching_engine import apply, book_state, random_flow
+
+
+def random_batch(rng, n):
+    orders = []
+    for _ in range(n):
+        price = None if rng.random() < 0.2 else rng.randint(990, 1010)
+        tid = None if rng.random() < 0.5 else rng.randint(1, 10 ** 6)
+        orders.append((rng.choice(('buy', 'sell')), price, rng.randint(1, 15), rng.random() < 0.3, tid))
+    return orders
+
+
+def passive_batch(rng, engine, n):
+    # Orders that cannot trade with each other or the book: bids at or below
+    # the best bid, asks at or above the best ask (either side of the mid when empty)
+    stats, band = engine.stats, engine.band
+    top_bid = stats.best_bid if stats.best_bid is not None else band.mid - 1
+    low_ask = stats.best_ask if stats.best_ask is not None else band.mid + 1
+    orders = []
+    for _ in range(n):
+        side = rng.choice(('buy', 'sell'))
+        price = rng.randint(band.lo, top_bid) if side == 'buy' else rng.randint(low_ask, band.hi)
+        tid = None if rng.random() < 0.5 else rng.randint(1, 10 ** 6)
+        orders.append((side, price, rng.randint(1, 15), rng.random() < 0.3, tid))
+    return orders
+
+
+def as_array(orders):
+    np = pytest.importorskip('numpy')
+    arr = np.zeros(len(orders), dtype=batch_dtype())
+    for i, (side, price, qty, is_player, tid) in enumerate(orders):
+        arr[i] = (0 if side == 'buy' else 1, EMPTY if price is None else price, qty, is_player,
+                  EMPTY if tid is None else tid)
+    return arr
+
+
+def sequential(engine, orders):
+    # The trade and result columns submit_batch should return, from one place_* call per order
+    trades, results = [], []
+    for i, (side, price, qty, is_player, tid) in enumerate(orders):
+        if tid is None:
+            tid = engine.next_taker_id()
+        oid = engine.order_id_counter
+        if price is None:
+            tr, _fifo = engine.place_market_order(side, qty, is_player, tid)
+        else:
+            tr, _fifo = engine.place_limit_order(side, price, qty, is_player, tid)
+        results.append((tid, sum(t[1] for t in tr), oid if engine.order_id_counter != oid else EMPTY))
+        trades += [(i, p, q, roid, t, is_player, cp != 'Bot') for p, q, _taker, cp, roid, t in tr]
+    return trades, results
+
+
+def batch_columns(trades, results):
+    got_trades = [(o, p, q, roid, tid, bool(tpl), bool(rpl)) for o, p, q, roid, tid, tpl, rpl
+                  in zip(*(trades[k] for k in TRADE_COLUMNS))]
+    return got_trades, list(zip(results['taker_id'], results['filled'], results['oid']))
+
+
+def engine_state(engine):
+    stats = engine.stats
+    bids, asks = engine.order_book['bids'], engine.order_book['asks']
+    return (book_state(engine), engine.taker_id_counter, stats.best_bid, stats.best_ask, stats.occupied_levels,
+            stats.player_open_orders, stats.player_open_qty, bids.depth(), asks.depth(), len(bids), len(asks))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_submit_batch_matches_one_order_at_a_time(seed):
+    rng = random.Random(seed)
+    one_by_one, batched = MatchingEngine(), MatchingEngine()
+    for _ in range(4):
+        orders = random_batch(rng, rng.randint(0, 300))
+        expected = sequential(one_by_one, orders)
+        got = batch_columns(*batched.submit_batch(orders))
+        assert got == expected
+        assert engine_state(batched) == engine_state(one_by_one)
+        for oid in rng.sample(range(1, one_by_one.order_id_counter), min(20, one_by_one.order_id_counter - 1)):
+            assert batched.cancel_order(oid) == one_by_one.cancel_order(oid)
+
+
+def test_submit_batch_numpy_input_matches_one_order_at_a_time():
+    rng = random.Random(3)
+    one_by_one, batched = MatchingEngine(), MatchingEngine()
+    for _ in range(4):
+        orders = random_batch(rng, 300)
+        arr = as_array(orders)
+        expected = sequential(one_by_one, orders)
+        trades, results = batched.submit_batch(arr)
+        assert isinstance(trades['price'], type(arr))
+        assert batch_columns(trades, results) == expected
+        assert engine_state(batched) == engine_state(one_by_one)
+
+
+def pending_levels(engine):
+    return sum(1 for side in ('bids', 'asks') for level in engine.order_book[side].levels.values() if level.pending)
+
+
+@pytest.mark.parametrize('numpy_input', [False, True], ids=['list', 'numpy'])
+@pytest.mark.parametrize('seed', range(4))
+def test_bulk_load_then_trading_matches_one_order_at_a_time(seed, numpy_input):
+    # Book loads rest without nodes; the flow after them must settle levels
+    # (fills, sweeps, cancels and amends of pending orders) exactly as if every
+    # order had been placed on its own
+    rng = random.Random(seed)
+    one_by_one, batched = MatchingEngine(), MatchingEngine()
+    flow = random_flow(rng, 3000)
+    for step in range(3):
+        orders = passive_batch(rng, one_by_one, rng.randint(BULK_MIN_ROWS, 600))
+        expected = sequential(one_by_one, orders)
+        got = batched.submit_batch(as_array(orders) if numpy_input else orders, as_numpy=False)
+        assert batch_columns(*got) == expected
+        assert engine_state(batched) == engine_state(one_by_one)
+        assert pending_levels(batched)
+        for _ in range(400):
+            op = next(flow)
+            assert apply(batched, op) == apply(one_by_one, op), op
+            assert engine_state(batched) == engine_state(one_by_one), op
+
+
+def test_submit_batch_rejects_a_bad_order_without_applying_any():
+    engine = MatchingEngine()
+    engine.place_limit_order('sell', 1000, 5, False)
+    before = engine_state(engine)
+    with pytest.raises(ValueError):
+        engine.submit_batch([('buy', 1000, 5), ('buy', 2000, 1)])
+    with pytest.raises(ValueError):
+        engine.submit_batch([('buy', 990, 5)] * BULK_MIN_ROWS + [('sell', 1005, 0)])
+    assert engine_state(engine) == before
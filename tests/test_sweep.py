@@ -0,0 +1,63 @@
+"""Whole-level sweeps: a taker covering a level takes it in one step but must
+still report one trade per resting order, exactly as order-by-order matching."""
+import random
+
+import pytest
+
+from matching_engine import SWEEP_MIN_ORDERS, MatchingEngine
+from test_matching_engine import ReferenceBook
+
+
+def deep_asks(levels, per_level, rng):
+    # Ask levels just above the default LTP, each with enough orders to be swept whole
+    return [('sell', 1001 + i // per_level, rng.randint(1, 10), rng.random() < 0.2, None)
+            for i in range(levels * per_level)]
+
+
+@pytest.mark.parametrize('loaded', ['one_by_one', 'bulk'])
+@pytest.mark.parametrize('taker', ['market', 'limit', 'batch'])
+@pytest.mark.parametrize('extra', [0, 7])
+def test_level_sweep_matches_order_by_order(taker, extra, loaded):
+    # One taker clears whole levels (the sweep path) and, with `extra`, part of the next;
+    # a bulk-loaded book has its levels still pending when the sweep reaches them
+    rng = random.Random(7)
+    asks = deep_asks(6, SWEEP_MIN_ORDERS + 4, rng)
+    qty = sum(o[2] for o in asks[:5 * (SWEEP_MIN_ORDERS + 4)]) + extra
+    engine, reference = MatchingEngine(), ReferenceBook()
+    if loaded == 'bulk':
+        engine.submit_batch(asks)
+    for side, price, q, is_player, _tid in asks:
+        if loaded == 'one_by_one':
+            engine.place_limit_order(side, price, q, is_player)
+        reference.place_limit_order(side, price, q, is_player)
+    expected, _fifo = reference.place_market_order('buy', qty, True, 99)
+    if taker == 'market':
+        got, _fifo = engine.place_market_order('buy', qty, True, 99)
+    elif taker == 'limit':
+        got, _fifo = engine.place_limit_order('buy', 1010, qty, True, 99)
+    else:
+        trades, _results = engine.submit_batch([('buy', None, qty, True, 99)])
+        got = [(price, q, 'You', 'Seller' if resting_pl else 'Bot', roid, tid)
+               for price, q, roid, tid, resting_pl in zip(trades['price'], trades['qty'], trades['resting_oid'],
+                                                          trades['taker_id'], trades['resting_is_player'])]
+    assert got == expected
+    assert list(engine.order_book['asks']) == reference.side('sell')
+    assert engine.ltp == reference.ltp
+    stats = engine.stats
+    assert stats.best_ask == min(p for p, _q, _pl, _oid in reference.side('sell'))
+    assert stats.occupied_levels == len({p for p, _q, _pl, _oid in reference.side('sell')})
+    player_rest = [q for _p, q, pl, _oid in reference.side('sell') if pl]
+    assert (stats.player_open_orders, stats.player_open_qty) == (len(player_rest), sum(player_rest))
+
+
+def test_sweep_reports_every_swept_price_as_changed():
+    rng = random.Random(3)
+    engine = MatchingEngine()
+    for side, price, q, is_player, _tid in deep_asks(3, SWEEP_MIN_ORDERS, rng):
+        engine.place_limit_order(side, price, q, is_player)
+    asks = engine.order_book['asks']
+    asks.changed = set()
+    engine.place_market_order('buy', sum(q for q, _n in (asks.level(1001), asks.level(1002))) + 1, False)
+    assert asks.changed == {1001, 1002, 1003}
+    assert asks.level(1001) == asks.level(1002) == (0, 0)
+    assert asks.level(1003)[1] == SWEEP_MIN_ORDERS
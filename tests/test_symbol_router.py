@@ -0,0 +1,63 @@
+import struct
+
+import pytest
+
+from matching_engine import PriceBand
+from shm_ring import ShmRing
+from symbol_router import BATCH, ShardedRouter, run_in_process, synthetic_orders
+
+RECORD = struct.Struct('<qi4x')
+
+
+def packed(rows):
+    data = bytearray(len(rows) * RECORD.size)
+    for i, row in enumerate(rows):
+        RECORD.pack_into(data, i * RECORD.size, *row)
+    return data
+
+
+def test_packed_puts_wrap_around_the_ring():
+    ring = ShmRing(RECORD, 5)
+    try:
+        rows = [(i, -i) for i in range(12)]
+        assert ring.put_packed(packed(rows[:3]), 3) == 3
+        assert ring.get_many() == rows[:3]
+        # Two slots left before the end of the ring, then it wraps
+        assert ring.put_packed(packed(rows[3:10]), 7) == 5
+        assert len(ring) == 5
+        assert ring.get_many(2) == rows[3:5]
+        # Three held, so the last two of these wait for the reader to take two
+        taken = []
+        ring.put_all_packed(packed(rows[8:12]), 4, idle=lambda: taken.extend(ring.get_many(1)))
+        assert taken + ring.get_many() == rows[5:12]
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_sharded_trades_match_one_process_in_per_symbol_order(workers):
+    band = PriceBand(95, 105)
+    orders = list(synthetic_orders(40, 3 * BATCH + 100, seed=workers, band=band))
+    with ShardedRouter(workers, capacity=512, band=band) as router:
+        records = []
+        for i, (sym, kind, side, price, qty) in enumerate(orders, 1):
+            if kind == 'limit':
+                router.submit_limit(sym, side, price, qty)
+            else:
+                router.submit_market(sym, side, qty)
+            if i % 700 == 0:
+                records.extend(router.drain())
+        records.extend(router.drain(wait=True))
+        with pytest.raises(ValueError):
+            router.submit_limit('SYM0000', 'buy', 106, 1)
+    last, merged, results = {}, {}, 0
+    for kind, sym, n, _seq, payload in records:
+        assert n == last.get(sym, 0) + 1
+        last[sym] = n
+        if kind == 'trade':
+            merged.setdefault(sym, []).append(payload)
+        else:
+            results += 1
+    assert results == len(orders)
+    assert merged == run_in_process(orders, band)
@@ -0,0 +1,25 @@
+import random
+from datetime import datetime
+
+from timestamps import TZ, EventClock, clock_time, iso_to_ns, ns_to_iso
+
+
+def test_iso_text_matches_datetime_and_round_trips_to_the_microsecond():
+    rng = random.Random(14)
+    base = 1_761_852_978_000_000_000
+    # Alternate between nearby and far seconds so the per-second cache is hit and replaced
+    for _ in range(2000):
+        ts_ns = base + rng.choice((rng.randrange(3 * 10**9), rng.randrange(10**17)))
+        text = ns_to_iso(ts_ns)
+        secs, ns = divmod(ts_ns, 10**9)
+        expected = datetime.fromtimestamp(secs, TZ).replace(microsecond=ns // 1000)
+        assert text == expected.isoformat(timespec='microseconds')
+        assert iso_to_ns(text) == ts_ns // 1000 * 1000
+        assert clock_time(ts_ns) == text[11:19]
+
+
+def test_clock_sequence_is_strictly_increasing_and_resumable():
+    clock = EventClock()
+    stamps = [clock.stamp() for _ in range(1000)]
+    assert [seq for _ts, seq in stamps] == list(range(1, 1001))
+    assert EventClock(seq=stamps[-1][1]).stamp()[1] == 1001
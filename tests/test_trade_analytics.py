@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from csv_sink import TRADES_HEADER, CsvLogSink
+from trade_analytics import BROKERAGE_PER_ORDER, BarBuilder, analyze
+
+T0 = 1_761_852_978_000_000_000
+
+
+def write_log(path, rows):
+    # rows: (ts_ns, price, qty, taker_label, counterparty_label, resting_side, taker_id)
+    sink = CsvLogSink({'trades': (str(path), TRADES_HEADER)})
+    sink.put('trades', [[ts, seq, price, qty, taker, cp, side, seq, tid]
+                        for seq, (ts, price, qty, taker, cp, side, tid) in enumerate(rows, 1)])
+    sink.close()
+
+
+def random_trades(rng, n):
+    ts = T0
+    for i in range(n):
+        # Mostly forward in time, now and then a step back of the wall clock
+        ts += rng.randrange(-2 * 10**9, 10**9) if rng.random() < 0.02 else rng.randrange(10**9)
+        side = rng.choice(('Ask', 'Bid'))
+        yield (ts, rng.randint(990, 1010), rng.randint(1, 20), 'Bot', 'Bot', side, i)
+
+
+def test_bars_and_totals_match_a_live_bar_builder_at_any_chunk_size(tmp_path):
+    pytest.importorskip('numpy')
+    rows = list(random_trades(random.Random(15), 3000))
+    write_log(tmp_path / 'trades.csv', rows)
+    live = BarBuilder(bar_seconds=30, keep=None)
+    for ts, price, qty, *_rest in rows:
+        live.add(ts, price, qty)
+    volume = sum(r[2] for r in rows)
+    for chunk_bytes in (1 << 24, 4096, 100):
+        report = analyze(str(tmp_path / 'trades.csv'), bar_seconds=30, chunk_bytes=chunk_bytes)
+        assert (report['trades'], report['volume'], report['last_price']) == (3000, volume, rows[-1][1])
+        assert report['vwap'] == pytest.approx(sum(r[1] * r[2] for r in rows) / volume)
+        assert report['by_taker'] == {'Bot': {'trades': 3000, 'volume': volume}}
+        bars = report['bars']
+        assert list(zip(*(bars[k].tolist() for k in ('start_ns', 'open', 'high', 'low', 'close', 'volume')))) \
+            == list(live.candles())
+        assert int(bars['trades'].sum()) == 3000
+
+
+# One row per chunk splits the first order's two fills across chunks
+@pytest.mark.parametrize('chunk_bytes', [1, 1 << 24])
+def test_player_position_and_pnl(tmp_path, chunk_bytes):
+    pytest.importorskip('numpy')
+    rows = [
+        (T0, 1000, 5, 'You', 'Bot', 'Ask', 1),      # player buys 5 @ 1000 ...
+        (T0 + 1, 1001, 3, 'You', 'Bot', 'Ask', 1),  # ... and 3 @ 1001 in the same order
+        (T0 + 2, 1003, 4, 'Bot', 'Buyer', 'Bid', 2),  # player's resting bid: a buy, not charged
+        (T0 + 3, 1004, 6, 'You', 'Bot', 'Bid', 3),  # player sells 6 @ 1004
+        (T0 + 4, 1002, 2, 'Bot', 'Seller', 'Ask', 4),  # player's resting ask: a sell
+        (T0 + 5, 1005, 1, 'Bot', 'Bot', 'Ask', 5),  # not the player's; sets the mark
+        (T0 + 6, 1005, 1, 'You', 'Bot', 'Ask', ''),  # amend fill: no taker ID, not charged
+    ]
+    write_log(tmp_path / 'trades.csv', rows)
+    player = analyze(str(tmp_path / 'trades.csv'), chunk_bytes=chunk_bytes)['player']
+    cash = -5 * 1000 - 3 * 1001 - 4 * 1003 + 6 * 1004 + 2 * 1002 - 1005
+    assert (player['bought'], player['sold'], player['position'], player['cash']) == (13, 8, 5, cash)
+    assert player['gross_pnl'] == cash + 5 * 1005
+    assert player['orders_charged'] == 2
+    assert player['net_pnl'] == player['gross_pnl'] - 2 * BROKERAGE_PER_ORDER
+
+
+def test_an_empty_or_foreign_log(tmp_path):
+    pytest.importorskip('numpy')
+    (tmp_path / 'empty.csv').write_text('')
+    assert analyze(str(tmp_path / 'empty.csv'))['trades'] == 0
+    (tmp_path / 'events.csv').write_text('timestamp_iso,seq,event\n')
+    with pytest.raises(ValueError):
+        analyze(str(tmp_path / 'events.csv'))
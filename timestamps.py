@@ -0,0 +1,53 @@
+"""Event timestamps: nanoseconds plus a sequence number, formatted late.
+
+An ``EventClock`` stamps each event with ``time.time_ns()`` and a strictly
+increasing sequence number, which is all the matching path pays for. Events in
+one burst can share a wall-clock time (or even step back when the system clock
+is adjusted), so ``seq`` is what orders them. ISO-8601 text is only produced
+when a row is written (``csv_sink``) or shown in a table; ``ns_to_iso`` caches
+the date/time part per second, so formatting a burst costs one f-string per row.
+
+    clock = EventClock()
+    ts_ns, seq = clock.stamp()
+    ns_to_iso(ts_ns)        # '2025-10-31T01:06:18.123456+05:30'
+"""
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+TZ = ZoneInfo("Asia/Kolkata")
+
+_second = (None, '', '')  # (epoch second, 'YYYY-MM-DDTHH:MM:SS', UTC offset) of the last call
+
+
+class EventClock:
+    """Hands out ``(ts_ns, seq)`` stamps; ``seq`` continues from ``seq``."""
+    __slots__ = ('seq',)
+
+    def __init__(self, seq=0):
+        self.seq = seq
+
+    def stamp(self):
+        self.seq += 1
+        return time.time_ns(), self.seq
+
+
+def ns_to_iso(ts_ns):
+    # Nanoseconds since the epoch -> ISO-8601 in TZ with microseconds
+    global _second
+    secs, ns = divmod(int(ts_ns), 1_000_000_000)
+    cached = _second
+    if cached[0] != secs:
+        text = datetime.fromtimestamp(secs, TZ).isoformat()
+        cached = _second = (secs, text[:19], text[19:])
+    return f"{cached[1]}.{ns // 1000:06d}{cached[2]}"
+
+
+def iso_to_ns(ts):
+    dt = datetime.fromisoformat(ts)
+    return (int(dt.timestamp()) * 1_000_000 + dt.microsecond) * 1000
+
+
+def clock_time(ts_ns):
+    # HH:MM:SS for the UI tables
+    return ns_to_iso(ts_ns)[11:19]
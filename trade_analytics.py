@@ -0,0 +1,293 @@
+"""Trade analytics and OHLCV bars over ``executed_trades.csv``.
+
+``analyze`` streams the trade log in chunks of about ``chunk_bytes`` bytes,
+parses each chunk into NumPy columns (``np.loadtxt``; timestamps are decoded
+from their fixed ISO layout with array arithmetic, not one ``datetime`` per
+row) and folds it into running totals. Only one chunk and the bars are in
+memory at a time, so logs larger than RAM work. It reports VWAP, volume and
+trades by taker ('You'/'Bot') and the player's position and P&L net of
+brokerage, and builds OHLCV bars of any interval. Prices are in ticks.
+
+Bars are aligned to local (``TZ``) time. A trade stamped earlier than the
+bar before it (the wall clock stepped back) is counted in that bar, so bars
+never go back in time. ``BarBuilder`` applies the same rules one trade at a
+time; the app's engine thread feeds it for the live candle strip.
+
+    python trade_analytics.py executed_trades.csv --bar 60 --bars-out bars.csv
+    report = analyze('executed_trades.csv', bar_seconds=5)
+"""
+import argparse
+import json
+import sys
+from collections import deque
+from datetime import datetime
+
+from timestamps import TZ, ns_to_iso
+
+BROKERAGE_PER_ORDER = 10  # charged once per player order that gets any fill on submission
+BAR_SECONDS = 60
+CHUNK_BYTES = 1 << 24
+
+_LOCAL_OFFSET_NS = int(  # TZ (Asia/Kolkata) has no DST, so one offset aligns every bar
+    datetime.now(TZ).utcoffset().total_seconds()) * 1_000_000_000
+# executed_trades.csv columns used here, with their NumPy types (seq is not needed: rows are in seq order)
+_COLUMNS = (('timestamp_iso', 'S32'), ('price', '<i8'), ('qty', '<i8'), ('taker_label', 'S8'),
+            ('counterparty_label', 'S8'), ('resting_side', 'S3'), ('taker_id', 'S20'))
+BAR_FIELDS = ('start_ns', 'open', 'high', 'low', 'close', 'volume', 'notional', 'trades')
+
+
+class BarBuilder:
+    """OHLCV bars of a live trade stream; keeps the newest ``keep`` bars.
+
+    Each bar is ``[bar index, open, high, low, close, volume, notional, trades]``;
+    ``version`` changes with every trade added.
+    """
+
+    def __init__(self, bar_seconds=BAR_SECONDS, keep=100):
+        self.interval_ns = int(bar_seconds * 1_000_000_000)
+        self.bars = deque(maxlen=keep)
+        self.version = 0
+
+    def add(self, ts_ns, price, qty):
+        bars = self.bars
+        index = (ts_ns + _LOCAL_OFFSET_NS) // self.interval_ns
+        if bars and index <= bars[-1][0]:
+            bar = bars[-1]
+            if price > bar[2]:
+                bar[2] = price
+            elif price < bar[3]:
+                bar[3] = price
+            bar[4] = price
+            bar[5] += qty
+            bar[6] += price * qty
+            bar[7] += 1
+        else:
+            bars.append([index, price, price, price, price, qty, price * qty, 1])
+        self.version += 1
+
+    def candles(self):
+        # ((start_ns, open, high, low, close, volume), ...) oldest first
+        step = self.interval_ns
+        return tuple((b[0] * step - _LOCAL_OFFSET_NS, b[1], b[2], b[3], b[4], b[5]) for b in self.bars)
+
+
+def _ts_to_ns(ts):
+    # Vectorized iso_to_ns for an 'S32' array of 'YYYY-MM-DDTHH:MM:SS[.ffffff][+HH:MM]'
+    import numpy as np
+    n = len(ts)
+    ts = np.ascontiguousarray(ts, dtype='S32')
+    raw = ts.view(np.uint8).reshape(n, 32).astype(np.int64)
+    secs = ts.astype('S19').astype('datetime64[s]').astype(np.int64)  # wall time, as if it were UTC
+    has_us = raw[:, 19] == ord('.')
+    us = np.where(has_us, (raw[:, 20:26] - 48) @ np.array([100000, 10000, 1000, 100, 10, 1]), 0)
+    rows = np.arange(n)
+    at = np.where(has_us, 26, 19)
+    sign = raw[rows, at]
+    offset = ((raw[rows, at + 1] - 48) * 10 + raw[rows, at + 2] - 48) * 3600 \
+        + ((raw[rows, at + 4] - 48) * 10 + raw[rows, at + 5] - 48) * 60
+    offset = np.where(sign == ord('+'), offset, np.where(sign == ord('-'), -offset, 0))
+    return (secs - offset) * 1_000_000_000 + us * 1000
+
+
+def iter_chunks(path, chunk_bytes=CHUNK_BYTES):
+    """Yield the trade log as structured NumPy arrays of about ``chunk_bytes`` of text each.
+
+    Fields: ``ts_ns``, ``price``, ``qty``, ``taker_label``, ``counterparty_label``,
+    ``resting_side``, ``taker_id`` (labels and the taker ID as bytes, '' when blank).
+    """
+    import numpy as np
+    with open(path, newline='') as f:
+        header = f.readline().strip().split(',')
+        if header == ['']:
+            return  # empty file: no trades yet
+        missing = [name for name, _t in _COLUMNS if name not in header]
+        if missing:
+            raise ValueError(f"{path}: not a trade log (no {', '.join(missing)} column)")
+        usecols = [header.index(name) for name, _t in _COLUMNS]
+        dtype = np.dtype(list(_COLUMNS))
+        while True:
+            lines = f.readlines(chunk_bytes)
+            if not lines:
+                return
+            cols = np.loadtxt(lines, delimiter=',', dtype=dtype, usecols=usecols, ndmin=1, comments=None)
+            if not len(cols):
+                continue
+            chunk = np.empty(len(cols), dtype=[('ts_ns', '<i8')] + list(_COLUMNS[1:]))
+            chunk['ts_ns'] = _ts_to_ns(cols['timestamp_iso'])
+            for name, _t in _COLUMNS[1:]:
+                chunk[name] = cols[name]
+            yield chunk
+
+
+class _Bars:
+    # Bars of the chunks seen so far as lists of per-chunk columns; a bar
+    # that spans two chunks is merged into the earlier chunk's last bar
+    def __init__(self, interval_ns):
+        self.interval_ns = interval_ns
+        self.last_index = None
+        self.parts = {name: [] for name in ('index',) + BAR_FIELDS[1:]}
+
+    def add(self, ts_ns, price, qty):
+        import numpy as np
+        index = (ts_ns + _LOCAL_OFFSET_NS) // self.interval_ns
+        if self.last_index is not None:
+            index[0] = max(index[0], self.last_index)
+        np.maximum.accumulate(index, out=index)
+        starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+        ends = np.r_[starts[1:], len(index)] - 1
+        cols = {
+            'index': index[starts],
+            'open': price[starts],
+            'high': np.maximum.reduceat(price, starts),
+            'low': np.minimum.reduceat(price, starts),
+            'close': price[ends],
+            'volume': np.add.reduceat(qty, starts),
+            'notional': np.add.reduceat(price * qty, starts),
+            'trades': np.diff(np.r_[starts, len(index)]),
+        }
+        parts = self.parts
+        if self.last_index == cols['index'][0]:
+            # The chunk continues the previous chunk's last bar: fold its first bar in
+            prev = {name: part[-1] for name, part in parts.items()}
+            prev['high'][-1] = max(prev['high'][-1], cols['high'][0])
+            prev['low'][-1] = min(prev['low'][-1], cols['low'][0])
+            prev['close'][-1] = cols['close'][0]
+            for name in ('volume', 'notional', 'trades'):
+                prev[name][-1] += cols[name][0]
+            cols = {name: col[1:] for name, col in cols.items()}
+        if len(cols['index']):
+            for name, col in cols.items():
+                parts[name].append(col)
+        self.last_index = int(index[-1])
+
+    def columns(self):
+        # {'start_ns': array, 'open': array, ...}
+        import numpy as np
+        parts = self.parts
+        cols = {name: np.concatenate(part) if part else np.zeros(0, np.int64) for name, part in parts.items()}
+        cols['start_ns'] = cols.pop('index') * self.interval_ns - _LOCAL_OFFSET_NS
+        return {name: cols[name] for name in BAR_FIELDS}
+
+
+def analyze(path, bar_seconds=BAR_SECONDS, chunk_bytes=CHUNK_BYTES):
+    """Summary of a trade log: totals, VWAP, volume by taker, player P&L and bars.
+
+    The returned dict holds plain numbers except ``bars``, a dict of NumPy
+    columns (``BAR_FIELDS``) that ``bars_to_csv`` writes out.
+    """
+    import numpy as np
+    bars = _Bars(int(bar_seconds * 1_000_000_000))
+    trades = volume = notional = 0
+    by_taker = {}
+    first_ns = last_ns = last_price = None
+    bought = sold = cash = orders_charged = 0
+    prev_taker = (b'', b'')  # (taker label, taker ID) of the previous chunk's last row
+    for chunk in iter_chunks(path, chunk_bytes):
+        ts_ns, price, qty = chunk['ts_ns'], chunk['price'], chunk['qty']
+        value = price * qty
+        trades += len(chunk)
+        volume += int(qty.sum())
+        notional += int(value.sum())
+        if first_ns is None:
+            first_ns = int(ts_ns[0])
+        last_ns, last_price = int(ts_ns[-1]), int(price[-1])
+        bars.add(ts_ns, price, qty)
+
+        labels, inverse = np.unique(chunk['taker_label'], return_inverse=True)
+        label_qty = np.bincount(inverse, weights=qty, minlength=len(labels))
+        label_trades = np.bincount(inverse, minlength=len(labels))
+        for label, q, n in zip(labels, label_qty, label_trades):
+            totals = by_taker.setdefault(label.decode(), {'trades': 0, 'volume': 0})
+            totals['trades'] += int(n)
+            totals['volume'] += int(q)
+
+        # The player is the taker ('You') or the resting order ('Buyer'/'Seller' counterparty)
+        taker_you = chunk['taker_label'] == b'You'
+        resting_ask = chunk['resting_side'] == b'Ask'
+        cp = chunk['counterparty_label']
+        buys = (taker_you & resting_ask) | (cp == b'Buyer')
+        sells = (taker_you & ~resting_ask) | (cp == b'Seller')
+        bought += int(qty[buys].sum())
+        sold += int(qty[sells].sum())
+        cash += int(value[sells].sum()) - int(value[buys].sum())
+
+        # Brokerage: one charge per player order with fills. An order's fills are
+        # consecutive rows with its taker ID; amend fills have none and are not charged
+        tid = chunk['taker_id']
+        prev_you = np.r_[prev_taker[0] == b'You', taker_you[:-1]]
+        prev_tid = np.r_[np.array([prev_taker[1]], dtype=tid.dtype), tid[:-1]]
+        new_order = taker_you & (tid != b'') & ~(prev_you & (prev_tid == tid))
+        orders_charged += int(new_order.sum())
+        prev_taker = (chunk['taker_label'][-1], tid[-1])
+
+    position = bought - sold
+    gross = cash + position * last_price if last_price is not None else 0
+    brokerage = orders_charged * BROKERAGE_PER_ORDER
+    bar_cols = bars.columns()
+    return {
+        'path': path,
+        'trades': trades,
+        'volume': volume,
+        'notional': notional,
+        'vwap': notional / volume if volume else None,
+        'first_ts': ns_to_iso(first_ns) if first_ns is not None else None,
+        'last_ts': ns_to_iso(last_ns) if last_ns is not None else None,
+        'last_price': last_price,
+        'by_taker': dict(sorted(by_taker.items())),
+        'player': {
+            'bought': bought,
+            'sold': sold,
+            'position': position,
+            'cash': cash,
+            'mark': last_price,
+            'gross_pnl': gross,
+            'orders_charged': orders_charged,
+            'brokerage': brokerage,
+            'net_pnl': gross - brokerage,
+        },
+        'bar_seconds': bar_seconds,
+        'bar_count': len(bar_cols['start_ns']),
+        'bars': bar_cols,
+    }
+
+
+def bars_to_csv(bars, path):
+    # One row per bar: start time, OHLC, volume, VWAP and trade count
+    import csv
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(['bar_start_iso', 'open', 'high', 'low', 'close', 'volume', 'vwap', 'trades'])
+        for start, o, h, l, c, v, value, n in zip(*(bars[name].tolist() for name in BAR_FIELDS)):
+            w.writerow([ns_to_iso(start), o, h, l, c, v, f"{value / v:.4f}", n])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('trades', nargs='?', default='executed_trades.csv', help="trade log (executed_trades.csv format)")
+    ap.add_argument('--bar', type=float, default=BAR_SECONDS, help="bar interval in seconds (default %(default)s)")
+    ap.add_argument('--chunk-mb', type=float, default=CHUNK_BYTES / (1 << 20), help="text read per chunk")
+    ap.add_argument('--bars-out', help="write the OHLCV bars to this CSV")
+    ap.add_argument('--out', help="write the JSON report here (default: stdout)")
+    args = ap.parse_args(argv)
+
+    report = analyze(args.trades, args.bar, int(args.chunk_mb * (1 << 20)))
+    bars = report.pop('bars')
+    if args.bars_out:
+        bars_to_csv(bars, args.bars_out)
+    pl = report['player']
+    vwap = f"{report['vwap']:.2f}" if report['vwap'] is not None else '-'
+    print(f"{report['trades']:,} trades, volume {report['volume']:,}, vwap {vwap}, "
+          f"{report['bar_count']:,} bars of {args.bar:g}s", file=sys.stderr)
+    print(f"player: position {pl['position']:+,} cash {pl['cash']:+,} gross {pl['gross_pnl']:+,} "
+          f"brokerage {pl['brokerage']:,} net {pl['net_pnl']:+,}", file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())